@@ -116,6 +116,11 @@ const liveTunnelSchema = new mongoose.Schema(
       type: Number,
       default: 10, // Free tier limit
     },
+    // Tunnel port also exposed directly (pro only)
+    rawTcp: {
+      type: Boolean,
+      default: false,
+    },
     // Timestamps
     startedAt: {
       type: Date,
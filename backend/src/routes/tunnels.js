@@ -3,6 +3,12 @@ import { body, param, validationResult } from "express-validator";
 import LiveTunnel from "../models/LiveTunnel.js";
 import User from "../models/User.js";
 import { authenticateToken } from "../middleware/auth.js";
+import {
+  addTunnelViewer,
+  heartbeatTunnelViewer,
+  removeTunnelViewer,
+  VIEWER_HEARTBEAT_INTERVAL,
+} from "../utils/tunnelPresence.js";
 import crypto from "crypto";
 
 const router = express.Router();
@@ -12,6 +18,39 @@ const TUNNEL_SERVICE_URL =
   process.env.TUNNEL_SERVICE_URL || "http://localhost:8001";
 const TUNNEL_SECRET_KEY =
   process.env.TUNNEL_SECRET_KEY || "your-secret-key-change-in-production";
+const TUNNEL_TOKEN_TTL = parseInt(process.env.TUNNEL_TOKEN_TTL) || 15 * 60; // seconds
+
+/**
+ * Mint a short-lived HMAC-signed tunnel token.
+ * Format: base64url(JSON payload) + "." + base64url(HMAC-SHA256(payload)).
+ * The tunnel service verifies it offline (see tunnel-service/tunnel_tokens.py).
+ */
+const mintTunnelToken = ({
+  userId,
+  tunnelId,
+  projectName,
+  localPort,
+  tier,
+  rawTcp,
+}) => {
+  const payload = Buffer.from(
+    JSON.stringify({
+      uid: String(userId),
+      tid: tunnelId,
+      prj: projectName,
+      lp: Number(localPort),
+      tier,
+      exp: Math.floor(Date.now() / 1000) + TUNNEL_TOKEN_TTL,
+      n: crypto.randomBytes(12).toString("hex"),
+      ...(rawTcp ? { tcp: true } : {}),
+    })
+  );
+  const signature = crypto
+    .createHmac("sha256", TUNNEL_SECRET_KEY)
+    .update(payload)
+    .digest();
+  return `${payload.toString("base64url")}.${signature.toString("base64url")}`;
+};
 
 /**
  * @route   POST /api/tunnels/create
@@ -41,6 +80,7 @@ router.post(
     body("language").optional().trim(),
     body("category").optional().trim(),
     body("isPublic").optional().isBoolean(),
+    body("rawTcp").optional().isBoolean(),
   ],
   async (req, res) => {
     try {
@@ -59,6 +99,7 @@ router.post(
         language,
         category,
         isPublic,
+        rawTcp,
       } = req.body;
 
       // Get user info
@@ -97,6 +138,14 @@ router.post(
         });
       }
 
+      // Raw TCP ports are reachable by anyone who finds them, so keep them to pro
+      if (rawTcp && userTier !== "pro") {
+        return res.status(403).json({
+          error: "Raw TCP tunnels are only available on the pro tier",
+          upgrade: "Upgrade to Pro for raw TCP tunnels",
+        });
+      }
+
       // Generate unique tunnel ID
       const tunnelId = `tunnel_${userId}_${Date.now()}_${crypto
         .randomBytes(4)
@@ -119,6 +168,7 @@ router.post(
         status: "active",
         tier: userTier,
         maxViewers,
+        rawTcp: Boolean(rawTcp),
         metadata: {
           framework,
           language,
@@ -133,7 +183,14 @@ router.post(
       const sshHost = process.env.SSH_HOST || "localhost";
       const sshPort = process.env.SSH_PORT || 2222;
       const sshUsername = `${userId}:${tunnelId}:${projectName}`;
-      const sshPassword = `${localPort}:${TUNNEL_SECRET_KEY}`;
+      const sshPassword = mintTunnelToken({
+        userId,
+        tunnelId,
+        projectName,
+        localPort,
+        tier: userTier,
+        rawTcp: Boolean(rawTcp),
+      });
 
       const sshCommand = `ssh -R 0:localhost:${localPort} ${sshUsername}@${sshHost} -p ${sshPort}`;
 
@@ -145,6 +202,7 @@ router.post(
           status: tunnel.status,
           tier: tunnel.tier,
           maxViewers: tunnel.maxViewers,
+          rawTcp: Boolean(rawTcp),
         },
         connection: {
           sshCommand,
@@ -357,6 +415,40 @@ router.delete("/:tunnelId", authenticateToken, async (req, res) => {
   }
 });
 
+/**
+ * @route   POST /api/tunnels/:tunnelId/token
+ * @desc    Mint a fresh tunnel token so the creator can reconnect after the
+ *          old one expires (expired tokens only re-attach briefly)
+ * @access  Private (tunnel owner)
+ */
+router.post("/:tunnelId/token", authenticateToken, async (req, res) => {
+  try {
+    const userId = req.user.userId;
+    const tunnel = await LiveTunnel.findOne({
+      tunnelId: req.params.tunnelId,
+      status: "active",
+    });
+
+    if (!tunnel || tunnel.userId.toString() !== userId) {
+      return res.status(404).json({ error: "Tunnel not found or offline" });
+    }
+
+    res.json({
+      sshPassword: mintTunnelToken({
+        userId,
+        tunnelId: tunnel.tunnelId,
+        projectName: tunnel.projectName,
+        localPort: tunnel.localPort,
+        tier: tunnel.tier,
+        rawTcp: tunnel.rawTcp,
+      }),
+    });
+  } catch (error) {
+    console.error("Error refreshing tunnel token:", error);
+    res.status(500).json({ error: "Failed to refresh tunnel token" });
+  }
+});
+
 /**
  * @route   POST /api/tunnels/:tunnelId/join
  * @desc    Join a tunnel as a viewer
@@ -385,16 +477,7 @@ router.post("/:tunnelId/join", authenticateToken, async (req, res) => {
     await tunnel.addViewer(userId, user.username);
 
     // Notify tunnel service
-    try {
-      await fetch(
-        `${TUNNEL_SERVICE_URL}/tunnels/${tunnelId}/viewers/${userId}`,
-        {
-          method: "POST",
-        }
-      );
-    } catch (err) {
-      console.error("Failed to notify tunnel service:", err);
-    }
+    await addTunnelViewer(tunnelId, userId);
 
     res.json({
       message: "Joined tunnel successfully",
@@ -403,6 +486,8 @@ router.post("/:tunnelId/join", authenticateToken, async (req, res) => {
         publicUrl: tunnel.publicUrl,
         viewersCount: tunnel.stats.viewersCount,
       },
+      // Call /heartbeat at this interval to stay counted as a viewer
+      heartbeatIntervalMs: VIEWER_HEARTBEAT_INTERVAL,
     });
   } catch (error) {
     console.error("Error joining tunnel:", error);
@@ -410,6 +495,16 @@ router.post("/:tunnelId/join", authenticateToken, async (req, res) => {
   }
 });
 
+/**
+ * @route   POST /api/tunnels/:tunnelId/heartbeat
+ * @desc    Keep a viewer who joined over REST counted (see heartbeatIntervalMs)
+ * @access  Private
+ */
+router.post("/:tunnelId/heartbeat", authenticateToken, async (req, res) => {
+  await heartbeatTunnelViewer(req.params.tunnelId, req.user.userId);
+  res.status(204).end();
+});
+
 /**
  * @route   POST /api/tunnels/:tunnelId/leave
  * @desc    Leave a tunnel as a viewer
@@ -430,16 +525,7 @@ router.post("/:tunnelId/leave", authenticateToken, async (req, res) => {
     await tunnel.removeViewer(userId);
 
     // Notify tunnel service
-    try {
-      await fetch(
-        `${TUNNEL_SERVICE_URL}/tunnels/${tunnelId}/viewers/${userId}`,
-        {
-          method: "DELETE",
-        }
-      );
-    } catch (err) {
-      console.error("Failed to notify tunnel service:", err);
-    }
+    await removeTunnelViewer(tunnelId, userId);
 
     res.json({
       message: "Left tunnel successfully",
@@ -1,4 +1,5 @@
 import LiveTunnel from "../models/LiveTunnel.js";
+import { startViewerHeartbeat } from "../utils/tunnelPresence.js";
 
 /**
  * Setup Socket.IO namespace for live tunnel events
@@ -42,6 +43,15 @@ export function setupTunnelSocket(io) {
           await tunnel.addViewer(userId, username);
         }
 
+        // Keep the viewer present on the tunnel service while this socket is open
+        if (socket.stopViewerHeartbeat) {
+          socket.stopViewerHeartbeat();
+        }
+        socket.stopViewerHeartbeat = startViewerHeartbeat(
+          tunnelId,
+          userId || socket.id
+        );
+
         // Notify everyone in the tunnel
         tunnelNamespace.to(`tunnel:${tunnelId}`).emit("viewer-joined", {
           userId,
@@ -72,6 +82,11 @@ export function setupTunnelSocket(io) {
     // Leave tunnel room
     socket.on("leave-tunnel", async ({ tunnelId, userId }) => {
       try {
+        if (socket.stopViewerHeartbeat) {
+          socket.stopViewerHeartbeat();
+          socket.stopViewerHeartbeat = null;
+        }
+
         const tunnel = await LiveTunnel.findOne({ tunnelId });
 
         if (tunnel && userId) {
@@ -192,6 +207,11 @@ export function setupTunnelSocket(io) {
     // Handle disconnect
     socket.on("disconnect", async () => {
       try {
+        if (socket.stopViewerHeartbeat) {
+          socket.stopViewerHeartbeat();
+          socket.stopViewerHeartbeat = null;
+        }
+
         if (socket.tunnelId && socket.userId) {
           const tunnel = await LiveTunnel.findOne({
             tunnelId: socket.tunnelId,
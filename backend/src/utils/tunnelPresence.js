@@ -0,0 +1,55 @@
+// Viewer presence on the tunnel service
+// The tunnel service drops viewers that stop heartbeating (VIEWER_PRESENCE_TTL,
+// 45s by default), so anything that keeps a viewer present must call
+// heartbeatTunnelViewer more often than that.
+const TUNNEL_SERVICE_URL =
+  process.env.TUNNEL_SERVICE_URL || "http://localhost:8001";
+
+export const VIEWER_HEARTBEAT_INTERVAL =
+  (parseInt(process.env.VIEWER_HEARTBEAT_INTERVAL) || 15) * 1000; // ms
+
+const viewerUrl = (tunnelId, viewerId) =>
+  `${TUNNEL_SERVICE_URL}/tunnels/${encodeURIComponent(tunnelId)}/viewers/${encodeURIComponent(viewerId)}`;
+
+export const addTunnelViewer = async (tunnelId, viewerId) => {
+  try {
+    await fetch(viewerUrl(tunnelId, viewerId), { method: "POST" });
+  } catch (err) {
+    console.error("Failed to notify tunnel service:", err);
+  }
+};
+
+export const heartbeatTunnelViewer = async (tunnelId, viewerId) => {
+  try {
+    const res = await fetch(`${viewerUrl(tunnelId, viewerId)}/heartbeat`, {
+      method: "PUT",
+    });
+    // 404: the viewer expired (e.g. a missed beat or a service restart), so add it again
+    if (res.status === 404) {
+      await addTunnelViewer(tunnelId, viewerId);
+    }
+  } catch (err) {
+    console.error("Failed to send viewer heartbeat:", err);
+  }
+};
+
+export const removeTunnelViewer = async (tunnelId, viewerId) => {
+  try {
+    await fetch(viewerUrl(tunnelId, viewerId), { method: "DELETE" });
+  } catch (err) {
+    console.error("Failed to notify tunnel service:", err);
+  }
+};
+
+// Keeps a viewer present for as long as its socket is connected
+export const startViewerHeartbeat = (tunnelId, viewerId) => {
+  addTunnelViewer(tunnelId, viewerId);
+  const timer = setInterval(
+    () => heartbeatTunnelViewer(tunnelId, viewerId),
+    VIEWER_HEARTBEAT_INTERVAL
+  );
+  return () => {
+    clearInterval(timer);
+    removeTunnelViewer(tunnelId, viewerId);
+  };
+};
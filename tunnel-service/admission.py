@@ -0,0 +1,189 @@
+import asyncio
+import logging
+import math
+from collections import deque
+from typing import Deque, Dict, Optional
+
+from config import settings
+from structured_logging import log_sampler
+
+logger = logging.getLogger(__name__)
+
+
+class Overloaded(Exception):
+    """Raised when a proxied request is shed instead of admitted"""
+
+    def __init__(self, retry_after: float):
+        super().__init__("Service overloaded")
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Global concurrency limit for proxied requests, with tier priority lanes
+
+    Requests beyond the limit wait briefly in a bounded queue; pro waiters
+    are admitted before free ones, and a pro arrival at a full queue
+    displaces the newest free waiter. Anything that can't get a slot within
+    ADMISSION_QUEUE_TIMEOUT is shed with a 503 so queued work never piles up.
+
+    The limit adapts to latency. Each completed request reports its latency
+    relative to its own tunnel's median, so slow apps don't look like
+    overload but a process-wide slowdown does. If the smoothed ratio exceeds
+    ADMISSION_LATENCY_TOLERANCE the limit shrinks in proportion; while
+    latency is healthy and the limit is actually being used it grows by
+    sqrt(limit).
+
+    Stream-classified requests (long-poll, SSE) can wait minutes for
+    headers, so they take a slot from a separate fixed pool instead and
+    can't starve ordinary requests.
+    """
+
+    LANES = ("pro", "free")
+
+    def __init__(self):
+        self.enabled = settings.ADMISSION_ENABLED
+        self.limit = float(settings.ADMISSION_INITIAL_LIMIT)
+        self.in_flight = 0
+        self.waiting = 0
+        self.streams = 0
+        self._lanes: Dict[str, Deque[asyncio.Future]] = {lane: deque() for lane in self.LANES}
+        self._ratio: Optional[float] = None
+        self._samples = 0
+        self._peak = 0
+
+        self.admitted = 0
+        self.shed: Dict[str, int] = {lane: 0 for lane in (*self.LANES, "stream")}
+
+    @staticmethod
+    def _lane(tier: str) -> str:
+        return "pro" if tier == "pro" else "free"
+
+    def _shed(self, lane: str) -> Overloaded:
+        self.shed[lane] += 1
+        if log_sampler.allow("request_shed"):
+            logger.warning(
+                "🚦 Shedding %s request (%d in flight, limit %d, %d waiting)",
+                lane, self.in_flight, int(self.limit), self.waiting,
+                extra=log_sampler.fields("request_shed", lane=lane, in_flight=self.in_flight,
+                                         limit=int(self.limit), waiting=self.waiting)
+            )
+        return Overloaded(settings.ADMISSION_RETRY_AFTER)
+
+    def _admit(self):
+        self.in_flight += 1
+        self.admitted += 1
+        self._peak = max(self._peak, self.in_flight)
+
+    async def acquire(self, tier: str):
+        """Take a slot, waiting briefly if none is free; raises Overloaded"""
+        if not self.enabled:
+            return
+        if self.in_flight < int(self.limit) and not self.waiting:
+            self._admit()
+            return
+
+        lane = self._lane(tier)
+        if self.waiting >= settings.ADMISSION_QUEUE_SIZE:
+            if lane != "pro" or not self._lanes["free"]:
+                raise self._shed(lane)
+            # Make room for a pro request at the expense of the newest free one
+            victim = self._lanes["free"].pop()
+            self.waiting -= 1
+            victim.set_exception(self._shed("free"))
+
+        future = asyncio.get_running_loop().create_future()
+        self._lanes[lane].append(future)
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(future, timeout=settings.ADMISSION_QUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            if self._granted(future):
+                return
+            self._dequeue(lane, future)
+            raise self._shed(lane)
+        except asyncio.CancelledError:
+            # Viewer went away while queued
+            if self._granted(future):
+                self.release(None)
+            else:
+                self._dequeue(lane, future)
+            raise
+
+    def acquire_stream(self):
+        """Take a slot in the stream pool; raises Overloaded when it is full"""
+        if not self.enabled:
+            return
+        if self.streams >= settings.ADMISSION_STREAM_LIMIT:
+            raise self._shed("stream")
+        self.streams += 1
+
+    def release_stream(self):
+        if not self.enabled:
+            return
+        self.streams -= 1
+
+    @staticmethod
+    def _granted(future: asyncio.Future) -> bool:
+        return future.done() and not future.cancelled() and future.exception() is None
+
+    def _dequeue(self, lane: str, future: asyncio.Future):
+        try:
+            self._lanes[lane].remove(future)
+            self.waiting -= 1
+        except ValueError:
+            pass  # already popped by _grant or displaced
+
+    def release(self, latency_ratio: Optional[float]):
+        """Return a slot; latency_ratio is latency / the tunnel's median, if known"""
+        if not self.enabled:
+            return
+        self.in_flight -= 1
+        if latency_ratio is not None:
+            self._observe(latency_ratio)
+        self._grant()
+
+    def _grant(self):
+        while self.in_flight < int(self.limit):
+            lane = next((lane for lane in self.LANES if self._lanes[lane]), None)
+            if lane is None:
+                return
+            future = self._lanes[lane].popleft()
+            self.waiting -= 1
+            if future.done():
+                continue
+            future.set_result(None)
+            self._admit()
+
+    def _observe(self, ratio: float):
+        self._ratio = ratio if self._ratio is None else 0.9 * self._ratio + 0.1 * ratio
+        self._samples += 1
+        if self._samples >= settings.ADMISSION_ADJUST_EVERY:
+            self._samples = 0
+            self._adjust()
+
+    def _adjust(self):
+        tolerance = settings.ADMISSION_LATENCY_TOLERANCE
+        old = int(self.limit)
+        if self._ratio > tolerance:
+            self.limit = max(settings.ADMISSION_MIN_LIMIT, self.limit * max(0.5, tolerance / self._ratio))
+        elif self._peak >= 0.8 * self.limit:
+            self.limit = min(settings.ADMISSION_MAX_LIMIT, self.limit + math.sqrt(self.limit))
+        self._peak = self.in_flight
+        if int(self.limit) != old:
+            logger.info(f"🚦 Proxy concurrency limit {old} -> {int(self.limit)} (latency x{self._ratio:.2f})")
+        self._grant()
+
+    def snapshot(self) -> dict:
+        return {
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "streams": self.streams,
+            "latency_ratio": round(self._ratio, 3) if self._ratio is not None else None,
+            "admitted": self.admitted,
+            "shed": dict(self.shed)
+        }
+
+
+# Global admission controller for the proxy
+admission = AdmissionController()
@@ -0,0 +1,216 @@
+import hashlib
+import logging
+import os
+import re
+import time
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+_HASH_RE = re.compile(r"^[0-9a-f]{64}$")
+_GZIP_WBITS = 16 + zlib.MAX_WBITS
+_CHUNK = 64 * 1024
+
+
+class AssetError(Exception):
+    """Raised for invalid uploads or manifests"""
+
+
+@dataclass(frozen=True)
+class AssetEntry:
+    """One file in a tunnel's static manifest (size is the verified uncompressed size)"""
+    sha256: str
+    size: int
+    content_type: str
+    compressed_size: int
+
+
+def inflate(chunks: Iterable[bytes], limit: int) -> Iterator[bytes]:
+    """Gunzip a stream of chunks, never producing more than limit bytes
+
+    Raises AssetError past the limit or on a corrupt or truncated stream,
+    so a small gzip bomb is rejected after inflating at most limit bytes.
+    """
+    decompressor = zlib.decompressobj(_GZIP_WBITS)
+    member_open = False
+    produced = 0
+    try:
+        for chunk in chunks:
+            if not chunk:
+                continue
+            member_open = True
+            while True:
+                out = decompressor.decompress(chunk, _CHUNK)
+                produced += len(out)
+                if produced > limit:
+                    raise AssetError("Blob content too large")
+                if out:
+                    yield out
+                if decompressor.eof:
+                    # Concatenated gzip members are still one valid file
+                    chunk = decompressor.unused_data
+                    decompressor = zlib.decompressobj(_GZIP_WBITS)
+                    member_open = bool(chunk)
+                    if not chunk:
+                        break
+                    continue
+                chunk = decompressor.unconsumed_tail
+                # A full chunk of output may leave more buffered inside zlib
+                if not chunk and len(out) < _CHUNK:
+                    break
+    except zlib.error:
+        raise AssetError("Blob is not valid gzip")
+    if member_open:
+        raise AssetError("Blob is not valid gzip")
+
+
+class AssetStore:
+    """Content-addressed store of gzip-compressed static files
+
+    Blobs live on local disk at ``<root>/blobs/<aa>/<sha256>.gz`` keyed by
+    the SHA-256 of the uncompressed content, so identical files are stored
+    once across tunnels and re-publishes. Each blob's verified uncompressed
+    size sits beside it in ``<sha256>.size``. Each tunnel has an in-memory
+    manifest mapping request paths to blobs; the proxy serves manifest hits
+    straight from disk without crossing the SSH tunnel.
+    """
+
+    def __init__(self, root: str = None):
+        self.root = Path(root or settings.ASSET_STORE_PATH)
+        self.manifests: Dict[str, Dict[str, AssetEntry]] = {}
+
+    @staticmethod
+    def valid_hash(sha256: str) -> bool:
+        return bool(_HASH_RE.match(sha256))
+
+    def blob_path(self, sha256: str) -> Path:
+        return self.root / "blobs" / sha256[:2] / f"{sha256}.gz"
+
+    def size_path(self, sha256: str) -> Path:
+        return self.blob_path(sha256).with_suffix(".size")
+
+    def has_blob(self, sha256: str) -> bool:
+        # Blobs stored before sizes were recorded are uploaded (and verified) again
+        return self.blob_path(sha256).exists() and self.size_path(sha256).exists()
+
+    def content_size(self, sha256: str) -> int:
+        return int(self.size_path(sha256).read_text())
+
+    def missing(self, hashes: Iterable[str]) -> List[str]:
+        """Hashes the store doesn't have yet (the only ones a client must upload)"""
+        return [h for h in dict.fromkeys(hashes) if self.valid_hash(h) and not self.has_blob(h)]
+
+    def put_blob(self, sha256: str, compressed: bytes) -> int:
+        """Verify and store a gzip blob, returning its uncompressed size
+
+        Blocking, so run it in an executor. The content is inflated in
+        chunks and hashed as it goes, capped at ASSET_MAX_CONTENT_BYTES.
+        """
+        if not self.valid_hash(sha256):
+            raise AssetError("Invalid hash")
+        if len(compressed) > settings.ASSET_MAX_BLOB_BYTES:
+            raise AssetError("Blob too large")
+        digest = hashlib.sha256()
+        size = 0
+        for chunk in inflate((compressed,), settings.ASSET_MAX_CONTENT_BYTES):
+            digest.update(chunk)
+            size += len(chunk)
+        # Content addressing is only safe if the name matches the bytes
+        if digest.hexdigest() != sha256:
+            raise AssetError("Hash does not match content")
+
+        path = self.blob_path(sha256)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # The size goes down first, so a blob on disk always has one
+        for target, data in ((self.size_path(sha256), str(size).encode()), (path, compressed)):
+            tmp = target.with_suffix(f".tmp{os.getpid()}")
+            tmp.write_bytes(data)
+            os.replace(tmp, target)
+        return size
+
+    def iter_content(self, sha256: str) -> Iterator[bytes]:
+        """Uncompressed content of a blob in chunks, for viewers without gzip; blocking"""
+        def read():
+            with open(self.blob_path(sha256), "rb") as f:
+                while chunk := f.read(_CHUNK):
+                    yield chunk
+        return inflate(read(), settings.ASSET_MAX_CONTENT_BYTES)
+
+    @staticmethod
+    def normalize_path(path: str) -> str:
+        path = "/" + path.lstrip("/")
+        if path.endswith("/"):
+            path += "index.html"
+        return path
+
+    def set_manifest(self, tunnel_id: str, files: Dict[str, dict]):
+        """Replace a tunnel's manifest; every referenced blob must already exist
+
+        Blocking (stats each blob), so run it in an executor.
+        """
+        if len(files) > settings.ASSET_MAX_FILES:
+            raise AssetError(f"Too many files (max {settings.ASSET_MAX_FILES})")
+
+        manifest = {}
+        missing = []
+        for path, info in files.items():
+            sha256 = info.get("sha256", "")
+            if not self.valid_hash(sha256):
+                raise AssetError(f"Invalid hash for {path}")
+            try:
+                stat = self.blob_path(sha256).stat()
+                size = self.content_size(sha256)
+            except FileNotFoundError:
+                missing.append(sha256)
+                continue
+            manifest[self.normalize_path(path)] = AssetEntry(
+                sha256=sha256,
+                size=size,
+                content_type=info.get("content_type") or "application/octet-stream",
+                compressed_size=stat.st_size
+            )
+        if missing:
+            raise AssetError(f"{len(missing)} blob(s) not uploaded")
+
+        now = time.time()
+        for entry in manifest.values():
+            # Mark blobs as recently used so prune() keeps them
+            os.utime(self.blob_path(entry.sha256), (now, now))
+        self.manifests[tunnel_id] = manifest
+
+    def drop_manifest(self, tunnel_id: str):
+        self.manifests.pop(tunnel_id, None)
+
+    def lookup(self, tunnel_id: str, path: str) -> Optional[AssetEntry]:
+        manifest = self.manifests.get(tunnel_id)
+        if not manifest:
+            return None
+        return manifest.get(self.normalize_path(path))
+
+    def prune(self) -> int:
+        """Delete unreferenced blobs unused for ASSET_BLOB_TTL_HOURS; blocking"""
+        referenced = {e.sha256 for m in self.manifests.values() for e in m.values()}
+        cutoff = time.time() - settings.ASSET_BLOB_TTL_HOURS * 3600
+        removed = 0
+        for path in self.root.glob("blobs/*/*.gz"):
+            if path.stem in referenced:
+                continue
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+                    path.with_suffix(".size").unlink(missing_ok=True)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+        if removed:
+            logger.info(f"🧹 Pruned {removed} unused static asset blob(s)")
+        return removed
+
+
+# Global asset store instance
+asset_store = AssetStore()
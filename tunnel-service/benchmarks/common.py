@@ -0,0 +1,183 @@
+"""
+Shared helpers for the tunnel-service benchmarks.
+Benchmarks run offline on a single box; nothing here touches the network
+beyond loopback.
+"""
+
+import asyncio
+import json
+import os
+import platform
+import resource
+import sys
+import time
+from pathlib import Path
+
+# Benchmarks import the service modules (config, tunnel_manager, ...) directly
+SERVICE_DIR = Path(__file__).resolve().parent.parent
+if str(SERVICE_DIR) not in sys.path:
+    sys.path.insert(0, str(SERVICE_DIR))
+
+
+def percentile(sorted_values, pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def rss_mb() -> float:
+    """Current resident set size in MB (Linux), falling back to peak RSS"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class CpuTimer:
+    """Measures wall time and process CPU time over a block"""
+
+    def __enter__(self):
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        return self
+
+    def __exit__(self, *exc):
+        self.wall = time.perf_counter() - self._wall
+        self.cpu = time.process_time() - self._cpu
+
+    @property
+    def cpu_percent(self) -> float:
+        return 100 * self.cpu / self.wall if self.wall else 0.0
+
+
+def write_report(path: str, name: str, results, **meta):
+    """Write benchmark results as JSON, with enough context to compare runs"""
+    report = {
+        "benchmark": name,
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        **meta,
+        "results": results,
+    }
+    Path(path).write_text(json.dumps(report, indent=2))
+    print(f"📝 Wrote {path}")
+
+
+class LatencyProxy:
+    """Loopback TCP proxy that adds a fixed one-way delay in each direction
+
+    Emulates a high-latency link without root/netem. Data keeps its order and
+    is released no earlier than ``delay`` seconds after it was read. stop()
+    cancels and awaits the connections still being relayed.
+    """
+
+    def __init__(self, target_host: str, target_port: int, rtt_ms: float):
+        self.target_host = target_host
+        self.target_port = target_port
+        self.delay = rtt_ms / 2000
+        self.server = None
+        self.port = None
+        self._tasks = set()
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self.server:
+            self.server.close()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self.server:
+            await self.server.wait_closed()
+
+    async def _handle(self, client_reader, client_writer):
+        task = asyncio.current_task()
+        self._tasks.add(task)
+        try:
+            await self._relay(client_reader, client_writer)
+        except asyncio.CancelledError:
+            pass  # stop() is tearing the proxy down
+        finally:
+            self._tasks.discard(task)
+
+    async def _relay(self, client_reader, client_writer):
+        try:
+            upstream_reader, upstream_writer = await asyncio.open_connection(
+                self.target_host, self.target_port
+            )
+        except OSError:
+            client_writer.close()
+            return
+        try:
+            await asyncio.gather(
+                self._pipe(client_reader, upstream_writer),
+                self._pipe(upstream_reader, client_writer),
+                return_exceptions=True
+            )
+        finally:
+            client_writer.close()
+            upstream_writer.close()
+
+    async def _pipe(self, reader, writer):
+        queue = asyncio.Queue()
+
+        async def release():
+            loop = asyncio.get_running_loop()
+            while True:
+                due, data = await queue.get()
+                wait = due - loop.time()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                if data is None:
+                    break
+                writer.write(data)
+                await writer.drain()
+            writer.close()
+
+        releaser = asyncio.create_task(release())
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                queue.put_nowait((loop.time() + self.delay, data))
+            queue.put_nowait((loop.time() + self.delay, None))
+            await releaser
+        finally:
+            if not releaser.done():
+                releaser.cancel()
+                await asyncio.gather(releaser, return_exceptions=True)
+
+
+def compare_reports(baseline_path: str, results, key: str, metrics, threshold: float) -> list:
+    """Compare results against a saved report; returns regression messages
+
+    ``key`` identifies matching rows, ``metrics`` maps metric name to
+    "higher" or "lower" (which direction is better). A regression is a move
+    in the wrong direction by more than ``threshold`` (e.g. 0.2 = 20%).
+    """
+    baseline = {row[key]: row for row in json.loads(Path(baseline_path).read_text())["results"]}
+    regressions = []
+    for row in results:
+        old = baseline.get(row[key])
+        if old is None:
+            continue
+        for metric, better in metrics.items():
+            before, after = old.get(metric), row.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            if (better == "lower" and change > threshold) or (better == "higher" and change < -threshold):
+                regressions.append(
+                    f"{key}={row[key]} {metric}: {before:.4g} -> {after:.4g} ({change:+.1%})"
+                )
+    return regressions
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test for one tunnel-service instance
+Starts the service in-process (FastAPI + SSH server), connects synthetic
+creators with asyncssh, forwards their tunnels to a local fake app and drives
+/live/... traffic at a fixed concurrency. Runs fully offline on loopback.
+
+Usage:
+  python benchmarks/load_test.py --tunnels 1,100,1000 --concurrency 64 --requests 5000
+  python benchmarks/load_test.py --json run.json --compare baseline.json --max-regression 0.2
+
+Note: the load generator, fake app and creators share the process with the
+service, so CPU/RSS are an upper bound for the service alone.
+"""
+
+import argparse
+import asyncio
+import os
+import resource
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+import common  # noqa: F401  (sets up the import path)
+from common import CpuTimer, compare_reports, percentile, rss_mb, write_report
+
+import aiohttp
+import asyncssh
+from aiohttp import web
+
+
+def configure_service(args, workdir: Path):
+    """Point the service at loopback ports before its modules are imported"""
+    host_key = asyncssh.generate_private_key("ssh-ed25519")
+    key_path = workdir / "ssh_host_key"
+    host_key.write_private_key(str(key_path))
+
+    os.environ.update({
+        "HOST": "127.0.0.1",
+        "PORT": str(args.http_port),
+        "SSH_HOST": "127.0.0.1",
+        "SSH_PORT": str(args.ssh_port),
+        "SSH_HOST_KEY_PATH": str(key_path),
+        "PUBLIC_DOMAIN": f"127.0.0.1:{args.http_port}",
+        "NODEJS_BACKEND_URL": f"http://127.0.0.1:{args.backend_port}",
+        "MAX_VIEWERS_FREE": "1000000",
+        # No MongoDB here; keep the ledger and its WAL out of the run and the working directory
+        "USAGE_LEDGER_ENABLED": "false",
+        "USAGE_WAL_PATH": str(workdir / "usage_wal"),
+    })
+
+
+async def start_backend_stub(port: int):
+    """Accepts the service's webhooks so nothing leaves the box"""
+
+    async def webhook(request):
+        await request.read()
+        return web.json_response({"message": "Webhook received"})
+
+    app = web.Application()
+    app.router.add_post("/api/tunnels/webhook/{kind}", webhook)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
+
+
+async def start_fake_app(response_bytes: int, latency_ms: float):
+    """The creator's local app: fixed-size response after a fixed delay"""
+    body = b"x" * response_bytes
+
+    async def handler(request):
+        if latency_ms:
+            await asyncio.sleep(latency_ms / 1000)
+        return web.Response(body=body, content_type="text/html")
+
+    app = web.Application()
+    app.router.add_route("*", "/{tail:.*}", handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", 0).start()
+    return runner, runner.addresses[0][1]
+
+
+class SyntheticCreator:
+    """One creator: an SSH connection with a single reverse forward"""
+
+    def __init__(self, index: int):
+        self.user_id = uuid.uuid4().hex[:24]
+        self.username = f"creator{index}"
+        self.project_name = f"bench-{index}"
+        self.tunnel_id = f"tunnel_{self.user_id}_{index}"
+        self.conn = None
+
+    async def connect(self, ssh_port: int, app_port: int):
+        from config import settings
+        from tunnel_tokens import TunnelClaims, sign_tunnel_token
+        from user_resolver import UserProfile, user_resolver
+
+        # Keep username resolution off MongoDB
+        user_resolver.prime(UserProfile(self.user_id, self.username))
+
+        token = sign_tunnel_token(TunnelClaims(
+            user_id=self.user_id,
+            tunnel_id=self.tunnel_id,
+            project_name=self.project_name,
+            local_port=app_port,
+            tier="pro",
+            expires_at=int(time.time()) + 3600,
+            nonce=uuid.uuid4().hex
+        ), settings.TUNNEL_SECRET_KEY)
+
+        self.conn = await asyncssh.connect(
+            "127.0.0.1", ssh_port,
+            username=f"{self.user_id}:{self.tunnel_id}:{self.project_name}",
+            password=token,
+            known_hosts=None,
+            encoding=None
+        )
+        await self.conn.forward_remote_port("", 0, "127.0.0.1", app_port)
+
+    @property
+    def path(self) -> str:
+        return f"/live/{self.username}/{self.project_name}/bench"
+
+    async def close(self):
+        if self.conn:
+            self.conn.close()
+            await self.conn.wait_closed()
+
+
+async def drive_load(base_url: str, creators, concurrency: int, total_requests: int) -> dict:
+    """Issue total_requests GETs spread round-robin over creators"""
+    latencies = []
+    errors = 0
+    counter = iter(range(total_requests))
+
+    async def worker(session):
+        nonlocal errors
+        for i in counter:
+            url = base_url + creators[i % len(creators)].path
+            start = time.perf_counter()
+            try:
+                async with session.get(url) as response:
+                    await response.read()
+                    if response.status != 200:
+                        errors += 1
+                        continue
+            except aiohttp.ClientError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        with CpuTimer() as timer:
+            await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+
+    latencies.sort()
+    return {
+        "requests": total_requests,
+        "errors": errors,
+        "rps": len(latencies) / timer.wall if timer.wall else 0.0,
+        "p50_ms": 1000 * percentile(latencies, 50),
+        "p95_ms": 1000 * percentile(latencies, 95),
+        "p99_ms": 1000 * percentile(latencies, 99),
+        "cpu_percent": timer.cpu_percent,
+        "rss_mb": rss_mb(),
+    }
+
+
+async def run(args):
+    import uvicorn
+    from main import app
+    from tunnel_manager import tunnel_manager
+
+    backend = await start_backend_stub(args.backend_port)
+    fake_app, app_port = await start_fake_app(args.response_bytes, args.app_latency)
+
+    server = uvicorn.Server(uvicorn.Config(
+        app, host="127.0.0.1", port=args.http_port,
+        log_level="warning", access_log=False, lifespan="on"
+    ))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    base_url = f"http://127.0.0.1:{args.http_port}"
+    creators = []
+    results = []
+    try:
+        for target in args.tunnels:
+            # Connect creators in batches to keep the handshake burst bounded
+            while len(creators) < target:
+                batch = [SyntheticCreator(len(creators) + i)
+                         for i in range(min(50, target - len(creators)))]
+                await asyncio.gather(*(c.connect(args.ssh_port, app_port) for c in batch))
+                creators.extend(batch)
+
+            if len(tunnel_manager.tunnels) < target:
+                print(f"⚠️  Only {len(tunnel_manager.tunnels)}/{target} tunnels registered")
+
+            result = await drive_load(base_url, creators, args.concurrency, args.requests)
+            result["tunnels"] = target
+            results.append(result)
+            print(
+                f"{target:>6} tunnels  {result['rps']:>9.1f} rps  "
+                f"p50 {result['p50_ms']:>7.2f}ms  p95 {result['p95_ms']:>7.2f}ms  "
+                f"p99 {result['p99_ms']:>7.2f}ms  CPU {result['cpu_percent']:>5.1f}%  "
+                f"RSS {result['rss_mb']:>7.1f}MB  errors {result['errors']}"
+            )
+    finally:
+        await asyncio.gather(*(c.close() for c in creators), return_exceptions=True)
+        server.should_exit = True
+        await server_task
+        await fake_app.cleanup()
+        await backend.cleanup()
+
+    if args.json:
+        write_report(args.json, "load_test", results,
+                     concurrency=args.concurrency, requests=args.requests,
+                     response_bytes=args.response_bytes, app_latency_ms=args.app_latency)
+
+    if args.compare:
+        regressions = compare_reports(
+            args.compare, results, "tunnels",
+            {"rps": "higher", "p99_ms": "lower", "rss_mb": "lower"},
+            args.max_regression
+        )
+        for line in regressions:
+            print(f"❌ Regression: {line}")
+        if regressions:
+            sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end tunnel-service load test")
+    parser.add_argument("--tunnels", default="1,100,1000",
+                        help="Comma-separated fleet sizes to measure (default: 1,100,1000)")
+    parser.add_argument("--concurrency", type=int, default=64, help="Concurrent viewer requests")
+    parser.add_argument("--requests", type=int, default=5000, help="Requests per fleet size")
+    parser.add_argument("--response-bytes", type=int, default=16 * 1024, help="Fake app response size")
+    parser.add_argument("--app-latency", type=float, default=0, help="Fake app latency in ms")
+    parser.add_argument("--http-port", type=int, default=18001)
+    parser.add_argument("--ssh-port", type=int, default=12222)
+    parser.add_argument("--backend-port", type=int, default=15003)
+    parser.add_argument("--json", help="Write results to this JSON file")
+    parser.add_argument("--compare", help="Baseline JSON report to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="Allowed relative regression before failing (default: 0.2)")
+    args = parser.parse_args()
+    args.tunnels = [int(n) for n in args.tunnels.split(",")]
+
+    # Every tunnel costs a few file descriptors on each side
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    with tempfile.TemporaryDirectory() as workdir:
+        configure_service(args, Path(workdir))
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
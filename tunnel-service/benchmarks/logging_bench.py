@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Logging overhead under viewer churn
+Runs add_viewer/remove_viewer churn on the event loop and compares the old
+synchronous stderr logging (basicConfig) with the queued, sampled JSON setup
+in structured_logging. Reports per-operation loop time and loop lag.
+
+Usage: python benchmarks/logging_bench.py --ops 200000
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+
+import common  # noqa: F401  (sets up the import path)
+from common import percentile, write_report
+
+import structured_logging
+from structured_logging import EventSampler
+from tunnel_manager import TunnelConnection, TunnelManager
+
+
+def reset_root_logger():
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+
+
+def configure(mode: str, log_path: str):
+    """Install one of the logging setups, writing to log_path in place of stderr"""
+    reset_root_logger()
+    structured_logging.stop_logging()
+    stream = open(log_path, "w")
+    sys.stderr = stream
+
+    if mode == "sync":
+        # What main.py / tunnel_manager.py used to do
+        logging.basicConfig(level=logging.INFO, stream=stream)
+        structured_logging.log_sampler = EventSampler(sample_rate=1, rate_limit=0)
+    else:
+        structured_logging.setup_logging()
+        structured_logging.log_sampler = EventSampler()
+
+    # tunnel_manager imported the sampler by name; point it at the new one
+    import tunnel_manager
+    tunnel_manager.log_sampler = structured_logging.log_sampler
+    return stream
+
+
+async def measure_lag(stop: asyncio.Event, samples: list, interval: float = 0.005):
+    """Record how late a periodic wakeup fires while churn runs"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, loop.time() - expected))
+
+
+async def churn(ops: int) -> dict:
+    manager = TunnelManager()
+    tunnels = [f"tunnel_{i}" for i in range(100)]
+    for tunnel_id in tunnels:
+        manager.tunnels[tunnel_id] = TunnelConnection(
+            tunnel_id=tunnel_id, user_id="u", username="creator",
+            project_name=tunnel_id, local_port=3000, remote_port=10000
+        )
+
+    stop = asyncio.Event()
+    lag = []
+    lag_task = asyncio.create_task(measure_lag(stop, lag))
+
+    start = time.perf_counter()
+    for i in range(ops):
+        tunnel_id = tunnels[i % len(tunnels)]
+        viewer_id = f"viewer_{i % 5000}"
+        await manager.add_viewer(tunnel_id, viewer_id)
+        await manager.remove_viewer(tunnel_id, viewer_id)
+        if i % 100 == 0:
+            await asyncio.sleep(0)  # let the lag probe run, like real request interleaving
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await lag_task
+    lag.sort()
+    return {
+        "us_per_churn": 1e6 * elapsed / ops,
+        "lag_p50_ms": 1000 * percentile(lag, 50),
+        "lag_p99_ms": 1000 * percentile(lag, 99),
+        "lag_max_ms": 1000 * (lag[-1] if lag else 0.0),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Logging overhead under viewer churn")
+    parser.add_argument("--ops", type=int, default=100000, help="Join+leave pairs per mode")
+    parser.add_argument("--log-path", default=os.devnull,
+                        help="Where log output goes (default: /dev/null)")
+    parser.add_argument("--json", help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    real_stderr = sys.stderr
+    results = []
+    for mode in ("sync", "queued"):
+        stream = configure(mode, args.log_path)
+        result = asyncio.run(churn(args.ops))
+        structured_logging.stop_logging()
+        reset_root_logger()
+        sys.stderr = real_stderr
+        stream.close()
+
+        result["mode"] = mode
+        results.append(result)
+        print(
+            f"{mode:<8}{result['us_per_churn']:>10.2f} µs/churn  "
+            f"lag p50 {result['lag_p50_ms']:>6.2f}ms  p99 {result['lag_p99_ms']:>6.2f}ms  "
+            f"max {result['lag_max_ms']:>6.2f}ms"
+        )
+
+    if args.json:
+        write_report(args.json, "logging", results, ops=args.ops)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Memory soak test: open and close thousands of tunnels, then check for leaks
+Runs the service in-process (same harness as load_test.py), cycles batches of
+synthetic creators through connect -> viewers + traffic -> disconnect, and
+compares memory after the run with a baseline taken after warm-up.
+
+Fails (exit 1) if per-tunnel state is left behind or traced Python memory
+grows by more than --max-growth-kb. RSS is reported but only enforced with
+--max-rss-growth-mb, since allocators rarely hand freed memory back.
+
+Usage:
+  python benchmarks/memory_soak.py --tunnels 5000 --batch 100
+  python benchmarks/memory_soak.py --tunnels 2000 --json soak.json --max-rss-growth-mb 50
+"""
+
+import argparse
+import asyncio
+import gc
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import common  # noqa: F401  (sets up the import path)
+from common import rss_mb, write_report
+from load_test import SyntheticCreator, configure_service, drive_load, start_backend_stub, start_fake_app
+
+
+async def run_batch(base_url: str, creators, args, app_port: int):
+    """Connect a batch, give it viewers and traffic, then disconnect it"""
+    from tunnel_manager import tunnel_manager
+
+    await asyncio.gather(*(c.connect(args.ssh_port, app_port) for c in creators))
+    for creator in creators:
+        for v in range(args.viewers):
+            await tunnel_manager.add_viewer(creator.tunnel_id, f"viewer_{v}")
+        # Half the viewers leave politely; the rest go away with the tunnel
+        for v in range(args.viewers // 2):
+            await tunnel_manager.remove_viewer(creator.tunnel_id, f"viewer_{v}")
+    if args.requests_per_tunnel:
+        await drive_load(base_url, creators, min(32, len(creators)), args.requests_per_tunnel * len(creators))
+    await asyncio.gather(*(c.close() for c in creators), return_exceptions=True)
+
+
+async def wait_drained(timeout: float = 30):
+    from tunnel_manager import tunnel_manager
+
+    deadline = time.monotonic() + timeout
+    while tunnel_manager.tunnels and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+    # Let connection_lost callbacks and cancelled relays finish
+    await asyncio.sleep(0.5)
+
+
+def measure() -> dict:
+    from memory_diagnostics import count_objects
+
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    return {"traced_kb": current / 1024, "rss_mb": rss_mb(), "objects": count_objects()["watched"]}
+
+
+def leftover_state() -> dict:
+    """Per-tunnel bookkeeping that must be empty once every tunnel is gone"""
+    from tunnel_manager import tunnel_manager
+
+    return {
+        "tunnels": len(tunnel_manager.tunnels),
+        "used_ports": len(tunnel_manager.used_ports),
+        "routes": len(tunnel_manager._routes),
+        "viewers": tunnel_manager.viewer_count(),
+        "background_tasks": len(tunnel_manager._background_tasks),
+    }
+
+
+async def run(args):
+    import uvicorn
+    from main import app
+
+    backend = await start_backend_stub(args.backend_port)
+    fake_app, app_port = await start_fake_app(1024, 0)
+    server = uvicorn.Server(uvicorn.Config(
+        app, host="127.0.0.1", port=args.http_port,
+        log_level="warning", access_log=False, lifespan="on"
+    ))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    base_url = f"http://127.0.0.1:{args.http_port}"
+    index = 0
+
+    async def cycle(count: int):
+        nonlocal index
+        done = 0
+        while done < count:
+            creators = [SyntheticCreator(index + i) for i in range(min(args.batch, count - done))]
+            index += len(creators)
+            await run_batch(base_url, creators, args, app_port)
+            done += len(creators)
+        await wait_drained()
+
+    failures = []
+    try:
+        # Warm caches, pools and lazily imported code before the baseline
+        await cycle(args.warmup)
+        baseline = measure()
+        print(f"📏 Baseline: traced {baseline['traced_kb']:.0f} KB, RSS {baseline['rss_mb']:.1f} MB")
+
+        started = time.perf_counter()
+        for round_start in range(0, args.tunnels, args.report_every):
+            await cycle(min(args.report_every, args.tunnels - round_start))
+            now = measure()
+            print(f"🔁 {round_start + min(args.report_every, args.tunnels - round_start):>7} tunnels  "
+                  f"traced {now['traced_kb'] - baseline['traced_kb']:>+9.1f} KB  "
+                  f"RSS {now['rss_mb'] - baseline['rss_mb']:>+7.1f} MB")
+        elapsed = time.perf_counter() - started
+
+        final = measure()
+        leftovers = leftover_state()
+    finally:
+        server.should_exit = True
+        await server_task
+        await fake_app.cleanup()
+        await backend.cleanup()
+
+    traced_growth = final["traced_kb"] - baseline["traced_kb"]
+    rss_growth = final["rss_mb"] - baseline["rss_mb"]
+    print(f"\n{args.tunnels} tunnels in {elapsed:.1f}s: traced {traced_growth:+.1f} KB, RSS {rss_growth:+.1f} MB")
+
+    for name, count in leftovers.items():
+        if count:
+            failures.append(f"{count} {name} left after all tunnels closed")
+    for name, count in final["objects"].items():
+        if count > baseline["objects"].get(name, 0):
+            failures.append(f"{name}: {baseline['objects'].get(name, 0)} -> {count} live objects")
+    if traced_growth > args.max_growth_kb:
+        failures.append(f"traced memory grew {traced_growth:.1f} KB (max {args.max_growth_kb} KB)")
+    if args.max_rss_growth_mb is not None and rss_growth > args.max_rss_growth_mb:
+        failures.append(f"RSS grew {rss_growth:.1f} MB (max {args.max_rss_growth_mb} MB)")
+
+    if args.json:
+        write_report(args.json, "memory_soak", [{
+            "tunnels": args.tunnels,
+            "traced_growth_kb": traced_growth,
+            "rss_growth_mb": rss_growth,
+            "seconds": elapsed,
+            "leftovers": leftovers,
+            "objects": final["objects"],
+        }], batch=args.batch, viewers=args.viewers, requests_per_tunnel=args.requests_per_tunnel)
+
+    for line in failures:
+        print(f"❌ {line}")
+    if failures:
+        sys.exit(1)
+    print("✅ Memory returned to baseline")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tunnel open/close memory soak test")
+    parser.add_argument("--tunnels", type=int, default=5000, help="Tunnels to open and close")
+    parser.add_argument("--batch", type=int, default=100, help="Tunnels open at the same time")
+    parser.add_argument("--warmup", type=int, default=200, help="Tunnels cycled before the baseline")
+    parser.add_argument("--viewers", type=int, default=4, help="Viewers added per tunnel")
+    parser.add_argument("--requests-per-tunnel", type=int, default=2, help="Proxied requests per tunnel")
+    parser.add_argument("--report-every", type=int, default=1000, help="Tunnels between progress lines")
+    parser.add_argument("--max-growth-kb", type=float, default=1024,
+                        help="Allowed traced Python memory growth (default: 1024 KB)")
+    parser.add_argument("--max-rss-growth-mb", type=float, help="Also fail if RSS grows more than this")
+    parser.add_argument("--frames", type=int, default=1, help="tracemalloc frames per allocation")
+    parser.add_argument("--http-port", type=int, default=18001)
+    parser.add_argument("--ssh-port", type=int, default=12222)
+    parser.add_argument("--backend-port", type=int, default=15003)
+    parser.add_argument("--json", help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    with tempfile.TemporaryDirectory() as workdir:
+        configure_service(args, Path(workdir))
+        os.environ.update({
+            # Disconnected tunnels close at once instead of waiting for a reconnect
+            "TUNNEL_RECONNECT_GRACE": "0",
+            "ASSET_STORE_PATH": str(Path(workdir) / "assets"),
+        })
+        tracemalloc.start(args.frames)
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
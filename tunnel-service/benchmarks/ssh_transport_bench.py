@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+SSH transport profile benchmark
+Measures MB/s and CPU per tunnel for each profile in config.SSH_TRANSPORT_PROFILES
+over a loopback link with emulated latency. Tunnels go through the service's
+own SSH server (TunnelManager + SSHTunnelServer + TunnelListener), so token
+auth and the listener's relay are part of what is measured.
+
+Usage: python benchmarks/ssh_transport_bench.py --rtt 80 --size 64 --tunnels 4
+"""
+
+import argparse
+import asyncio
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+import common  # noqa: F401  (sets up the import path)
+from common import CpuTimer, LatencyProxy, write_report
+from load_test import start_backend_stub
+
+import asyncssh
+from config import SSH_TRANSPORT_PROFILES, settings, ssh_transport_options
+from tunnel_manager import TunnelManager
+from tunnel_tokens import TunnelClaims, sign_tunnel_token
+from user_resolver import UserProfile, user_resolver
+
+CHUNK = b"x" * 65536
+
+
+def configure_service(workdir: Path, backend_port: int):
+    """Loopback SSH server with a throwaway host key; webhooks go to the stub"""
+    key_path = workdir / "ssh_host_key"
+    asyncssh.generate_private_key("ssh-ed25519").write_private_key(str(key_path))
+    settings.SSH_HOST = "127.0.0.1"
+    settings.SSH_PORT = 0
+    settings.SSH_HOST_KEY_PATH = str(key_path)
+    settings.NODEJS_BACKEND_URL = f"http://127.0.0.1:{backend_port}"
+
+
+async def connect_creator(index: int, ssh_port: int, app_port: int, options: dict):
+    """A creator logging in with a signed tunnel token, as the CLI does"""
+    user_id = uuid.uuid4().hex[:24]
+    tunnel_id = f"tunnel_{user_id}_{index}"
+    project_name = f"bench-{index}"
+    # Keep username resolution off MongoDB
+    user_resolver.prime(UserProfile(user_id, f"creator{index}"))
+    token = sign_tunnel_token(TunnelClaims(
+        user_id=user_id,
+        tunnel_id=tunnel_id,
+        project_name=project_name,
+        local_port=app_port,
+        tier="pro",
+        expires_at=int(time.time()) + 3600,
+        nonce=uuid.uuid4().hex
+    ), settings.TUNNEL_SECRET_KEY)
+
+    conn = await asyncssh.connect(
+        "127.0.0.1", ssh_port,
+        username=f"{user_id}:{tunnel_id}:{project_name}",
+        password=token,
+        known_hosts=None,
+        encoding=None,
+        # The creator side negotiates with the same preferences
+        **options
+    )
+    await conn.forward_remote_port("", 0, "127.0.0.1", app_port)
+    return conn, tunnel_id
+
+
+async def start_fake_app(payload_bytes: int):
+    """Local 'creator app' that streams payload_bytes to every connection"""
+
+    async def handle(reader, writer):
+        remaining = payload_bytes
+        while remaining > 0:
+            chunk = CHUNK[:min(len(CHUNK), remaining)]
+            writer.write(chunk)
+            remaining -= len(chunk)
+            await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    return server, server.sockets[0].getsockname()[1]
+
+
+async def pull(port: int) -> int:
+    """Act as a viewer: read everything the tunnel sends"""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    total = 0
+    while True:
+        data = await reader.read(262144)
+        if not data:
+            break
+        total += len(data)
+    writer.close()
+    return total
+
+
+async def bench_profile(name: str, rtt_ms: float, size_mb: int, tunnels: int) -> dict:
+    settings.SSH_TRANSPORT_PROFILE = name
+    options = ssh_transport_options(name)
+    manager = TunnelManager()
+    await manager.start_ssh_server()
+    proxy = await LatencyProxy("127.0.0.1", manager.ssh_server.get_port(), rtt_ms).start()
+    app_server, app_port = await start_fake_app(size_mb * 1024 * 1024)
+
+    conns = []
+    try:
+        creators = await asyncio.gather(*(
+            connect_creator(i, proxy.port, app_port, options) for i in range(tunnels)
+        ))
+        conns = [conn for conn, _ in creators]
+        ports = [manager.tunnels[tunnel_id].remote_port for _, tunnel_id in creators]
+        cipher = conns[0].get_extra_info("send_cipher")
+
+        with CpuTimer() as timer:
+            received = await asyncio.gather(*(pull(port) for port in ports))
+    finally:
+        for conn in conns:
+            conn.close()
+            await conn.wait_closed()
+        # The disconnects cross the proxy's delay; let the server see them
+        # before the proxy is torn down, then drop the detached tunnels
+        # instead of waiting out TUNNEL_RECONNECT_GRACE
+        deadline = time.monotonic() + 5
+        while (any(t.status == "active" for t in manager.tunnels.values())
+               and time.monotonic() < deadline):
+            await asyncio.sleep(0.01)
+        for tunnel_id in list(manager.tunnels):
+            await manager.close_tunnel(tunnel_id)
+        app_server.close()
+        await proxy.stop()
+        manager.ssh_server.close()
+        manager.presence.close()
+
+    total_mb = sum(received) / (1024 * 1024)
+    return {
+        "profile": name,
+        "cipher": cipher,
+        "tunnels": tunnels,
+        "rtt_ms": rtt_ms,
+        "mb_per_s_total": total_mb / timer.wall,
+        "mb_per_s_per_tunnel": total_mb / timer.wall / tunnels,
+        # Both SSH ends run in this process, so this is client + server CPU
+        "cpu_percent": timer.cpu_percent,
+        "cpu_seconds_per_tunnel": timer.cpu / tunnels,
+        "cpu_ms_per_mb": 1000 * timer.cpu / total_mb if total_mb else 0.0,
+    }
+
+
+async def run(args):
+    profiles = args.profile or list(SSH_TRANSPORT_PROFILES)
+    backend = await start_backend_stub(0)
+    results = []
+    print(f"{'profile':<16}{'cipher':<32}{'MB/s/tunnel':>12}{'CPU %':>8}{'CPU ms/MB':>11}")
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            configure_service(Path(workdir), backend.addresses[0][1])
+            for name in profiles:
+                result = await bench_profile(name, args.rtt, args.size, args.tunnels)
+                results.append(result)
+                print(
+                    f"{name:<16}{str(result['cipher']):<32}"
+                    f"{result['mb_per_s_per_tunnel']:>12.2f}"
+                    f"{result['cpu_percent']:>8.1f}"
+                    f"{result['cpu_ms_per_mb']:>11.2f}"
+                )
+    finally:
+        await backend.cleanup()
+    if args.json:
+        write_report(args.json, "ssh_transport", results,
+                     rtt_ms=args.rtt, size_mb=args.size, tunnels=args.tunnels)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark SSH transport profiles")
+    parser.add_argument("--profile", action="append", choices=list(SSH_TRANSPORT_PROFILES),
+                        help="Profile to run (repeatable, default: all)")
+    parser.add_argument("--rtt", type=float, default=80, help="Emulated round-trip time in ms")
+    parser.add_argument("--size", type=int, default=64, help="MB transferred per tunnel")
+    parser.add_argument("--tunnels", type=int, default=1, help="Concurrent tunnels")
+    parser.add_argument("--json", help="Write results to this JSON file")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks for TunnelManager hot operations and the monitor sweeps
+Builds fleets of in-memory tunnels (fake SSH connections, no sockets) and
+times each operation per call.
+
+Usage:
+  python benchmarks/tunnel_manager_bench.py --sizes 10,1000,100000 --json run.json
+  python benchmarks/tunnel_manager_bench.py --compare baseline.json --max-regression 0.25
+"""
+
+import argparse
+import asyncio
+import logging
+import random
+import statistics
+import sys
+import time
+import types
+
+import common  # noqa: F401  (sets up the import path)
+from common import compare_reports, write_report
+
+import aiohttp
+import health_monitor
+from health_monitor import TunnelHealthMonitor, TunnelMetricsCollector
+from tunnel_manager import TunnelConnection, TunnelManager
+from tunnel_listing import TunnelListing
+
+
+class FakeSSHConnection:
+    """Stands in for asyncssh.SSHServerConnection in health checks"""
+
+    def is_closing(self):
+        return False
+
+
+class FakeResponse:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeSession:
+    """Swallows webhook posts so sweeps don't touch the network"""
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def post(self, url, json=None, timeout=None):
+        return FakeResponse()
+
+
+def build_manager(size: int) -> TunnelManager:
+    manager = TunnelManager()
+    conn = FakeSSHConnection()
+    for i in range(size):
+        tunnel = TunnelConnection(
+            tunnel_id=f"tunnel_{i}",
+            user_id=f"user_{i // 5}",
+            username=f"creator{i // 5}",
+            project_name=f"project-{i % 5}",
+            local_port=3000,
+            remote_port=10000 + i,
+            ssh_connection=conn
+        )
+        tunnel.viewers.update(f"viewer_{j}" for j in range(i % 8))
+        manager.tunnels[tunnel.tunnel_id] = tunnel
+        manager._routes.setdefault(manager._route_key(tunnel.username, tunnel.project_name), tunnel.tunnel_id)
+    return manager
+
+
+async def time_op(op, iterations: int, repeats: int) -> float:
+    """Median nanoseconds per call of an async op(i) over several repeats"""
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter_ns()
+        for i in range(iterations):
+            await op(i)
+        samples.append((time.perf_counter_ns() - start) / iterations)
+    return statistics.median(samples)
+
+
+async def bench_size(size: int, iterations: int, repeats: int) -> list:
+    manager = build_manager(size)
+    rng = random.Random(size)
+    ids = [f"tunnel_{rng.randrange(size)}" for _ in range(iterations)]
+    lookups = [(f"creator{n // 5}", f"project-{n % 5}")
+               for n in (rng.randrange(size) for _ in range(iterations))]
+    users = [f"user_{rng.randrange(max(1, size // 5))}" for _ in range(iterations)]
+
+    async def get_tunnel(i):
+        await manager.get_tunnel(ids[i])
+
+    async def get_by_username_project(i):
+        await manager.get_tunnel_by_username_project(*lookups[i])
+
+    async def get_user_tunnels(i):
+        await manager.get_user_tunnels(users[i])
+
+    async def allocate_release(i):
+        port = await manager.allocate_port()
+        await manager.release_port(port)
+
+    async def add_remove_viewer(i):
+        await manager.add_viewer(ids[i], "bench-viewer")
+        await manager.remove_viewer(ids[i], "bench-viewer")
+
+    async def update_stats(i):
+        await manager.update_stats(ids[i])
+
+    listing = TunnelListing(manager)
+    
+    async def listing_page_cached(i):
+        listing.page()
+    
+    async def listing_page_after_viewer(i):
+        # One viewer joins, then the feed polls: only that entry is re-encoded
+        await manager.add_viewer(ids[i], f"poll-viewer-{i}")
+        listing.page()
+    
+    async def listing_page_after_change(i):
+        # A tunnel is added, removed or changes status: full rebuild
+        manager.version += 1
+        listing.page()
+    
+    monitor = TunnelHealthMonitor(manager)
+    collector = TunnelMetricsCollector(manager)
+
+    async def collect_metrics(i):
+        await collector._collect_metrics()
+
+    async def health_sweep(i):
+        await monitor._check_all_tunnels()
+
+    # Fleet-wide sweeps are O(n); scale iterations down so large fleets stay quick
+    sweep_iterations = max(1, min(iterations, 100_000 // size))
+
+    ops = [
+        ("get_tunnel", get_tunnel, iterations),
+        ("get_tunnel_by_username_project", get_by_username_project, iterations),
+        ("get_user_tunnels", get_user_tunnels, iterations),
+        ("allocate_port+release_port", allocate_release, iterations),
+        ("add_viewer+remove_viewer", add_remove_viewer, iterations),
+        ("update_stats", update_stats, iterations),
+        ("listing.page (cached)", listing_page_cached, iterations),
+        ("listing.page (after viewer)", listing_page_after_viewer, iterations),
+        ("listing.page (after change)", listing_page_after_change, sweep_iterations),
+        ("metrics._collect_metrics", collect_metrics, sweep_iterations),
+        ("health._check_all_tunnels", health_sweep, sweep_iterations),
+    ]
+
+    results = []
+    for name, op, n in ops:
+        ns = await time_op(op, n, repeats)
+        results.append({"name": f"{name}@{size}", "op": name, "size": size, "ns_per_op": ns})
+        print(f"{name:<34}{size:>8}{ns / 1000:>14.2f} µs/op")
+    return results
+
+
+async def run(args):
+    # Swap aiohttp inside the monitor module only; webhook posts become no-ops
+    health_monitor.aiohttp = types.SimpleNamespace(
+        ClientSession=FakeSession, ClientTimeout=aiohttp.ClientTimeout
+    )
+
+    print(f"{'operation':<34}{'tunnels':>8}{'time':>17}")
+    results = []
+    for size in args.sizes:
+        results.extend(await bench_size(size, args.iterations, args.repeats))
+
+    if args.json:
+        write_report(args.json, "tunnel_manager", results,
+                     iterations=args.iterations, repeats=args.repeats)
+
+    if args.compare:
+        regressions = compare_reports(
+            args.compare, results, "name", {"ns_per_op": "lower"}, args.max_regression
+        )
+        for line in regressions:
+            print(f"❌ Regression: {line}")
+        if regressions:
+            sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TunnelManager microbenchmarks")
+    parser.add_argument("--sizes", default="10,100,1000,10000,100000",
+                        help="Comma-separated fleet sizes")
+    parser.add_argument("--iterations", type=int, default=2000, help="Calls per repeat")
+    parser.add_argument("--repeats", type=int, default=5, help="Repeats (median is reported)")
+    parser.add_argument("--with-logging", action="store_true",
+                        help="Keep service logging enabled (measures log cost too)")
+    parser.add_argument("--json", help="Write results to this JSON file")
+    parser.add_argument("--compare", help="Baseline JSON report to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.25,
+                        help="Allowed relative slowdown before failing (default: 0.25)")
+    args = parser.parse_args()
+    args.sizes = [int(n) for n in args.sizes.split(",")]
+
+    if not args.with_logging:
+        logging.disable(logging.CRITICAL)
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+import asyncio
+import logging
+from collections import deque
+from typing import AsyncIterator, Deque, Dict, Optional, Set, Tuple
+
+import aiohttp
+from admission import admission
+from config import settings
+from streaming import SSE_HEARTBEAT, stream_headers, stream_timeout
+
+logger = logging.getLogger(__name__)
+
+_END = None  # queue sentinel: upstream finished
+
+
+class BroadcastUnavailable(Exception):
+    """The shared upstream stream could not be (re)established"""
+
+
+class Subscriber:
+    """One viewer attached to a hub, with a bounded buffer"""
+
+    __slots__ = ("queue", "dropped")
+
+    def __init__(self):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=settings.BROADCAST_VIEWER_BUFFER)
+        self.dropped = False
+
+
+class BroadcastHub:
+    """A single upstream stream for one tunnel path, fanned out to many viewers
+
+    Chunks (whole events for SSE) are copied into each subscriber's bounded
+    queue. A subscriber whose queue is full is dropped rather than slowing
+    the others. The last BROADCAST_REPLAY_EVENTS events are kept so late
+    joiners start with recent context.
+    """
+
+    def __init__(self, key: Tuple[str, str], session: aiohttp.ClientSession, url: str,
+                 accept: str, connect_timeout: float, on_done):
+        self.key = key
+        self.session = session
+        self.url = url
+        self.accept = accept
+        self.connect_timeout = connect_timeout
+        self.on_done = on_done
+
+        self.subscribers: Set[Subscriber] = set()
+        self.replay: Deque[bytes] = deque(maxlen=settings.BROADCAST_REPLAY_EVENTS)
+        self.ready: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.status = 200
+        self.headers: Dict[str, str] = {}
+        self.media_type: Optional[str] = None
+        self.sse = False
+        self.upstream_bytes = 0
+        self.slow_consumers_dropped = 0
+        self._idle_handle: Optional[asyncio.TimerHandle] = None
+        self._task = asyncio.create_task(self._run())
+        self._task.add_done_callback(self._finished)
+
+    async def _run(self):
+        try:
+            response = await self.session.get(
+                self.url,
+                headers={"Accept": self.accept} if self.accept else None,
+                allow_redirects=False,
+                timeout=stream_timeout(self.connect_timeout)
+            )
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.ready.set_exception(BroadcastUnavailable(str(e)))
+            self.on_done(self)
+            return
+
+        try:
+            if response.status != 200:
+                self.ready.set_exception(BroadcastUnavailable(f"upstream returned {response.status}"))
+                return
+
+            self.headers = stream_headers(response)
+            self.media_type = response.content_type
+            self.sse = response.content_type == "text/event-stream"
+            self.ready.set_result(True)
+
+            buffer = b""
+            async for chunk in response.content.iter_any():
+                self.upstream_bytes += len(chunk)
+                if not self.sse:
+                    self._publish(chunk)
+                    continue
+                # Publish whole SSE events so replay never starts mid-event
+                buffer += chunk
+                while True:
+                    end = _event_boundary(buffer)
+                    if end < 0:
+                        break
+                    self._publish(buffer[:end])
+                    buffer = buffer[end:]
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning(f"Broadcast upstream {self.url} ended: {e}")
+        finally:
+            response.release()
+            if not self.ready.done():
+                self.ready.set_exception(BroadcastUnavailable("upstream closed"))
+            for subscriber in list(self.subscribers):
+                self._end(subscriber)
+            self.on_done(self)
+
+    def _finished(self, task: asyncio.Task):
+        """Covers a _run cancelled before it could report (on_done must be idempotent)"""
+        if not self.ready.done():
+            self.ready.set_exception(BroadcastUnavailable("upstream closed"))
+        self.on_done(self)
+
+    def _publish(self, event: bytes):
+        self.replay.append(event)
+        for subscriber in list(self.subscribers):
+            try:
+                subscriber.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                subscriber.dropped = True
+                self.slow_consumers_dropped += 1
+                self.subscribers.discard(subscriber)
+                self._end(subscriber)
+
+    @staticmethod
+    def _end(subscriber: Subscriber):
+        """Deliver the end-of-stream sentinel, making room if the buffer is full"""
+        while True:
+            try:
+                subscriber.queue.put_nowait(_END)
+                return
+            except asyncio.QueueFull:
+                subscriber.queue.get_nowait()
+
+    async def subscribe(self) -> Subscriber:
+        await self.ready
+        subscriber = Subscriber()
+        # Leave room in the buffer for live events after the replay
+        room = max(0, subscriber.queue.maxsize - 1)
+        for event in list(self.replay)[-room:] if room else []:
+            subscriber.queue.put_nowait(event)
+        self.subscribers.add(subscriber)
+        if self._idle_handle is not None:
+            self._idle_handle.cancel()
+            self._idle_handle = None
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self.subscribers.discard(subscriber)
+        if not self.subscribers and not self._task.done() and self._idle_handle is None:
+            # Keep the upstream briefly so a refreshing viewer rejoins instantly
+            self._idle_handle = asyncio.get_running_loop().call_later(
+                settings.BROADCAST_LINGER, self.stop
+            )
+
+    def stop(self):
+        self._idle_handle = None
+        if not self.subscribers:
+            self._task.cancel()
+
+    async def stream(self, subscriber: Subscriber, on_close) -> AsyncIterator[bytes]:
+        """Yield events for one viewer; ``on_close(bytes_sent)`` runs once at the end"""
+        sent = 0
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(
+                        subscriber.queue.get(), timeout=settings.STREAM_HEARTBEAT_INTERVAL
+                    )
+                except asyncio.TimeoutError:
+                    if self.sse:
+                        yield SSE_HEARTBEAT
+                    continue
+                if event is _END:
+                    break
+                sent += len(event)
+                yield event
+        finally:
+            self.unsubscribe(subscriber)
+            on_close(sent)
+
+
+def _event_boundary(buffer: bytes) -> int:
+    """Index just past the first complete SSE event in buffer, or -1"""
+    ends = [i + len(sep) for sep in (b"\n\n", b"\r\n\r\n") if (i := buffer.find(sep)) >= 0]
+    return min(ends) if ends else -1
+
+
+class BroadcastManager:
+    """Keeps one BroadcastHub per (tunnel, path) for opted-in paths"""
+
+    def __init__(self):
+        self.hubs: Dict[Tuple[str, str], BroadcastHub] = {}
+
+    @staticmethod
+    def is_broadcast_path(path: str) -> bool:
+        path = "/" + path.lstrip("/")
+        return any(path.startswith(prefix) for prefix in settings.BROADCAST_PATHS)
+
+    async def join(self, tunnel_id: str, path: str, session: aiohttp.ClientSession,
+                   url: str, accept: str, connect_timeout: float) -> Tuple[BroadcastHub, Subscriber]:
+        """Attach a viewer to the hub for this path, starting it if needed
+
+        Only Accept is forwarded upstream: the stream is shared, so no single
+        viewer's cookies or credentials should shape it. A new hub holds one
+        stream-pool slot until its upstream ends; raises Overloaded if the
+        pool is full.
+        """
+        key = (tunnel_id, path)
+        hub = self.hubs.get(key)
+        if hub is None:
+            admission.acquire_stream()
+            hub = BroadcastHub(key, session, url, accept, connect_timeout, self._hub_done)
+            self.hubs[key] = hub
+        return hub, await hub.subscribe()
+
+    def _hub_done(self, hub: BroadcastHub):
+        if self.hubs.get(hub.key) is hub:
+            del self.hubs[hub.key]
+            admission.release_stream()
+
+    def tunnel_stats(self, tunnel_id: str) -> dict:
+        hubs = [hub for key, hub in self.hubs.items() if key[0] == tunnel_id]
+        return {
+            "streams": len(hubs),
+            "viewers": sum(len(hub.subscribers) for hub in hubs),
+            "upstream_bytes": sum(hub.upstream_bytes for hub in hubs),
+            "slow_consumers_dropped": sum(hub.slow_consumers_dropped for hub in hubs)
+        }
+
+
+# Global broadcast manager instance
+broadcast_manager = BroadcastManager()
@@ -0,0 +1,143 @@
+import time
+from collections import deque
+from typing import Optional
+
+import aiohttp
+from config import settings
+
+
+class CircuitBreaker:
+    """Per-tunnel circuit breaker with latency-derived upstream timeouts
+
+    closed    - requests flow; consecutive failures are counted
+    open      - requests fail fast until reset_timeout has passed
+    half_open - a limited number of probe requests decide whether to close
+                again or re-open
+
+    Successful request latencies feed a sliding window whose percentiles set
+    the connect and read timeouts for the next requests.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self):
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.total_failures = 0
+        self.times_opened = 0
+        self._probes_in_flight = 0
+        self._latencies = deque(maxlen=settings.UPSTREAM_LATENCY_WINDOW)
+        self._since_recompute = 0
+        self._timeout: Optional[aiohttp.ClientTimeout] = None
+        self.median_latency: Optional[float] = None  # seconds, once enough samples exist
+
+    def allow_request(self) -> bool:
+        """Whether a request may go upstream now; callers must then record its outcome"""
+        if self.state == self.CLOSED:
+            return True
+
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < settings.BREAKER_RESET_TIMEOUT:
+                return False
+            self.state = self.HALF_OPEN
+            self._probes_in_flight = 0
+
+        # Half-open: only a few probes at a time
+        if self._probes_in_flight >= settings.BREAKER_HALF_OPEN_PROBES:
+            return False
+        self._probes_in_flight += 1
+        return True
+
+    def retry_after(self) -> float:
+        """Seconds until the breaker will let a probe through"""
+        if self.state != self.OPEN:
+            return 1.0
+        remaining = settings.BREAKER_RESET_TIMEOUT - (time.monotonic() - self.opened_at)
+        return max(1.0, remaining)
+
+    def record_success(self, latency: Optional[float]):
+        """Record a request that got a response, with its time to headers in seconds
+
+        Pass latency=None for streaming requests, whose time to headers would
+        skew the timeouts derived for normal requests.
+        """
+        if self.state == self.HALF_OPEN:
+            self._probes_in_flight = max(0, self._probes_in_flight - 1)
+            self.state = self.CLOSED
+        self.consecutive_failures = 0
+
+        if latency is None:
+            return
+        self._latencies.append(latency)
+        self._since_recompute += 1
+        if self._since_recompute >= settings.UPSTREAM_TIMEOUT_RECOMPUTE_EVERY:
+            self._timeout = None  # recomputed lazily on the next timeout() call
+
+    def record_failure(self):
+        """Record a connection error or timeout"""
+        self.total_failures += 1
+        if self.state == self.HALF_OPEN:
+            self._probes_in_flight = max(0, self._probes_in_flight - 1)
+            self._open()
+            return
+
+        self.consecutive_failures += 1
+        if self.state == self.CLOSED and self.consecutive_failures >= settings.BREAKER_FAILURE_THRESHOLD:
+            self._open()
+
+    def release(self):
+        """Forget a request that ended without an outcome (e.g. viewer disconnected)"""
+        if self.state == self.HALF_OPEN:
+            self._probes_in_flight = max(0, self._probes_in_flight - 1)
+
+    def _open(self):
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self.times_opened += 1
+
+    @staticmethod
+    def _percentile(ordered: list, pct: float) -> float:
+        return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+    def timeout(self) -> aiohttp.ClientTimeout:
+        """Upstream timeouts derived from observed latency percentiles
+
+        connect = p50 x multiplier, read = p99 x multiplier, each clamped to the
+        configured bounds. Until enough samples exist the maximums are used.
+        """
+        if self._timeout is not None:
+            return self._timeout
+
+        self._since_recompute = 0
+        if len(self._latencies) < settings.UPSTREAM_LATENCY_MIN_SAMPLES:
+            connect = settings.UPSTREAM_CONNECT_TIMEOUT_MAX
+            read = settings.UPSTREAM_READ_TIMEOUT_MAX
+        else:
+            ordered = sorted(self._latencies)
+            self.median_latency = self._percentile(ordered, 50)
+            multiplier = settings.UPSTREAM_TIMEOUT_MULTIPLIER
+            connect = min(settings.UPSTREAM_CONNECT_TIMEOUT_MAX,
+                          max(settings.UPSTREAM_CONNECT_TIMEOUT_MIN, self._percentile(ordered, 50) * multiplier))
+            read = min(settings.UPSTREAM_READ_TIMEOUT_MAX,
+                       max(settings.UPSTREAM_READ_TIMEOUT_MIN, self._percentile(ordered, 99) * multiplier))
+
+        self._timeout = aiohttp.ClientTimeout(
+            total=settings.UPSTREAM_READ_TIMEOUT_MAX,
+            sock_connect=connect,
+            sock_read=read
+        )
+        return self._timeout
+
+    def snapshot(self) -> dict:
+        timeout = self.timeout()
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "total_failures": self.total_failures,
+            "times_opened": self.times_opened,
+            "connect_timeout": timeout.sock_connect,
+            "read_timeout": timeout.sock_read
+        }
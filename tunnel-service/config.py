@@ -2,6 +2,47 @@ from pydantic_settings import BaseSettings
 from typing import Optional
 
 
+# SSH transport profiles (asyncssh connection options)
+# "default" keeps asyncssh's library defaults.
+SSH_TRANSPORT_PROFILES = {
+    "default": {},
+    # Interactive dev servers: AEAD ciphers with no separate MAC pass,
+    # small packets for low per-request latency, quick dead-peer detection
+    "low-latency": {
+        "encryption_algs": ["chacha20-poly1305@openssh.com", "aes128-gcm@openssh.com"],
+        "mac_algs": ["hmac-sha2-256-etm@openssh.com"],
+        "compression_algs": ["none"],
+        "window": 2 * 1024 * 1024,
+        "max_pktsize": 32768,
+        "keepalive_interval": 15,
+        "keepalive_count_max": 3,
+    },
+    # High bandwidth-delay links: large windows so transfers aren't
+    # capped at window / RTT, larger packets to cut per-packet overhead
+    "high-throughput": {
+        "encryption_algs": ["aes128-gcm@openssh.com", "aes256-gcm@openssh.com",
+                            "chacha20-poly1305@openssh.com"],
+        "mac_algs": ["hmac-sha2-256-etm@openssh.com"],
+        "compression_algs": ["none"],
+        "window": 16 * 1024 * 1024,
+        "max_pktsize": 65536,
+        "keepalive_interval": 30,
+        "keepalive_count_max": 4,
+    },
+    # Many tunnels per instance: AES-GCM (hardware accelerated), no
+    # compression, infrequent keepalives
+    "low-cpu": {
+        "encryption_algs": ["aes128-gcm@openssh.com", "chacha20-poly1305@openssh.com"],
+        "mac_algs": ["hmac-sha2-256-etm@openssh.com"],
+        "compression_algs": ["none"],
+        "window": 4 * 1024 * 1024,
+        "max_pktsize": 65536,
+        "keepalive_interval": 60,
+        "keepalive_count_max": 3,
+    },
+}
+
+
 class Settings(BaseSettings):
     # Server Configuration
     PORT: int = 8001
@@ -10,6 +51,14 @@ class Settings(BaseSettings):
     # MongoDB
     MONGODB_URL: str = "mongodb://localhost:27017/hexagon"
     
+    # User Resolution (username lookups for tunnel URLs)
+    USER_CACHE_SIZE: int = 10000
+    USER_CACHE_TTL: int = 300  # seconds
+    USER_NEGATIVE_CACHE_TTL: int = 30  # seconds
+    USER_LOOKUP_BATCH_WINDOW_MS: int = 5
+    USER_LOOKUP_BATCH_SIZE: int = 100
+    USER_LOOKUP_TIMEOUT: float = 2.0  # seconds
+    
     # Redis
     REDIS_URL: str = "redis://localhost:6379"
     
@@ -17,6 +66,7 @@ class Settings(BaseSettings):
     SSH_HOST: str = "0.0.0.0"
     SSH_PORT: int = 2222
     SSH_HOST_KEY_PATH: str = "./ssh_host_key"
+    SSH_TRANSPORT_PROFILE: str = "default"  # key of SSH_TRANSPORT_PROFILES; see benchmarks/ssh_transport_bench.py
     
     # Tunnel Configuration
     TUNNEL_BASE_PORT: int = 10000
@@ -24,6 +74,129 @@ class Settings(BaseSettings):
     MAX_TUNNELS_PER_USER: int = 5
     MAX_VIEWERS_FREE: int = 10
     MAX_VIEWERS_PRO: int = 1000
+    TUNNEL_RECONNECT_GRACE: float = 60  # seconds a dropped tunnel keeps its id, URL and port
+    TUNNEL_RECONNECT_WAIT: float = 10  # seconds a viewer request waits for a reconnect before 503
+    TUNNEL_BIND_HOST: str = "127.0.0.1"  # tunnel ports are reached through the proxy or edge router
+    TUNNEL_RAW_BIND_HOST: str = "0.0.0.0"  # raw TCP tunnels (token claim "tcp", pro tier only) are public on purpose
+    
+    # Edge Router (project.user.PUBLIC_DOMAIN spliced straight to the tunnel)
+    ROUTER_HOST: str = "0.0.0.0"
+    ROUTER_HTTP_PORT: int = 0  # routes by Host header; 0 disables
+    ROUTER_TLS_PORT: int = 0  # routes by TLS SNI, passing TLS through to the creator; 0 disables
+    ROUTER_MAX_HEADER_BYTES: int = 16384  # request head read to find the Host header
+    ROUTER_PEEK_TIMEOUT: float = 10  # seconds to receive the request head or ClientHello
+    
+    # Viewer Presence (viewers expire unless they heartbeat)
+    VIEWER_PRESENCE_TTL: float = 45  # seconds without a heartbeat before a viewer is dropped (0 = never); the backend beats every 15s
+    VIEWER_HEARTBEAT_HEADER: str = "X-Hexagon-Viewer"  # proxied requests carrying it count as heartbeats
+    
+    # Tunnel Listing (GET /tunnels, GET /tunnels/user/{user_id})
+    LISTING_PAGE_SIZE: int = 100  # default page size
+    LISTING_MAX_PAGE_SIZE: int = 1000
+    LISTING_PAGE_CACHE_SIZE: int = 256  # encoded pages kept per listing version
+    
+    # Live Stats Stream (dashboard push updates)
+    STATS_STREAM_TICK: float = 1.0  # seconds; changes within a tick are coalesced into one delta
+    STATS_STREAM_BUFFER: int = 16  # pending updates per subscriber before it is resynced
+    
+    # Admission Control (global limit on in-flight proxied requests)
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_INITIAL_LIMIT: int = 256
+    ADMISSION_MIN_LIMIT: int = 16
+    ADMISSION_MAX_LIMIT: int = 4096
+    ADMISSION_QUEUE_SIZE: int = 128  # requests waiting for a slot, across tiers
+    ADMISSION_QUEUE_TIMEOUT: float = 0.5  # seconds a request may wait before it is shed
+    ADMISSION_LATENCY_TOLERANCE: float = 2.0  # latency vs each tunnel's median before the limit shrinks
+    ADMISSION_ADJUST_EVERY: int = 50  # completed requests between limit adjustments
+    ADMISSION_RETRY_AFTER: int = 1  # seconds, sent with shed responses
+    ADMISSION_STREAM_LIMIT: int = 1024  # long-poll/SSE requests awaiting headers; separate from the limit above
+    
+    # Upstream connections (proxy -> tunnel)
+    UPSTREAM_POOL_SIZE: int = 32  # keep-alive connections per tunnel
+    UPSTREAM_KEEPALIVE_TIMEOUT: float = 60  # seconds an idle connection is kept
+    UPSTREAM_CONNECT_TIMEOUT_MIN: float = 1  # seconds
+    UPSTREAM_CONNECT_TIMEOUT_MAX: float = 5
+    UPSTREAM_READ_TIMEOUT_MIN: float = 2
+    UPSTREAM_READ_TIMEOUT_MAX: float = 30
+    UPSTREAM_TIMEOUT_MULTIPLIER: float = 4  # timeout = observed latency percentile x this
+    UPSTREAM_LATENCY_WINDOW: int = 200  # recent requests used for percentiles
+    UPSTREAM_LATENCY_MIN_SAMPLES: int = 20
+    UPSTREAM_TIMEOUT_RECOMPUTE_EVERY: int = 20  # requests between timeout recomputes
+    
+    # Streaming (SSE / long-poll pass-through)
+    STREAMING_PATHS: list[str] = []  # path prefixes always proxied in streaming mode
+    STREAM_IDLE_TIMEOUT: float = 300  # seconds without upstream data before closing
+    STREAM_HEARTBEAT_INTERVAL: float = 15  # seconds of silence before an SSE keepalive comment
+    
+    # Broadcast (one upstream stream fanned out to all viewers)
+    BROADCAST_PATHS: list[str] = []  # path prefixes served in broadcast mode (GET only)
+    BROADCAST_VIEWER_BUFFER: int = 256  # events buffered per viewer before it is dropped
+    BROADCAST_REPLAY_EVENTS: int = 20  # recent events replayed to late joiners
+    BROADCAST_LINGER: float = 5  # seconds the upstream stays open after the last viewer leaves
+    
+    # Static Asset Offload (build output served without crossing the tunnel)
+    ASSET_STORE_PATH: str = "./asset_store"
+    ASSET_MAX_BLOB_BYTES: int = 50 * 1024 * 1024  # per compressed file
+    ASSET_MAX_CONTENT_BYTES: int = 200 * 1024 * 1024  # per file once decompressed
+    ASSET_MAX_FILES: int = 10000  # per tunnel manifest
+    ASSET_BLOB_TTL_HOURS: float = 72  # unreferenced blobs kept this long for re-publishes
+    
+    # Usage Ledger (per-tunnel, per-minute usage rows in MongoDB)
+    USAGE_LEDGER_ENABLED: bool = True
+    USAGE_COLLECTION: str = "tunnel_usage"
+    USAGE_SAMPLE_INTERVAL: float = 5  # seconds between counter samples
+    USAGE_FLUSH_INTERVAL: float = 30  # seconds between bulk writes
+    USAGE_FLUSH_ROWS: int = 1000  # dirty rows that trigger an early flush
+    USAGE_BUFFER_MAX_ROWS: int = 50000  # beyond this, older minutes are kept on disk only
+    USAGE_WAL_PATH: str = "./usage_wal"
+    USAGE_WAL_FSYNC: bool = True
+    
+    # Circuit Breaker (per tunnel)
+    BREAKER_FAILURE_THRESHOLD: int = 5  # consecutive errors/timeouts before opening
+    BREAKER_RESET_TIMEOUT: float = 10  # seconds open before a half-open probe
+    BREAKER_HALF_OPEN_PROBES: int = 1
+    
+    # Tunnel Pre-warming (runs after a tunnel is created)
+    TUNNEL_PREWARM_ENABLED: bool = False
+    TUNNEL_PREWARM_CONNECTIONS: int = 4
+    TUNNEL_PREWARM_METHOD: str = "HEAD"  # "HEAD" or "GET"
+    TUNNEL_PREWARM_PATH: str = "/"
+    TUNNEL_PREWARM_TIMEOUT: float = 10  # seconds
+    
+    # Request Tracing (proxy phase timings)
+    TRACE_SAMPLE_RATE: float = 0.0  # fraction of proxied requests traced; 0 disables
+    TRACE_SERVER_TIMING: bool = True  # add a Server-Timing header to traced responses
+    TRACE_EXPORTER: str = "jsonl"  # "jsonl" or "none"
+    TRACE_EXPORT_PATH: str = "./traces.jsonl"
+    TRACE_FLUSH_INTERVAL: float = 5  # seconds a buffered span may wait before it is written
+    
+    # Traffic Analytics (per-tunnel hot paths, status codes and viewer IPs)
+    TRAFFIC_SKETCH_ENABLED: bool = True
+    TRAFFIC_SKETCH_WIDTH: int = 1024  # counters per row; 4 bytes each
+    TRAFFIC_SKETCH_DEPTH: int = 4  # rows; 16 KB per tunnel at the defaults
+    TRAFFIC_TOP_K: int = 20  # heavy hitters kept per dimension
+    TRAFFIC_PATH_MAX_LENGTH: int = 200  # longer paths are truncated before counting
+    
+    # Event Loop Monitoring
+    LOOP_MONITOR_ENABLED: bool = True
+    LOOP_LAG_INTERVAL: float = 0.25  # seconds between scheduling-delay probes
+    LOOP_LAG_WINDOW: int = 2400  # probes kept for percentiles (10 minutes at the default interval)
+    LOOP_SLOW_CALLBACK_MS: float = 100  # a callback holding the loop this long is recorded
+    LOOP_SLOW_CALLBACK_HISTORY: int = 50
+    LOOP_SLOW_CALLBACK_STACK_DEPTH: int = 15  # innermost frames kept per slow callback
+    
+    # Admin Diagnostics (opt-in: /admin/* answers 404 until ADMIN_TOKEN is set)
+    ADMIN_TOKEN: str = ""  # Bearer token for /admin endpoints
+    MEMORY_RSS_INTERVAL: float = 60  # seconds between RSS samples
+    MEMORY_RSS_HISTORY: int = 1440  # RSS samples kept (a day at the default interval)
+    MEMORY_TRACEMALLOC_FRAMES: int = 0  # trace allocations from startup; 0 = only after an admin baseline
+    
+    # Logging
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "json"  # "json" or "text"
+    LOG_QUEUE_SIZE: int = 10000  # records beyond this are dropped, never blocking the loop
+    LOG_HOT_EVENT_SAMPLE_RATE: float = 0.1  # fraction of viewer/proxy-error events logged; SSH auth/connect are never sampled
+    LOG_HOT_EVENT_RATE_LIMIT: float = 20  # max records per second per hot event
     
     # Public Domain
     PUBLIC_DOMAIN: str = "localhost:8001"
@@ -33,6 +206,9 @@ class Settings(BaseSettings):
     
     # Security
     TUNNEL_SECRET_KEY: str = "your-secret-key-change-in-production"
+    TUNNEL_TOKEN_LEEWAY: int = 30  # seconds of clock skew tolerated on token expiry
+    TUNNEL_TOKEN_REPLAY_CACHE_SIZE: int = 10000
+    ALLOW_LEGACY_TUNNEL_PASSWORD: bool = False  # accept "localport:secretkey" passwords (static, never expire)
     
     class Config:
         env_file = ".env"
@@ -41,3 +217,19 @@ class Settings(BaseSettings):
 
 settings = Settings()
 
+
+def public_host() -> str:
+    """PUBLIC_DOMAIN without its port"""
+    return settings.PUBLIC_DOMAIN.rsplit(":", 1)[0]
+
+
+def ssh_transport_options(profile: Optional[str] = None) -> dict:
+    """asyncssh connection options for a transport profile"""
+    name = profile or settings.SSH_TRANSPORT_PROFILE
+    if name not in SSH_TRANSPORT_PROFILES:
+        raise ValueError(
+            f"Unknown SSH transport profile '{name}' "
+            f"(choose from {', '.join(SSH_TRANSPORT_PROFILES)})"
+        )
+    return dict(SSH_TRANSPORT_PROFILES[name])
+
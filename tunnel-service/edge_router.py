@@ -0,0 +1,186 @@
+import asyncio
+import logging
+from typing import List, Optional, Tuple
+
+from config import public_host, settings
+from structured_logging import log_sampler
+from tunnel_manager import tunnel_manager
+
+logger = logging.getLogger(__name__)
+
+_TLS_HANDSHAKE = 0x16
+_TLS_CLIENT_HELLO = 0x01
+_TLS_MAX_RECORD = 16384
+_SNI_EXTENSION = 0x0000
+
+
+def parse_route(host: str) -> Optional[Tuple[str, str]]:
+    """(username, project_name) for ``project.user.<PUBLIC_DOMAIN>``, else None"""
+    host = host.strip().lower()
+    if host.startswith("["):
+        return None
+    host = host.split(":", 1)[0].rstrip(".")
+    suffix = "." + public_host().lower()
+    if not host.endswith(suffix):
+        return None
+    labels = host[:-len(suffix)].split(".")
+    if len(labels) != 2 or not all(labels):
+        return None
+    project_name, username = labels
+    return username, project_name
+
+
+def parse_http_host(head: bytes) -> Optional[str]:
+    """Host header from an HTTP/1.x request head"""
+    for line in head.split(b"\r\n")[1:]:
+        name, sep, value = line.partition(b":")
+        if sep and name.strip().lower() == b"host":
+            try:
+                return value.strip().decode("ascii")
+            except UnicodeDecodeError:
+                return None
+    return None
+
+
+def parse_sni(record: bytes) -> Optional[str]:
+    """Server name from a TLS record holding a ClientHello"""
+    try:
+        if record[0] != _TLS_HANDSHAKE:
+            return None
+        body = record[5:5 + int.from_bytes(record[3:5], "big")]
+        if body[0] != _TLS_CLIENT_HELLO:
+            return None
+        pos = 4 + 2 + 32  # handshake header, client version, random
+        pos += 1 + body[pos]  # session id
+        pos += 2 + int.from_bytes(body[pos:pos + 2], "big")  # cipher suites
+        pos += 1 + body[pos]  # compression methods
+        end = min(len(body), pos + 2 + int.from_bytes(body[pos:pos + 2], "big"))
+        pos += 2
+        while pos + 4 <= end:
+            ext_type = int.from_bytes(body[pos:pos + 2], "big")
+            ext_len = int.from_bytes(body[pos + 2:pos + 4], "big")
+            pos += 4
+            if ext_type == _SNI_EXTENSION:
+                # server_name_list length (2), name type (1), name length (2), name
+                name_len = int.from_bytes(body[pos + 3:pos + 5], "big")
+                return body[pos + 5:pos + 5 + name_len].decode("ascii")
+            pos += ext_len
+    except (IndexError, UnicodeDecodeError):
+        return None
+    return None
+
+
+class EdgeRouter:
+    """Routes viewer connections to tunnels by Host header or TLS SNI
+
+    Only the request head (HTTP) or the ClientHello (TLS) is read to pick
+    the tunnel for ``project.user.<PUBLIC_DOMAIN>``; after that the socket
+    is spliced to a channel to the creator and bytes flow without any HTTP
+    parsing, so absolute asset paths, WebSockets and anything else work as
+    they do locally. TLS is passed through untouched, for creators that
+    serve their own certificates.
+
+    Traffic on these ports bypasses the /live proxy features (published
+    assets, admission control, circuit breaker); it is still metered.
+    """
+
+    def __init__(self, manager):
+        self.manager = manager
+        self._servers: List[asyncio.AbstractServer] = []
+
+    async def start(self):
+        limit = settings.ROUTER_MAX_HEADER_BYTES
+        if settings.ROUTER_HTTP_PORT:
+            self._servers.append(await asyncio.start_server(
+                self._handle_http, settings.ROUTER_HOST, settings.ROUTER_HTTP_PORT, limit=limit
+            ))
+            logger.info(f"🧭 Host router listening on {settings.ROUTER_HOST}:{settings.ROUTER_HTTP_PORT}")
+        if settings.ROUTER_TLS_PORT:
+            self._servers.append(await asyncio.start_server(
+                self._handle_tls, settings.ROUTER_HOST, settings.ROUTER_TLS_PORT
+            ))
+            logger.info(f"🧭 SNI router listening on {settings.ROUTER_HOST}:{settings.ROUTER_TLS_PORT}")
+
+    async def _handle_http(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), settings.ROUTER_PEEK_TIMEOUT)
+        except asyncio.LimitOverrunError:
+            await self._reply(writer, 431, "Request Header Fields Too Large")
+            return
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+            writer.close()
+            return
+
+        host = parse_http_host(head)
+        route = parse_route(host) if host else None
+        if route is None:
+            await self._reply(writer, 404, "Not Found")
+            return
+        await self._route(route, reader, writer, head, http=True)
+
+    async def _handle_tls(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            header = await asyncio.wait_for(reader.readexactly(5), settings.ROUTER_PEEK_TIMEOUT)
+            length = min(int.from_bytes(header[3:5], "big"), _TLS_MAX_RECORD)
+            record = header + await asyncio.wait_for(reader.readexactly(length), settings.ROUTER_PEEK_TIMEOUT)
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+            writer.close()
+            return
+
+        server_name = parse_sni(record)
+        route = parse_route(server_name) if server_name else None
+        if route is None:
+            writer.close()
+            return
+        await self._route(route, reader, writer, record, http=False)
+
+    async def _route(self, route: Tuple[str, str], reader, writer, preface: bytes, http: bool):
+        tunnel = await self.manager.get_tunnel_by_username_project(*route)
+        if tunnel is None:
+            if http:
+                await self._reply(writer, 404, "Not Found")
+            else:
+                writer.close()
+            return
+
+        if tunnel.status != "active" and not await self.manager.wait_until_connected(
+            tunnel, settings.TUNNEL_RECONNECT_WAIT
+        ):
+            if http:
+                await self._reply(writer, 503, "Service Unavailable")
+            else:
+                writer.close()
+            return
+
+        if log_sampler.allow("router_connection"):
+            logger.info(
+                "🧭 Routed %s connection to tunnel %s", "HTTP" if http else "TLS", tunnel.tunnel_id,
+                extra=log_sampler.fields("router_connection", tunnel_id=tunnel.tunnel_id,
+                                         protocol="http" if http else "tls")
+            )
+        await tunnel.listener.relay(reader, writer, preface)
+
+    @staticmethod
+    async def _reply(writer: asyncio.StreamWriter, status: int, reason: str):
+        body = f"{status} {reason}\n".encode()
+        try:
+            writer.write(
+                f"HTTP/1.1 {status} {reason}\r\nContent-Type: text/plain\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def close(self):
+        for server in self._servers:
+            server.close()
+        for server in self._servers:
+            await server.wait_closed()
+        self._servers.clear()
+
+
+# Global edge router instance
+edge_router = EdgeRouter(tunnel_manager)
@@ -3,12 +3,17 @@ import logging
 from datetime import datetime
 import aiohttp
 from config import settings
+from loop_monitor import loop_monitor
 
 logger = logging.getLogger(__name__)
 
 
 class TunnelHealthMonitor:
-    """Monitors tunnel health and handles auto-reconnection"""
+    """Monitors tunnel health and handles auto-reconnection
+
+    Only a dead SSH connection (or the 8 hour limit) closes a tunnel. An
+    unresponsive app just marks it degraded until the breaker recovers.
+    """
     
     def __init__(self, tunnel_manager):
         self.tunnel_manager = tunnel_manager
@@ -37,6 +42,9 @@ class TunnelHealthMonitor:
     async def _check_all_tunnels(self):
         """Check health of all active tunnels"""
         for tunnel_id, tunnel in list(self.tunnel_manager.tunnels.items()):
+            # Tunnels waiting for a reconnect are closed by their grace timer
+            if tunnel.status == "reconnecting":
+                continue
             try:
                 # Check 1: SSH connection alive
                 if not await self._check_ssh_connection(tunnel):
@@ -52,21 +60,7 @@ class TunnelHealthMonitor:
                         await self._notify_tunnel_unhealthy(tunnel)
                     continue
                 
-                # Check 2: Port still accessible
-                if not await self._check_port_accessible(tunnel):
-                    tunnel.health_check_failures += 1
-                    logger.warning(
-                        f"⚠️  Tunnel {tunnel_id} port check failed "
-                        f"({tunnel.health_check_failures}/{self.max_failures})"
-                    )
-                    
-                    if tunnel.health_check_failures >= self.max_failures:
-                        logger.error(f"❌ Tunnel {tunnel_id} marked unhealthy, closing")
-                        await self.tunnel_manager.close_tunnel(tunnel_id)
-                        await self._notify_tunnel_unhealthy(tunnel)
-                    continue
-                
-                # Check 3: Tunnel age (auto-close after 8 hours)
+                # Check 2: Tunnel age (auto-close after 8 hours)
                 age_hours = (datetime.now().timestamp() - tunnel.created_at) / 3600
                 if age_hours > 8:
                     logger.info(f"⏰ Tunnel {tunnel_id} expired (8 hours), closing")
@@ -74,10 +68,26 @@ class TunnelHealthMonitor:
                     await self._notify_tunnel_expired(tunnel)
                     continue
                 
+                # Check 3: Upstream reachable, as seen by the proxy's circuit breaker.
+                # A creator restarting their app keeps the tunnel; the breaker fails
+                # viewers fast meanwhile and its half-open probes restore it.
+                if not await self._check_breaker(tunnel):
+                    tunnel.health_check_failures += 1
+                    logger.warning(
+                        f"⚠️  Tunnel {tunnel_id} circuit breaker open "
+                        f"({tunnel.health_check_failures}/{self.max_failures})"
+                    )
+                    
+                    if tunnel.health_check_failures >= self.max_failures and not tunnel.degraded:
+                        logger.error(f"❌ Tunnel {tunnel_id} marked degraded, app not responding")
+                        tunnel.degraded = True
+                    continue
+                
                 # All checks passed - reset failure counter
                 if tunnel.health_check_failures > 0:
                     logger.info(f"✅ Tunnel {tunnel_id} health restored")
                     tunnel.health_check_failures = 0
+                    tunnel.degraded = False
                 
             except Exception as e:
                 logger.error(f"Error checking tunnel {tunnel_id}: {e}")
@@ -98,23 +108,44 @@ class TunnelHealthMonitor:
             logger.error(f"Error checking SSH connection: {e}")
             return False
     
-    async def _check_port_accessible(self, tunnel) -> bool:
-        """Check if the tunnel's remote port is accessible"""
-        try:
-            # Try to connect to the remote port
-            reader, writer = await asyncio.wait_for(
-                asyncio.open_connection('localhost', tunnel.remote_port),
-                timeout=5.0
-            )
-            writer.close()
-            await writer.wait_closed()
+    async def _check_breaker(self, tunnel) -> bool:
+        """Check the tunnel's circuit breaker instead of probing on every sweep
+        
+        The proxy already observes every request; an open breaker means the
+        creator's app has been failing or timing out. Only viewer traffic
+        moves a breaker from open to half-open, so once the reset timeout has
+        passed the monitor sends the half-open probe itself rather than
+        judging the tunnel on a stale state.
+        """
+        breaker = tunnel.breaker
+        if breaker.state != breaker.OPEN:
             return True
-            
-        except (asyncio.TimeoutError, ConnectionRefusedError, OSError):
-            return False
-        except Exception as e:
-            logger.error(f"Error checking port accessibility: {e}")
+        if not breaker.allow_request():
+            # Still inside the reset timeout
+            return breaker.state != breaker.OPEN
+        return await self._probe_upstream(tunnel)
+    
+    async def _probe_upstream(self, tunnel) -> bool:
+        """Half-open probe through the tunnel; any HTTP response counts as recovered"""
+        breaker = tunnel.breaker
+        try:
+            session = self.tunnel_manager.get_upstream_session(tunnel)
+            async with session.request(
+                settings.TUNNEL_PREWARM_METHOD,
+                f"http://localhost:{tunnel.remote_port}{settings.TUNNEL_PREWARM_PATH}",
+                allow_redirects=False,
+                timeout=breaker.timeout()
+            ) as response:
+                await response.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            breaker.record_failure()
             return False
+        except BaseException:
+            breaker.release()
+            raise
+        breaker.record_success(None)
+        logger.info(f"✅ Tunnel {tunnel.tunnel_id} answered the breaker probe, closing its breaker")
+        return True
     
     async def _notify_tunnel_unhealthy(self, tunnel):
         """Notify backend that tunnel is unhealthy"""
@@ -179,17 +210,18 @@ class TunnelMetricsCollector:
     async def _collect_metrics(self):
         """Collect metrics from all tunnels"""
         total_tunnels = len(self.tunnel_manager.tunnels)
-        total_viewers = sum(
-            len(t.viewers) for t in self.tunnel_manager.tunnels.values()
-        )
+        total_viewers = self.tunnel_manager.viewer_count()
         total_bandwidth = sum(
             t.bytes_transferred for t in self.tunnel_manager.tunnels.values()
         )
+        ssh_connections = self.tunnel_manager.ssh_connection_count()
+        event_loop = loop_monitor.snapshot()
         
         logger.info(
-            f"📊 Metrics: {total_tunnels} tunnels, "
+            f"📊 Metrics: {total_tunnels} tunnels over {ssh_connections} SSH connections, "
             f"{total_viewers} viewers, "
-            f"{total_bandwidth / (1024*1024):.2f} MB transferred"
+            f"{total_bandwidth / (1024*1024):.2f} MB transferred, "
+            f"loop lag p99 {event_loop.get('lag_ms', {}).get('p99', 0)} ms"
         )
         
         # Send metrics to backend
@@ -201,13 +233,18 @@ class TunnelMetricsCollector:
                         "total_tunnels": total_tunnels,
                         "total_viewers": total_viewers,
                         "total_bandwidth": total_bandwidth,
+                        "ssh_connections": ssh_connections,
+                        "event_loop": event_loop,
                         "timestamp": datetime.now().isoformat(),
                         "tunnels": [
                             {
                                 "tunnel_id": t.tunnel_id,
                                 "viewers": len(t.viewers),
                                 "bandwidth": t.bytes_transferred,
+                                "ingress": t.meter.ingress,
+                                "egress": t.meter.egress,
                                 "requests": t.requests_count,
+                                "streams": t.streams_active,
                                 "uptime": datetime.now().timestamp() - t.created_at
                             }
                             for t in self.tunnel_manager.tunnels.values()
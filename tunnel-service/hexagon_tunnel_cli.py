@@ -5,20 +5,35 @@ Usage: python hexagon_tunnel_cli.py --port 3000 --project my-app
 """
 
 import argparse
-import subprocess
-import sys
+import asyncio
+import gzip
+import hashlib
+import http.server
+import mimetypes
+import platform
+import random
+import socket
 import os
 import json
+import threading
 import requests
+import asyncssh
 from pathlib import Path
-import signal
+from urllib.parse import urlparse
 import time
 
 # Configuration
 CONFIG_FILE = Path.home() / ".hexagon_tunnel" / "config.json"
 API_BASE_URL = "http://localhost:5003"  # Node.js backend
+TUNNEL_SERVICE_URL = "http://localhost:8001"  # Tunnel service (public URLs, static assets)
 SSH_HOST = "localhost"
 SSH_PORT = 2222
+SSH_KEEPALIVE_INTERVAL = 15  # seconds; detects a dead link within ~45s
+SSH_KEEPALIVE_COUNT_MAX = 3
+RECONNECT_BASE_DELAY = 1  # seconds
+RECONNECT_MAX_DELAY = 30
+RECONNECT_AUTH_RETRY_WINDOW = 120  # seconds the server may still hold a dropped connection
+DOCTOR_HANDSHAKES = 5
 
 
 class Colors:
@@ -109,8 +124,9 @@ def login(api_url=None):
         return None
 
 
-def create_tunnel(project_name, local_port, description="", framework="", language="", category="web-app"):
-    """Create a tunnel via API"""
+def create_tunnel(project_name, local_port, description="", framework="", language="", category="web-app",
+                  raw_tcp=False, is_public=True):
+    """Create a tunnel via API (is_public=False keeps it out of the public feed)"""
     config = load_config()
     
     if not config.get('token'):
@@ -130,7 +146,9 @@ def create_tunnel(project_name, local_port, description="", framework="", langua
                 "framework": framework,
                 "language": language,
                 "category": category,
-                "isPublic": True
+                "isPublic": is_public,
+                # Also expose the tunnel port directly (non-HTTP apps)
+                "rawTcp": raw_tcp
             }
         )
         
@@ -146,126 +164,598 @@ def create_tunnel(project_name, local_port, description="", framework="", langua
         return None
 
 
-def start_ssh_tunnel(ssh_command, ssh_password):
-    """Start SSH tunnel using sshpass"""
-    print_colored("\n🔌 Connecting to tunnel server...", Colors.YELLOW)
+def refresh_tunnel_token(tunnel_id):
+    """Fresh SSH password for a live tunnel, or None (expired ones only re-attach briefly)"""
+    config = load_config()
+    api_url = config.get('api_url', API_BASE_URL)
     
-    # Check if sshpass is installed
     try:
-        subprocess.run(["which", "sshpass"], check=True, capture_output=True)
-    except subprocess.CalledProcessError:
-        print_colored("\n⚠️  sshpass not found. Installing...", Colors.YELLOW)
-        print("On macOS: brew install sshpass")
-        print("On Linux: sudo apt-get install sshpass")
-        print("\nOr run the SSH command manually:")
-        print_colored(f"\n{ssh_command}", Colors.CYAN)
-        print_colored(f"Password: {ssh_password}", Colors.CYAN)
+        response = requests.post(
+            f"{api_url}/api/tunnels/{tunnel_id}/token",
+            headers={"Authorization": f"Bearer {config.get('token')}"},
+            timeout=10
+        )
+    except requests.RequestException:
+        return None
+    if response.status_code != 200:
         return None
+    return response.json().get('sshPassword')
+
+
+def backoff_delay(attempt):
+    """Exponential backoff with jitter, so many creators don't reconnect in lockstep"""
+    delay = min(RECONNECT_MAX_DELAY, RECONNECT_BASE_DELAY * 2 ** attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class TunnelClient:
+    """In-process SSH client that keeps reverse forwards open
+    
+    All projects share one SSH session: the first one logs in, the others
+    name their tunnel by passing its token as the forward's listen host.
+    A tunnel is ready as soon as the server accepts its forward request; it
+    only does so once the tunnel exists. Dropped connections are retried
+    with jittered exponential backoff, and the server re-attaches them to
+    the same tunnel_ids. Tokens are short-lived, so each reconnect first
+    asks the API for fresh ones (connections carrying a 'tunnelId').
+    """
+    
+    def __init__(self, forwards, on_ready=None):
+        """forwards: list of (connection details, local port), one per project"""
+        connection = forwards[0][0]
+        self.host = connection.get('sshHost') or SSH_HOST
+        self.port = int(connection.get('sshPort') or SSH_PORT)
+        self.username = connection.get('sshUsername')
+        self.password = connection.get('sshPassword')
+        self.forwards = forwards
+        self.on_ready = on_ready
+        self.connects = 0
+        self.remote_ports = {}  # local port -> port the server allocated
+        self.failed_forwards = []  # extra forwards the current connection couldn't open
+    
+    async def refresh_credentials(self):
+        """Swap in fresh tokens; on failure the old ones are tried as they are"""
+        for connection, _ in self.forwards:
+            if connection.get('tunnelId'):
+                token = await asyncio.to_thread(refresh_tunnel_token, connection['tunnelId'])
+                if token:
+                    connection['sshPassword'] = token
+        self.password = self.forwards[0][0].get('sshPassword')
+    
+    async def connect(self):
+        """Connect, authenticate and request a reverse forward per project"""
+        conn = await asyncssh.connect(
+            self.host,
+            self.port,
+            username=self.username,
+            password=self.password,
+            known_hosts=None,
+            keepalive_interval=SSH_KEEPALIVE_INTERVAL,
+            keepalive_count_max=SSH_KEEPALIVE_COUNT_MAX
+        )
+        try:
+            listener = await conn.forward_remote_port('', 0, 'localhost', self.forwards[0][1])
+        except Exception:
+            conn.close()
+            raise
+        self.remote_ports = {self.forwards[0][1]: listener.get_port()}
+        
+        results = await asyncio.gather(
+            *(conn.forward_remote_port(connection.get('sshPassword'), 0, 'localhost', local_port)
+              for connection, local_port in self.forwards[1:]),
+            return_exceptions=True
+        )
+        self.failed_forwards = []
+        for (connection, local_port), result in zip(self.forwards[1:], results):
+            if isinstance(result, Exception):
+                print_colored(f"⚠️  Could not open the tunnel for port {local_port}: {result}. Will keep retrying.", Colors.YELLOW)
+                self.failed_forwards.append((connection, local_port))
+            else:
+                self.remote_ports[local_port] = result.get_port()
+        return conn
     
-    # Use sshpass to automate password entry
-    cmd = ["sshpass", "-p", ssh_password] + ssh_command.split()
+    async def retry_forwards(self, conn):
+        """Keep requesting forwards that failed until they open or the connection drops"""
+        attempt = 0
+        while self.failed_forwards:
+            await asyncio.sleep(backoff_delay(attempt))
+            attempt += 1
+            for connection, local_port in list(self.failed_forwards):
+                try:
+                    listener = await conn.forward_remote_port(connection.get('sshPassword'), 0, 'localhost', local_port)
+                except (OSError, asyncssh.Error, asyncssh.ChannelListenError) as e:
+                    print_colored(f"⚠️  Tunnel for port {local_port} still unavailable ({e})", Colors.YELLOW)
+                    continue
+                self.remote_ports[local_port] = listener.get_port()
+                self.failed_forwards.remove((connection, local_port))
+                print_colored(f"✅ Tunnel for port {local_port} is open", Colors.GREEN)
+    
+    async def run(self):
+        """Hold the tunnel open until interrupted or the credentials are rejected"""
+        attempt = 0
+        lost_at = None
+        while True:
+            if self.connects or attempt:
+                await self.refresh_credentials()
+            try:
+                conn = await self.connect()
+            except asyncssh.PermissionDenied:
+                # Until the server notices the old connection is dead it
+                # still holds our token, so early rejections are retried
+                if lost_at is None or time.monotonic() - lost_at > RECONNECT_AUTH_RETRY_WINDOW:
+                    print_colored("❌ Tunnel credentials were rejected (the tunnel may have expired).", Colors.RED)
+                    print_colored("   Run the live command again to start a new tunnel.", Colors.RED)
+                    return
+                delay = backoff_delay(attempt)
+                attempt += 1
+                print_colored(f"⚠️  Server hasn't released the old connection yet. Retrying in {delay:.1f}s...", Colors.YELLOW)
+                await asyncio.sleep(delay)
+                continue
+            except (OSError, asyncssh.Error, asyncssh.ChannelListenError) as e:
+                delay = backoff_delay(attempt)
+                attempt += 1
+                print_colored(f"⚠️  Could not connect ({e}). Retrying in {delay:.1f}s...", Colors.YELLOW)
+                await asyncio.sleep(delay)
+                continue
+            
+            self.connects += 1
+            lost_at = None
+            connected_at = time.monotonic()
+            if self.on_ready:
+                await self.on_ready(self.connects > 1)
+            
+            retry_task = asyncio.create_task(self.retry_forwards(conn))
+            try:
+                await conn.wait_closed()
+            finally:
+                retry_task.cancel()
+                conn.close()
+            
+            # Only a connection that stayed up resets the backoff, so a
+            # flapping link doesn't reconnect in a tight loop
+            lost_at = time.monotonic()
+            if lost_at - connected_at > RECONNECT_MAX_DELAY:
+                attempt = 0
+            delay = backoff_delay(attempt)
+            attempt += 1
+            print_colored(f"\n⚠️  Connection lost. Reconnecting in {delay:.1f}s...", Colors.YELLOW)
+            await asyncio.sleep(delay)
+
+
+def save_tunnel_credentials(project_name, tunnel_id, ssh_password):
+    """Remember a project's tunnel so later commands (e.g. publish) can use it"""
+    config = load_config()
+    config.setdefault('tunnels', {})[project_name] = {
+        'tunnel_id': tunnel_id,
+        'ssh_password': ssh_password
+    }
+    save_config(config)
+
+
+def collect_assets(directory):
+    """Hash every file in a build directory, keyed by its URL path"""
+    root = Path(directory)
+    assets = {}
+    for path in sorted(root.rglob('*')):
+        relative = path.relative_to(root)
+        if not path.is_file() or any(part.startswith('.') for part in relative.parts):
+            continue
+        content = path.read_bytes()
+        assets['/' + relative.as_posix()] = {
+            'sha256': hashlib.sha256(content).hexdigest(),
+            'size': len(content),
+            'content_type': mimetypes.guess_type(path.name)[0] or 'application/octet-stream',
+            'file': path
+        }
+    return assets
+
+
+def publish_assets(tunnel_id, ssh_password, directory):
+    """Upload a build directory to the tunnel service's asset store
+
+    Files are content-addressed by SHA-256, so only hashes the service
+    doesn't already have are compressed and uploaded. Matching paths are
+    then served by the service without crossing the tunnel.
+    """
+    if not Path(directory).is_dir():
+        print_colored(f"❌ Not a directory: {directory}", Colors.RED)
+        return False
+    
+    assets = collect_assets(directory)
+    if not assets:
+        print_colored(f"⚠️  No files found in {directory}", Colors.YELLOW)
+        return False
+    
+    config = load_config()
+    base_url = f"{config.get('tunnel_url', TUNNEL_SERVICE_URL)}/tunnels/{tunnel_id}/assets"
+    session = requests.Session()
+    session.headers["Authorization"] = f"Bearer {ssh_password}"
+    
+    print_colored(f"\n📦 Publishing {len(assets)} files from {directory}...", Colors.YELLOW)
     
     try:
-        process = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
+        response = session.post(
+            f"{base_url}/missing",
+            json={"hashes": [asset['sha256'] for asset in assets.values()]}
         )
+        if response.status_code != 200:
+            print_colored(f"❌ Publish failed: {response.json().get('detail', 'Unknown error')}", Colors.RED)
+            return False
+        missing = set(response.json().get('missing', []))
         
-        # Wait a bit to see if connection succeeds
-        time.sleep(2)
+        uploaded = 0
+        uploaded_bytes = 0
+        for asset in assets.values():
+            if asset['sha256'] not in missing:
+                continue
+            missing.discard(asset['sha256'])  # identical files are uploaded once
+            blob = gzip.compress(asset['file'].read_bytes(), compresslevel=9, mtime=0)
+            response = session.put(
+                f"{base_url}/blobs/{asset['sha256']}",
+                data=blob,
+                headers={"Content-Type": "application/gzip"}
+            )
+            if response.status_code != 200:
+                print_colored(f"❌ Upload of {asset['file']} failed: {response.json().get('detail')}", Colors.RED)
+                return False
+            uploaded += 1
+            uploaded_bytes += len(blob)
+        
+        manifest = {
+            url_path: {key: asset[key] for key in ('sha256', 'size', 'content_type')}
+            for url_path, asset in assets.items()
+        }
+        response = session.put(f"{base_url}/manifest", json={"files": manifest})
+        if response.status_code != 200:
+            print_colored(f"❌ Publish failed: {response.json().get('detail', 'Unknown error')}", Colors.RED)
+            return False
+        
+        print_colored(
+            f"✅ Published {len(assets)} files "
+            f"({uploaded} uploaded, {uploaded_bytes / 1024:.1f} KB compressed; "
+            f"{len(assets) - uploaded} already on server)",
+            Colors.GREEN
+        )
+        return True
         
-        if process.poll() is None:
-            print_colored("✅ Tunnel connected!", Colors.GREEN)
-            return process
-        else:
-            stdout, stderr = process.communicate()
-            print_colored(f"❌ Connection failed: {stderr.decode()}", Colors.RED)
-            return None
-            
     except Exception as e:
-        print_colored(f"❌ Error starting tunnel: {e}", Colors.RED)
-        return None
+        print_colored(f"❌ Error: {e}", Colors.RED)
+        return False
+
+
+def publish(args):
+    """Publish a build directory for a project's running tunnel"""
+    config = load_config()
+    tunnel = config.get('tunnels', {}).get(args.project)
+    if not tunnel:
+        print_colored(f"❌ No tunnel found for '{args.project}'. Run: python hexagon_tunnel_cli.py live first", Colors.RED)
+        return
+    
+    publish_assets(tunnel['tunnel_id'], tunnel['ssh_password'], args.dir)
 
 
 def go_live(args):
     """Main function to go live"""
     print_banner()
     
-    # Create tunnel via API
-    print_colored(f"\n📡 Creating tunnel for '{args.project}'...", Colors.YELLOW)
-    
-    tunnel_data = create_tunnel(
-        project_name=args.project,
-        local_port=args.port,
-        description=args.description or "",
-        framework=args.framework or "",
-        language=args.language or "",
-        category=args.category or "web-app"
-    )
-    
-    if not tunnel_data:
+    if len(args.project) != len(args.port):
+        print_colored("❌ Pass one --port for each --project", Colors.RED)
         return
     
-    connection = tunnel_data.get('connection', {})
-    tunnel_info = tunnel_data.get('tunnel', {})
-    
-    print_colored("\n✅ Tunnel created!", Colors.GREEN)
-    print(f"\n{Colors.BOLD}Project:{Colors.END} {args.project}")
-    print(f"{Colors.BOLD}Local Port:{Colors.END} {args.port}")
-    print(f"{Colors.BOLD}Tunnel ID:{Colors.END} {tunnel_info.get('tunnelId')}")
-    
-    # Display SSH connection info
-    print_colored("\n" + "="*50, Colors.CYAN)
-    print_colored("SSH Connection Details:", Colors.HEADER)
-    print_colored("="*50, Colors.CYAN)
-    print(f"\n{Colors.BOLD}Command:{Colors.END}")
-    print_colored(connection.get('sshCommand'), Colors.CYAN)
-    print(f"\n{Colors.BOLD}Password:{Colors.END}")
-    print_colored(connection.get('sshPassword'), Colors.CYAN)
+    tunnels = []
+    for project, port in zip(args.project, args.port):
+        # Create tunnel via API
+        print_colored(f"\n📡 Creating tunnel for '{project}'...", Colors.YELLOW)
+        
+        tunnel_data = create_tunnel(
+            project_name=project,
+            local_port=port,
+            description=args.description or "",
+            framework=args.framework or "",
+            language=args.language or "",
+            category=args.category or "web-app",
+            raw_tcp=args.tcp
+        )
+        
+        if not tunnel_data:
+            return
+        
+        connection = tunnel_data.get('connection', {})
+        tunnel_info = tunnel_data.get('tunnel', {})
+        tunnels.append((project, port, connection, tunnel_info))
+        
+        print_colored("\n✅ Tunnel created!", Colors.GREEN)
+        print(f"\n{Colors.BOLD}Project:{Colors.END} {project}")
+        print(f"{Colors.BOLD}Local Port:{Colors.END} {port}")
+        print(f"{Colors.BOLD}Tunnel ID:{Colors.END} {tunnel_info.get('tunnelId')}")
+        
+        save_tunnel_credentials(project, tunnel_info.get('tunnelId'), connection.get('sshPassword'))
+        
+        # Display SSH connection info
+        print_colored("\n" + "="*50, Colors.CYAN)
+        print_colored("SSH Connection Details:", Colors.HEADER)
+        print_colored("="*50, Colors.CYAN)
+        print(f"\n{Colors.BOLD}Command:{Colors.END}")
+        print_colored(connection.get('sshCommand'), Colors.CYAN)
+        print(f"\n{Colors.BOLD}Password:{Colors.END}")
+        print_colored(connection.get('sshPassword'), Colors.CYAN)
     
     # Start SSH tunnel
     if args.auto_connect:
-        process = start_ssh_tunnel(
-            connection.get('sshCommand'),
-            connection.get('sshPassword')
-        )
+        config = load_config()
+        username = config.get('username', 'unknown')
+        tunnel_url = config.get('tunnel_url', TUNNEL_SERVICE_URL)
         
-        if process:
+        async def on_ready(reconnected):
+            if reconnected:
+                print_colored("✅ Reconnected - same URLs, viewers keep watching", Colors.GREEN)
+                return
+            
+            print_colored("✅ Tunnel connected!", Colors.GREEN)
+            if args.static_dir:
+                project, port, connection, tunnel_info = tunnels[0]
+                await asyncio.to_thread(
+                    publish_assets, tunnel_info.get('tunnelId'), connection.get('sshPassword'), args.static_dir
+                )
+            
             print_colored("\n" + "="*50, Colors.GREEN)
             print_colored("🎉 YOU'RE LIVE!", Colors.GREEN + Colors.BOLD)
             print_colored("="*50, Colors.GREEN)
             
-            config = load_config()
-            username = config.get('username', 'unknown')
-            public_url = f"http://localhost:8001/live/{username}/{args.project}"
-            
-            print(f"\n{Colors.BOLD}Public URL:{Colors.END}")
-            print_colored(public_url, Colors.CYAN + Colors.BOLD)
+            print(f"\n{Colors.BOLD}Public URL{'s' if len(tunnels) > 1 else ''}:{Colors.END}")
+            for project, port, connection, tunnel_info in tunnels:
+                print_colored(f"{tunnel_url}/live/{username}/{project}", Colors.CYAN + Colors.BOLD)
+                if tunnel_info.get('rawTcp') and client.remote_ports.get(port):
+                    print_colored(f"tcp://{urlparse(tunnel_url).hostname}:{client.remote_ports[port]}",
+                                  Colors.CYAN + Colors.BOLD)
             
             print(f"\n{Colors.BOLD}Share this link with your audience!{Colors.END}")
             print("\n💡 Tips:")
             print("  • Keep this terminal open while sharing")
             print("  • Press Ctrl+C to stop sharing")
-            print("  • Your app must be running on port", args.port)
-            
-            # Handle graceful shutdown
-            def signal_handler(sig, frame):
-                print_colored("\n\n🛑 Stopping tunnel...", Colors.YELLOW)
-                process.terminate()
-                process.wait()
-                print_colored("✅ Tunnel closed. Thanks for using Hexagon!", Colors.GREEN)
-                sys.exit(0)
-            
-            signal.signal(signal.SIGINT, signal_handler)
-            
-            # Keep running
-            try:
-                process.wait()
-            except KeyboardInterrupt:
-                signal_handler(None, None)
+            print("  • Your app must be running on port", ", ".join(str(port) for port in args.port))
+            print("  • Network drops are retried automatically")
+        
+        print_colored("\n🔌 Connecting to tunnel server...", Colors.YELLOW)
+        client = TunnelClient(
+            [({**connection, 'tunnelId': tunnel_info.get('tunnelId')}, port)
+             for project, port, connection, tunnel_info in tunnels],
+            on_ready=on_ready
+        )
+        try:
+            asyncio.run(client.run())
+        except KeyboardInterrupt:
+            print_colored("\n\n🛑 Stopping tunnel...", Colors.YELLOW)
+        print_colored("✅ Tunnel closed. Thanks for using Hexagon!", Colors.GREEN)
     else:
         print_colored("\n💡 Run the SSH command above to start sharing!", Colors.YELLOW)
+        if args.static_dir:
+            print_colored(
+                f"💡 Once connected, run: python hexagon_tunnel_cli.py publish --project {args.project[0]} --dir {args.static_dir}",
+                Colors.YELLOW
+            )
+
+
+def delete_tunnel(tunnel_id):
+    """Close a tunnel via API"""
+    config = load_config()
+    api_url = config.get('api_url', API_BASE_URL)
+    
+    try:
+        response = requests.delete(
+            f"{api_url}/api/tunnels/{tunnel_id}",
+            headers={"Authorization": f"Bearer {config.get('token')}"}
+        )
+        return response.status_code == 200
+    except Exception as e:
+        print_colored(f"❌ Error: {e}", Colors.RED)
+        return False
+
+
+def summarize_latency(samples):
+    """min/p50/p95 of per-request timings (seconds), in milliseconds"""
+    ordered = sorted(samples)
+    
+    def pick(pct):
+        return round(ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))] * 1000, 2)
+    
+    return {"samples": len(ordered), "min_ms": round(ordered[0] * 1000, 2), "p50_ms": pick(50), "p95_ms": pick(95)}
+
+
+def time_requests(session, url, samples):
+    """Time repeated GETs after one untimed warm-up request"""
+    session.get(url, timeout=10).content
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        session.get(url, timeout=10).content
+        timings.append(time.perf_counter() - start)
+    return summarize_latency(timings)
+
+
+def measure_local_app(port, samples):
+    """Latency of the creator's app without any tunnel in the way"""
+    url = f"http://localhost:{port}/"
+    try:
+        return {"url": url, **time_requests(requests.Session(), url, samples)}
+    except requests.RequestException as e:
+        return {"url": url, "error": str(e)}
+
+
+async def time_ssh_handshakes(host, port, samples):
+    """Key exchange + one auth round trip, using deliberately invalid credentials"""
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        try:
+            conn = await asyncssh.connect(host, port, username='hexagon-doctor', password='-', known_hosts=None)
+            conn.close()
+        except asyncssh.PermissionDenied:
+            pass
+        timings.append(time.perf_counter() - start)
+    return summarize_latency(timings)
+
+
+def measure_ssh(host, port, samples):
+    """TCP round-trip time and SSH handshake time to the tunnel server"""
+    result = {"host": f"{host}:{port}"}
+    try:
+        rtts = []
+        for _ in range(samples):
+            start = time.perf_counter()
+            with socket.create_connection((host, port), timeout=5):
+                rtts.append(time.perf_counter() - start)
+        result["tcp_rtt"] = summarize_latency(rtts)
+        result["handshake"] = asyncio.run(time_ssh_handshakes(host, port, min(samples, DOCTOR_HANDSHAKES)))
+    except (OSError, asyncssh.Error) as e:
+        result["error"] = str(e)
+    return result
+
+
+class DiagnosticHandler(http.server.BaseHTTPRequestHandler):
+    """Local endpoint behind the diagnostic tunnel: /ping and an incompressible /payload"""
+    protocol_version = "HTTP/1.1"
+    payload = b""
+    
+    def do_GET(self):
+        body = self.payload if self.path.startswith("/payload") else b"ok"
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass
+
+
+def measure_through_tunnel(base_url, samples):
+    """End-to-end latency and creator upload throughput via the public URL"""
+    session = requests.Session()
+    result = {"latency": time_requests(session, f"{base_url}/ping", samples)}
+    
+    start = time.perf_counter()
+    size = len(session.get(f"{base_url}/payload", timeout=300).content)
+    elapsed = time.perf_counter() - start
+    result["payload_bytes"] = size
+    result["upload_mbps"] = round(size * 8 / elapsed / 1e6, 2)
+    return result
+
+
+def measure_tunnel(samples, payload_mb):
+    """Open a throwaway tunnel to a local diagnostic server and measure through it"""
+    handler = type("Handler", (DiagnosticHandler,), {"payload": os.urandom(int(payload_mb * 1024 * 1024))})
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    
+    if not load_config().get('token'):
+        return {"error": "Not logged in. Run: python hexagon_tunnel_cli.py login"}
+    
+    project = f"doctor-{os.urandom(3).hex()}"
+    # Private, so diagnostics never show up in the public feed
+    tunnel_data = create_tunnel(project, server.server_port, description="Tunnel diagnostics",
+                                category="diagnostics", is_public=False)
+    if not tunnel_data:
+        server.shutdown()
+        return {"error": "Could not create a diagnostic tunnel (see the error above)"}
+    
+    tunnel_id = tunnel_data.get('tunnel', {}).get('tunnelId')
+    try:
+        connection = tunnel_data.get('connection', {})
+        config = load_config()
+        base_url = f"{config.get('tunnel_url', TUNNEL_SERVICE_URL)}/live/{config.get('username', 'unknown')}/{project}"
+        
+        async def run():
+            client = TunnelClient([(connection, server.server_port)])
+            start = time.perf_counter()
+            conn = await client.connect()
+            connect_ms = round((time.perf_counter() - start) * 1000, 2)
+            try:
+                # Blocking HTTP runs in a thread so this loop keeps serving the tunnel
+                result = await asyncio.to_thread(measure_through_tunnel, base_url, samples)
+            finally:
+                conn.close()
+                await conn.wait_closed()
+            return {"connect_ms": connect_ms, **result}
+        
+        try:
+            return asyncio.run(run())
+        except (OSError, asyncssh.Error, asyncssh.ChannelListenError, requests.RequestException) as e:
+            return {"error": str(e)}
+    finally:
+        # Always give the tunnel slot back, whatever went wrong above
+        if not delete_tunnel(tunnel_id):
+            print_colored(f"⚠️  Could not delete diagnostic tunnel {tunnel_id}; close it from the dashboard", Colors.YELLOW)
+        server.shutdown()
+
+
+def print_latency_row(label, result):
+    if not result or "error" in result:
+        error = result.get("error", "skipped") if result else "skipped"
+        print(f"  {label:<34}{Colors.RED}{error}{Colors.END}")
+        return
+    print(f"  {label:<34}p50 {result['p50_ms']:>8.1f} ms   p95 {result['p95_ms']:>8.1f} ms")
+
+
+def doctor(args):
+    """Measure where tunnel latency and throughput go"""
+    print_colored("\n🩺 Running tunnel diagnostics...", Colors.HEADER)
+    report = {
+        "version": 1,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "platform": platform.platform(),
+        "python": platform.python_version()
+    }
+    
+    if args.port:
+        print_colored(f"⏱️  Local app on port {args.port}...", Colors.YELLOW)
+        report["local_app"] = measure_local_app(args.port, args.samples)
+    
+    print_colored(f"⏱️  Tunnel server {SSH_HOST}:{SSH_PORT}...", Colors.YELLOW)
+    report["ssh"] = measure_ssh(SSH_HOST, SSH_PORT, args.samples)
+    
+    if not args.skip_tunnel:
+        print_colored(f"⏱️  Diagnostic tunnel ({args.payload_mb:g} MB upload)...", Colors.YELLOW)
+        report["tunnel"] = measure_tunnel(args.samples, args.payload_mb)
+    
+    if args.project:
+        config = load_config()
+        url = f"{config.get('tunnel_url', TUNNEL_SERVICE_URL)}/live/{config.get('username', 'unknown')}/{args.project}/"
+        print_colored(f"⏱️  Your live project '{args.project}'...", Colors.YELLOW)
+        try:
+            report["live_project"] = {"url": url, **time_requests(requests.Session(), url, args.samples)}
+        except requests.RequestException as e:
+            report["live_project"] = {"url": url, "error": str(e)}
+    
+    # Breakdown
+    print_colored("\n" + "="*60, Colors.CYAN)
+    print_colored("Tunnel Performance Breakdown:", Colors.HEADER)
+    print_colored("="*60, Colors.CYAN)
+    if "local_app" in report:
+        print_latency_row(f"Local app (:{args.port})", report["local_app"])
+    ssh = report["ssh"]
+    print_latency_row("SSH TCP round trip", ssh.get("tcp_rtt", ssh))
+    print_latency_row("SSH handshake", ssh.get("handshake", ssh))
+    tunnel = report.get("tunnel")
+    if tunnel is not None:
+        if "error" in tunnel:
+            print_latency_row("Diagnostic tunnel", tunnel)
+        else:
+            print(f"  {'Tunnel connect (auth + forward)':<34}{tunnel['connect_ms']:>12.1f} ms")
+            print_latency_row("End-to-end via /live/", tunnel["latency"])
+            print(f"  {'Upload throughput':<34}{tunnel['upload_mbps']:>12.1f} Mbit/s")
+    if "live_project" in report:
+        print_latency_row(f"End-to-end '{args.project}'", report["live_project"])
+    
+    local_p50 = report.get("local_app", {}).get("p50_ms")
+    live_p50 = report.get("live_project", {}).get("p50_ms")
+    if local_p50 and live_p50 and local_p50 > live_p50 / 2:
+        print_colored("\n💡 Your app accounts for most of the end-to-end latency", Colors.YELLOW)
+    
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print_colored(f"\n📄 Report written to {args.json} (attach it to support tickets)", Colors.GREEN)
 
 
 def list_tunnels():
@@ -324,6 +814,15 @@ Examples:
   # Go live with auto-connect
   python hexagon_tunnel_cli.py live --project my-app --port 3000 --auto
   
+  # Share a frontend and its API over one connection
+  python hexagon_tunnel_cli.py live -p my-app -P 3000 -p my-api -P 8000 --auto
+  
+  # Serve your build output from the edge (only changed files are uploaded)
+  python hexagon_tunnel_cli.py publish --project my-app --dir dist
+  
+  # Find out why your stream is slow
+  python hexagon_tunnel_cli.py doctor --port 3000 --json report.json
+  
   # List your active tunnels
   python hexagon_tunnel_cli.py list
         """
@@ -337,13 +836,32 @@ Examples:
     
     # Live command
     live_parser = subparsers.add_parser('live', help='Go live with your project')
-    live_parser.add_argument('--project', '-p', required=True, help='Project name')
-    live_parser.add_argument('--port', '-P', type=int, required=True, help='Local port')
+    live_parser.add_argument('--project', '-p', required=True, action='append',
+                             help='Project name (repeat with --port to share several projects)')
+    live_parser.add_argument('--port', '-P', type=int, required=True, action='append',
+                             help='Local port, one per --project')
     live_parser.add_argument('--description', '-d', help='Project description')
     live_parser.add_argument('--framework', '-f', help='Framework (react, vue, etc.)')
     live_parser.add_argument('--language', '-l', help='Language (javascript, python, etc.)')
     live_parser.add_argument('--category', '-c', help='Category (web-app, api, game, etc.)')
     live_parser.add_argument('--auto', '--auto-connect', action='store_true', help='Auto-connect SSH tunnel')
+    live_parser.add_argument('--tcp', action='store_true',
+                             help='Raw TCP mode: expose the port directly (databases, game servers)')
+    live_parser.add_argument('--static-dir', help='Build directory to publish once connected (first project)')
+    
+    # Publish command
+    publish_parser = subparsers.add_parser('publish', help='Serve static build output without the tunnel')
+    publish_parser.add_argument('--project', '-p', required=True, help='Project name (must be live)')
+    publish_parser.add_argument('--dir', required=True, help='Build directory (e.g. dist, build)')
+    
+    # Doctor command
+    doctor_parser = subparsers.add_parser('doctor', aliases=['bench'], help='Diagnose tunnel performance')
+    doctor_parser.add_argument('--port', '-P', type=int, help='Local port of your app')
+    doctor_parser.add_argument('--project', '-p', help='Also measure this live project end to end')
+    doctor_parser.add_argument('--samples', type=int, default=20, help='Requests per latency measurement')
+    doctor_parser.add_argument('--payload-mb', type=float, default=8, help='Upload size for the throughput test')
+    doctor_parser.add_argument('--skip-tunnel', action='store_true', help="Don't open a diagnostic tunnel")
+    doctor_parser.add_argument('--json', help='Write a machine-readable report to this file')
     
     # List command
     list_parser = subparsers.add_parser('list', help='List your active tunnels')
@@ -354,6 +872,10 @@ Examples:
         login(args.api_url)
     elif args.command == 'live':
         go_live(args)
+    elif args.command in ('doctor', 'bench'):
+        doctor(args)
+    elif args.command == 'publish':
+        publish(args)
     elif args.command == 'list':
         list_tunnels()
     else:
@@ -0,0 +1,213 @@
+import asyncio
+import logging
+import time
+from typing import AsyncIterator, Dict, Optional, Set
+
+from config import settings
+from streaming import SSE_HEARTBEAT
+from tunnel_listing import dumps
+from tunnel_manager import tunnel_manager
+
+logger = logging.getLogger(__name__)
+
+_END = None  # queue sentinel: tunnel closed or hub shutting down
+
+
+class StatsMessage:
+    """One update, encoded once and shared by every subscriber"""
+
+    __slots__ = ("text", "sse")
+
+    def __init__(self, kind: str, payload: dict):
+        data = dumps(payload)
+        self.text = data.decode()
+        self.sse = b"event: " + kind.encode() + b"\ndata: " + data + b"\n\n"
+
+
+class StatsSubscriber:
+    """One dashboard connection, with a bounded backlog
+
+    ``baseline`` is the snapshot it started from, kept until its first
+    tick so that tick only carries what changed since that snapshot.
+    """
+
+    __slots__ = ("queue", "baseline")
+
+    def __init__(self, baseline: dict):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=settings.STATS_STREAM_BUFFER)
+        self.baseline: Optional[dict] = baseline
+
+
+class LiveStatsHub:
+    """Pushes coalesced per-tunnel stat deltas to dashboard subscribers
+
+    A single ticker runs while anyone is subscribed. Every STATS_STREAM_TICK
+    it takes one snapshot per watched tunnel, diffs it against the previous
+    one, and hands the same encoded delta to all of that tunnel's
+    subscribers, so the per-subscriber cost is one queue put. Deltas carry
+    absolute values of the changed fields; a subscriber that falls behind has
+    its backlog replaced by a fresh snapshot.
+    """
+
+    def __init__(self, manager):
+        self.manager = manager
+        self.subscribers: Dict[str, Set[StatsSubscriber]] = {}
+        self._last: Dict[str, dict] = {}
+        self._seq = 0
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _stats(tunnel) -> dict:
+        return {
+            "viewers_count": len(tunnel.viewers),
+            "bytes_transferred": tunnel.bytes_transferred,
+            "bytes_ingress": tunnel.meter.ingress,
+            "bytes_egress": tunnel.meter.egress,
+            "requests_count": tunnel.requests_count,
+            "streams_active": tunnel.streams_active,
+            "status": tunnel.status,
+            "breaker": tunnel.breaker.state,
+            "reconnects": tunnel.reconnects
+        }
+
+    def _snapshot_message(self, tunnel_id: str, stats: dict) -> StatsMessage:
+        return StatsMessage("snapshot", {
+            "type": "snapshot", "tunnel_id": tunnel_id, "seq": self._seq, "ts": time.time(), "stats": stats
+        })
+
+    def subscribe(self, tunnel_id: str) -> Optional[StatsSubscriber]:
+        """Attach a subscriber, starting with a full snapshot; None if the tunnel is unknown"""
+        tunnel = self.manager.tunnels.get(tunnel_id)
+        if tunnel is None:
+            return None
+
+        stats = self._stats(tunnel)
+        subscriber = StatsSubscriber(stats)
+        subscriber.queue.put_nowait(self._snapshot_message(tunnel_id, stats))
+        self.subscribers.setdefault(tunnel_id, set()).add(subscriber)
+        self._last.setdefault(tunnel_id, stats)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return subscriber
+
+    def unsubscribe(self, tunnel_id: str, subscriber: StatsSubscriber):
+        subscribers = self.subscribers.get(tunnel_id)
+        if subscribers is None:
+            return
+        subscribers.discard(subscriber)
+        if not subscribers:
+            del self.subscribers[tunnel_id]
+            self._last.pop(tunnel_id, None)
+
+    def subscriber_count(self, tunnel_id: str) -> int:
+        return len(self.subscribers.get(tunnel_id, ()))
+
+    async def _run(self):
+        while self.subscribers:
+            await asyncio.sleep(settings.STATS_STREAM_TICK)
+            try:
+                self._tick()
+            except Exception as e:
+                logger.error(f"Error pushing live stats: {e}")
+
+    def _tick(self):
+        self._seq += 1
+        now = time.time()
+        for tunnel_id, subscribers in list(self.subscribers.items()):
+            tunnel = self.manager.tunnels.get(tunnel_id)
+            if tunnel is None:
+                self._publish(subscribers, self._delta(tunnel_id, now, {"status": "closed"}), None)
+                for subscriber in subscribers:
+                    self._end(subscriber)
+                del self.subscribers[tunnel_id]
+                self._last.pop(tunnel_id, None)
+                continue
+
+            stats = self._stats(tunnel)
+            changes = self._diff(self._last.get(tunnel_id, {}), stats)
+            self._last[tunnel_id] = stats
+            snapshot = lambda: self._snapshot_message(tunnel_id, stats)
+
+            # Subscribers that joined since the last tick diff against their own snapshot
+            steady = set()
+            for subscriber in subscribers:
+                if subscriber.baseline is None:
+                    steady.add(subscriber)
+                    continue
+                own = self._diff(subscriber.baseline, stats)
+                subscriber.baseline = None
+                if own and own != changes:
+                    self._publish({subscriber}, self._delta(tunnel_id, now, own), snapshot)
+                elif own:
+                    steady.add(subscriber)
+
+            if changes and steady:
+                self._publish(steady, self._delta(tunnel_id, now, changes), snapshot)
+
+    @staticmethod
+    def _diff(last: dict, stats: dict) -> dict:
+        return {key: value for key, value in stats.items() if last.get(key) != value}
+
+    def _delta(self, tunnel_id: str, now: float, changes: dict) -> StatsMessage:
+        return StatsMessage("delta", {
+            "type": "delta", "tunnel_id": tunnel_id, "seq": self._seq, "ts": now, "changes": changes
+        })
+
+    @staticmethod
+    def _publish(subscribers: Set[StatsSubscriber], message: StatsMessage, snapshot):
+        resync = None
+        for subscriber in subscribers:
+            try:
+                subscriber.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # Too far behind for deltas to help: swap the backlog for one snapshot
+                while not subscriber.queue.empty():
+                    subscriber.queue.get_nowait()
+                if snapshot is None:
+                    subscriber.queue.put_nowait(message)
+                    continue
+                if resync is None:
+                    resync = snapshot()
+                subscriber.queue.put_nowait(resync)
+
+    @staticmethod
+    def _end(subscriber: StatsSubscriber):
+        """Deliver the end-of-stream sentinel, making room if the backlog is full"""
+        while True:
+            try:
+                subscriber.queue.put_nowait(_END)
+                return
+            except asyncio.QueueFull:
+                subscriber.queue.get_nowait()
+
+    async def stream(self, tunnel_id: str, subscriber: StatsSubscriber, sse: bool) -> AsyncIterator:
+        """Yield encoded updates (SSE frames or WebSocket text) until the tunnel closes"""
+        try:
+            while True:
+                try:
+                    message = await asyncio.wait_for(
+                        subscriber.queue.get(), timeout=settings.STREAM_HEARTBEAT_INTERVAL
+                    )
+                except asyncio.TimeoutError:
+                    if sse:
+                        yield SSE_HEARTBEAT
+                    continue
+                if message is _END:
+                    break
+                yield message.sse if sse else message.text
+        finally:
+            self.unsubscribe(tunnel_id, subscriber)
+
+    async def close(self):
+        """End every subscription and stop the ticker"""
+        for subscribers in self.subscribers.values():
+            for subscriber in subscribers:
+                self._end(subscriber)
+        self.subscribers.clear()
+        self._last.clear()
+        if self._task:
+            self._task.cancel()
+
+
+# Global live stats hub instance
+live_stats = LiveStatsHub(tunnel_manager)
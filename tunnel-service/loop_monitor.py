@@ -0,0 +1,165 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+from collections import deque
+from typing import Deque, Optional
+
+from config import settings
+from structured_logging import log_sampler
+
+logger = logging.getLogger(__name__)
+
+_ASYNCIO_DIR = os.path.dirname(asyncio.__file__)
+
+
+class LoopMonitor:
+    """Event-loop lag percentiles plus a detector for callbacks that block it
+
+    A coroutine sleeps LOOP_LAG_INTERVAL at a time and records how late it
+    wakes up; the spread of those delays is how long any ready callback
+    waits to run. A daemon thread watches the same ticks, and when the loop
+    has not ticked for LOOP_SLOW_CALLBACK_MS it grabs the loop thread's
+    stack while the offender is still running, so the report names the
+    coroutine and line that blocked rather than whatever ran next.
+
+    Cost is one timer per interval on the loop and one wakeup per half
+    threshold in the thread; asyncio debug mode is never turned on.
+    """
+
+    def __init__(self):
+        self.enabled = settings.LOOP_MONITOR_ENABLED
+        self.running = False
+        self.samples: Deque[float] = deque(maxlen=settings.LOOP_LAG_WINDOW)
+        self.slow_callbacks: Deque[dict] = deque(maxlen=settings.LOOP_SLOW_CALLBACK_HISTORY)
+        self.stalls = 0
+        self.max_lag = 0.0
+        self._last_tick = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._pending: Optional[dict] = None
+        self._stop = threading.Event()
+        self._watchdog: Optional[threading.Thread] = None
+
+    async def start(self):
+        """Measure scheduling delay until stopped"""
+        if not self.enabled:
+            return
+        self.running = True
+        self._loop_thread_id = threading.get_ident()
+        self._last_tick = time.monotonic()
+        self._stop.clear()
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+        logger.info("⏱️  Event loop monitor started")
+
+        interval = settings.LOOP_LAG_INTERVAL
+        while self.running:
+            expected = time.monotonic() + interval
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            self._last_tick = now
+            lag = max(0.0, now - expected)
+            self.samples.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+            if self._pending is not None:
+                self._finish_stall(lag)
+
+    async def stop(self):
+        self.running = False
+        self._stop.set()
+
+    def _watch(self):
+        """Watchdog thread: capture the loop's stack while it is blocked"""
+        threshold = settings.LOOP_SLOW_CALLBACK_MS / 1000
+        interval = settings.LOOP_LAG_INTERVAL
+        captured_tick = None
+        while not self._stop.wait(threshold / 2):
+            tick = self._last_tick
+            blocked = time.monotonic() - tick - interval
+            if blocked < threshold or tick == captured_tick:
+                continue
+            captured_tick = tick
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            callback, stack = self._describe(frame)
+            del frame
+            # Handed to the loop, which fills in the full duration once it runs again
+            self._pending = {
+                "at": time.time(),
+                "callback": callback,
+                "stack": stack,
+                "blocked_ms": round(blocked * 1000, 1)
+            }
+
+    @staticmethod
+    def _describe(frame):
+        """Name the callback running under the loop's ``Handle._run`` and format its stack"""
+        frames = []
+        while frame is not None:
+            frames.append(frame)
+            frame = frame.f_back
+        frames.reverse()
+
+        start = 0
+        for i, f in enumerate(frames):
+            if f.f_code.co_name == "_run" and f.f_code.co_filename.startswith(_ASYNCIO_DIR):
+                start = i + 1
+        callback = None
+        for f in frames[start:]:
+            if not f.f_code.co_filename.startswith(_ASYNCIO_DIR):
+                callback = f"{f.f_code.co_qualname} ({f.f_code.co_filename}:{f.f_code.co_firstlineno})"
+                break
+
+        stack = [
+            f"{f.f_code.co_filename}:{f.f_lineno} in {f.f_code.co_name}"
+            for f in frames[start:][-settings.LOOP_SLOW_CALLBACK_STACK_DEPTH:]
+        ]
+        return callback or "<unknown>", stack
+
+    def _finish_stall(self, lag: float):
+        event, self._pending = self._pending, None
+        event["blocked_ms"] = max(event["blocked_ms"], round(lag * 1000, 1))
+        self.slow_callbacks.append(event)
+        self.stalls += 1
+        if log_sampler.allow("loop_stall"):
+            logger.warning(
+                "🐢 Event loop blocked %.0f ms by %s",
+                event["blocked_ms"], event["callback"],
+                extra=log_sampler.fields("loop_stall", blocked_ms=event["blocked_ms"],
+                                         callback=event["callback"],
+                                         stack_top=event["stack"][-1] if event["stack"] else None)
+            )
+
+    @staticmethod
+    def _percentile(ordered: list, pct: float) -> float:
+        return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+    def snapshot(self) -> dict:
+        """Lag percentiles over the sample window, in milliseconds"""
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {"enabled": self.enabled, "samples": 0, "stalls": self.stalls}
+        return {
+            "enabled": self.enabled,
+            "samples": len(ordered),
+            "window_s": round(len(ordered) * settings.LOOP_LAG_INTERVAL),
+            "lag_ms": {
+                "p50": round(self._percentile(ordered, 50) * 1000, 2),
+                "p95": round(self._percentile(ordered, 95) * 1000, 2),
+                "p99": round(self._percentile(ordered, 99) * 1000, 2),
+                "max": round(ordered[-1] * 1000, 2)
+            },
+            "max_lag_ms": round(self.max_lag * 1000, 2),
+            "stalls": self.stalls
+        }
+
+    def report(self) -> dict:
+        """Snapshot plus the most recent slow callbacks, newest first"""
+        return {**self.snapshot(), "slow_callbacks": list(reversed(self.slow_callbacks))}
+
+
+# Global event loop monitor
+loop_monitor = LoopMonitor()
@@ -1,18 +1,36 @@
-from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi import FastAPI, HTTPException, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import FileResponse, StreamingResponse
 import asyncio
+import hmac
 import logging
+import math
+import time
 from contextlib import asynccontextmanager
-from typing import Optional
+from typing import Dict, List, Optional
 import aiohttp
 from pydantic import BaseModel
 
 from config import settings
 from tunnel_manager import tunnel_manager
 from health_monitor import TunnelHealthMonitor, TunnelMetricsCollector
-
-logging.basicConfig(level=logging.INFO)
+from user_resolver import user_resolver
+from request_tracing import tracer
+from structured_logging import log_sampler, setup_logging, stop_logging
+from broadcast import BroadcastUnavailable, broadcast_manager
+from streaming import is_stream_request, is_stream_response, stream_body, stream_headers, stream_timeout
+from asset_store import AssetEntry, AssetError, asset_store
+from tunnel_tokens import TunnelTokenError, verify_tunnel_token
+from tunnel_listing import tunnel_listing
+from live_stats import live_stats
+from usage_ledger import usage_ledger
+from admission import Overloaded, admission
+from edge_router import edge_router
+from memory_diagnostics import memory_diagnostics
+from loop_monitor import loop_monitor
+from traffic_sketch import DIMENSIONS, PUBLIC_DIMENSIONS
+
+setup_logging()
 logger = logging.getLogger(__name__)
 
 
@@ -25,6 +43,9 @@ async def lifespan(app: FastAPI):
     # Start SSH server
     await tunnel_manager.start_ssh_server()
     
+    # Start Host/SNI router (if configured)
+    await edge_router.start()
+    
     # Start health monitor
     health_monitor = TunnelHealthMonitor(tunnel_manager)
     health_monitor_task = asyncio.create_task(health_monitor.start())
@@ -33,6 +54,15 @@ async def lifespan(app: FastAPI):
     metrics_collector = TunnelMetricsCollector(tunnel_manager)
     metrics_task = asyncio.create_task(metrics_collector.start())
     
+    # Start usage ledger
+    usage_task = asyncio.create_task(usage_ledger.start(tunnel_manager))
+    
+    # Start RSS sampling for the admin memory report
+    memory_task = asyncio.create_task(memory_diagnostics.start())
+    
+    # Start event loop lag / slow callback monitoring
+    loop_task = asyncio.create_task(loop_monitor.start())
+    
     logger.info("✅ Tunnel Service started successfully")
     
     yield
@@ -43,14 +73,26 @@ async def lifespan(app: FastAPI):
     # Stop monitors
     await health_monitor.stop()
     await metrics_collector.stop()
+    await memory_diagnostics.stop()
+    await loop_monitor.stop()
     health_monitor_task.cancel()
     metrics_task.cancel()
+    memory_task.cancel()
+    loop_task.cancel()
     
     # Close all tunnels
     for tunnel_id in list(tunnel_manager.tunnels.keys()):
         await tunnel_manager.close_tunnel(tunnel_id)
     
+    await edge_router.close()
+    await usage_ledger.close()
+    usage_task.cancel()
+    await live_stats.close()
+    await user_resolver.close()
+    await tracer.close()
+    
     logger.info("✅ Tunnel Service shutdown complete")
+    stop_logging()
 
 
 app = FastAPI(
@@ -84,6 +126,9 @@ class TunnelResponse(BaseModel):
     project_name: str
     remote_port: int
     public_url: str
+    host_url: Optional[str] = None
+    tls_url: Optional[str] = None
+    tcp_address: Optional[str] = None
     ssh_command: str
     status: str
     viewers_count: int
@@ -94,9 +139,27 @@ class TunnelStatsResponse(BaseModel):
     tunnel_id: str
     viewers_count: int
     bytes_transferred: int
+    bytes_ingress: int = 0
+    bytes_egress: int = 0
+    asset_bytes_served: int = 0
     requests_count: int
+    streams_active: int = 0
+    streams_total: int = 0
+    reconnects: int = 0
     uptime_seconds: float
     status: str
+    degraded: bool = False
+    warmup_latency_ms: Optional[float] = None
+    breaker: Optional[dict] = None
+    broadcast: Optional[dict] = None
+
+
+class AssetHashesRequest(BaseModel):
+    hashes: List[str]
+
+
+class AssetManifestRequest(BaseModel):
+    files: Dict[str, dict]  # path -> {"sha256", "size", "content_type"}
 
 
 # API Endpoints
@@ -109,48 +172,62 @@ async def root():
         "service": "Hexagon Tunnel Service",
         "version": "1.0.0",
         "active_tunnels": len(tunnel_manager.tunnels),
+        "ssh_connections": tunnel_manager.ssh_connection_count(),
+        "viewers": tunnel_manager.viewer_count(),
+        "admission": admission.snapshot(),
+        "usage_ledger": usage_ledger.stats(),
+        "loop_lag_ms": loop_monitor.snapshot().get("lag_ms"),
         "ssh_server": f"{settings.SSH_HOST}:{settings.SSH_PORT}"
     }
 
 
+def _listing_response(request: Request, body: bytes) -> Response:
+    """Serve a pre-encoded listing page, or 304 if the poller already has this version"""
+    etag = tunnel_listing.etag
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
 @app.get("/tunnels")
-async def list_tunnels():
-    """List all active tunnels"""
-    tunnels = []
-    for tunnel in tunnel_manager.tunnels.values():
-        tunnels.append({
-            "tunnel_id": tunnel.tunnel_id,
-            "username": tunnel.username,
-            "project_name": tunnel.project_name,
-            "remote_port": tunnel.remote_port,
-            "public_url": f"http://{settings.PUBLIC_DOMAIN}/live/{tunnel.username}/{tunnel.project_name}",
-            "viewers_count": len(tunnel.viewers),
-            "status": tunnel.status,
-            "created_at": tunnel.created_at
-        })
-    return {"tunnels": tunnels, "count": len(tunnels)}
+async def list_tunnels(
+    request: Request,
+    status: Optional[str] = None,
+    user_id: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None
+):
+    """List active tunnels, newest first (cursor-paginated)"""
+    try:
+        body = tunnel_listing.page(status=status, user_id=user_id, cursor=cursor, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _listing_response(request, body)
 
 
 @app.get("/tunnels/user/{user_id}")
-async def get_user_tunnels(user_id: str):
-    """Get all tunnels for a specific user"""
-    tunnels = await tunnel_manager.get_user_tunnels(user_id)
-    return {
-        "user_id": user_id,
-        "tunnels": [
-            {
-                "tunnel_id": t.tunnel_id,
-                "project_name": t.project_name,
-                "remote_port": t.remote_port,
-                "public_url": f"http://{settings.PUBLIC_DOMAIN}/live/{t.username}/{t.project_name}",
-                "viewers_count": len(t.viewers),
-                "status": t.status,
-                "created_at": t.created_at
-            }
-            for t in tunnels
-        ],
-        "count": len(tunnels)
-    }
+async def get_user_tunnels(
+    user_id: str,
+    request: Request,
+    status: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None
+):
+    """Get a user's tunnels, newest first (cursor-paginated)
+    
+    Same shape as GET /tunnels: ``{"tunnels": [...], "count", "total",
+    "next_cursor", "version", "user_id"}``. Entries also carry ``user_id``
+    and ``username``. ``count`` is the number of tunnels on this page and
+    ``total`` the number matching the filters; follow ``next_cursor`` until
+    it is null to fetch the rest. ``version`` moves when tunnels are added,
+    removed or change status, not on viewer churn; the ETag covers both.
+    """
+    try:
+        body = tunnel_listing.page(status=status, user_id=user_id, cursor=cursor, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _listing_response(request, body)
 
 
 @app.get("/tunnels/{tunnel_id}")
@@ -165,7 +242,7 @@ async def get_tunnel(tunnel_id: str):
         username=tunnel.username,
         project_name=tunnel.project_name,
         remote_port=tunnel.remote_port,
-        public_url=f"http://{settings.PUBLIC_DOMAIN}/live/{tunnel.username}/{tunnel.project_name}",
+        **tunnel_manager.public_urls(tunnel),
         ssh_command=f"ssh -R {tunnel.remote_port}:localhost:{tunnel.local_port} {tunnel.user_id}:{tunnel.tunnel_id}:{tunnel.project_name}@{settings.SSH_HOST} -p {settings.SSH_PORT}",
         status=tunnel.status,
         viewers_count=len(tunnel.viewers),
@@ -180,17 +257,109 @@ async def get_tunnel_stats(tunnel_id: str):
     if not tunnel:
         raise HTTPException(status_code=404, detail="Tunnel not found")
     
-    import time
     return TunnelStatsResponse(
         tunnel_id=tunnel.tunnel_id,
         viewers_count=len(tunnel.viewers),
         bytes_transferred=tunnel.bytes_transferred,
+        bytes_ingress=tunnel.meter.ingress,
+        bytes_egress=tunnel.meter.egress,
+        asset_bytes_served=tunnel.asset_bytes_served,
         requests_count=tunnel.requests_count,
+        streams_active=tunnel.streams_active,
+        streams_total=tunnel.streams_total,
+        reconnects=tunnel.reconnects,
         uptime_seconds=time.time() - tunnel.created_at,
-        status=tunnel.status
+        status=tunnel.status,
+        degraded=tunnel.degraded,
+        warmup_latency_ms=tunnel.warmup_latency_ms,
+        breaker=tunnel.breaker.snapshot(),
+        broadcast=broadcast_manager.tunnel_stats(tunnel.tunnel_id)
     )
 
 
+@app.get("/tunnels/{tunnel_id}/stats/traffic")
+async def get_tunnel_traffic(
+    tunnel_id: str,
+    request: Request,
+    top: Optional[int] = None,
+    path: Optional[str] = None,
+    status: Optional[int] = None,
+    viewer: Optional[str] = None
+):
+    """Estimated hot paths and status codes, plus point estimates for any given key
+
+    Viewer IPs (top viewers and ``?viewer=``) are only returned to the
+    tunnel's creator, who must present its tunnel token.
+    """
+    owner = viewer is not None or request.headers.get("authorization")
+    if owner:
+        tunnel = await _require_tunnel_owner(request, tunnel_id)
+    else:
+        tunnel = await tunnel_manager.get_tunnel(tunnel_id)
+    if not tunnel:
+        raise HTTPException(status_code=404, detail="Tunnel not found")
+    
+    traffic = tunnel.traffic
+    dimensions = DIMENSIONS if owner else PUBLIC_DIMENSIONS
+    result = {"tunnel_id": tunnel_id, **traffic.snapshot(top, dimensions)}
+    estimates = {
+        dimension: traffic.estimate(dimension, key)
+        for dimension, key in (("paths", path), ("statuses", status), ("viewers", viewer))
+        if key is not None
+    }
+    if estimates:
+        result["estimates"] = estimates
+    return result
+
+
+@app.get("/tunnels/{tunnel_id}/stats/stream")
+async def stream_tunnel_stats(tunnel_id: str):
+    """Server-sent events: a stats snapshot, then coalesced deltas"""
+    subscriber = live_stats.subscribe(tunnel_id)
+    if subscriber is None:
+        raise HTTPException(status_code=404, detail="Tunnel not found")
+    
+    return StreamingResponse(
+        live_stats.stream(tunnel_id, subscriber, sse=True),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.websocket("/tunnels/{tunnel_id}/stats/ws")
+async def tunnel_stats_websocket(websocket: WebSocket, tunnel_id: str):
+    """WebSocket: a stats snapshot, then coalesced deltas (JSON text frames)"""
+    subscriber = live_stats.subscribe(tunnel_id)
+    if subscriber is None:
+        await websocket.close(code=4404)
+        return
+    
+    await websocket.accept()
+    
+    async def send_updates():
+        async for text in live_stats.stream(tunnel_id, subscriber, sse=False):
+            await websocket.send_text(text)
+    
+    async def wait_for_disconnect():
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+    
+    sender = asyncio.create_task(send_updates())
+    receiver = asyncio.create_task(wait_for_disconnect())
+    try:
+        done, _ = await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+        if sender in done:
+            # Tunnel closed (or the client went away mid-send)
+            try:
+                await websocket.close()
+            except (RuntimeError, WebSocketDisconnect):
+                pass
+    finally:
+        sender.cancel()
+        receiver.cancel()
+        live_stats.unsubscribe(tunnel_id, subscriber)
+
+
 @app.delete("/tunnels/{tunnel_id}")
 async def close_tunnel(tunnel_id: str):
     """Close a tunnel"""
@@ -204,7 +373,14 @@ async def close_tunnel(tunnel_id: str):
 
 @app.post("/tunnels/{tunnel_id}/viewers/{viewer_id}")
 async def add_viewer(tunnel_id: str, viewer_id: str):
-    """Add a viewer to a tunnel"""
+    """Add a viewer to a tunnel; it must heartbeat within VIEWER_PRESENCE_TTL to stay present"""
+    tunnel = await tunnel_manager.get_tunnel(tunnel_id)
+    if tunnel and viewer_id not in tunnel.viewers and len(tunnel.viewers) >= tunnel.max_viewers:
+        raise HTTPException(
+            status_code=403,
+            detail=f"Viewer limit reached ({tunnel.max_viewers} viewers for {tunnel.tier} tier)"
+        )
+    
     success = await tunnel_manager.add_viewer(tunnel_id, viewer_id)
     if not success:
         raise HTTPException(status_code=404, detail="Tunnel not found")
@@ -212,6 +388,14 @@ async def add_viewer(tunnel_id: str, viewer_id: str):
     return {"message": "Viewer added", "tunnel_id": tunnel_id, "viewer_id": viewer_id}
 
 
+@app.put("/tunnels/{tunnel_id}/viewers/{viewer_id}/heartbeat", status_code=204)
+async def viewer_heartbeat(tunnel_id: str, viewer_id: str):
+    """Keep a viewer present; 404 means it expired and must be added again"""
+    if not tunnel_manager.heartbeat_viewer(tunnel_id, viewer_id):
+        raise HTTPException(status_code=404, detail="Viewer not present")
+    return Response(status_code=204)
+
+
 @app.delete("/tunnels/{tunnel_id}/viewers/{viewer_id}")
 async def remove_viewer(tunnel_id: str, viewer_id: str):
     """Remove a viewer from a tunnel"""
@@ -219,53 +403,371 @@ async def remove_viewer(tunnel_id: str, viewer_id: str):
     return {"message": "Viewer removed", "tunnel_id": tunnel_id, "viewer_id": viewer_id}
 
 
+# Static asset offload (uploaded by the CLI `publish` command)
+
+async def _require_tunnel_owner(request: Request, tunnel_id: str):
+    """Live tunnel whose creator presented its tunnel token as a Bearer token
+
+    The token only proves ownership here, so it is accepted after expiry
+    for as long as the tunnel stays up.
+    """
+    auth = request.headers.get("authorization", "")
+    if not auth.startswith("Bearer "):
+        raise HTTPException(status_code=401, detail="Missing tunnel token")
+    try:
+        claims = verify_tunnel_token(auth[len("Bearer "):], allow_expired=True)
+    except TunnelTokenError as e:
+        raise HTTPException(status_code=401, detail=str(e))
+    
+    tunnel = await tunnel_manager.get_tunnel(tunnel_id)
+    if not tunnel:
+        raise HTTPException(status_code=404, detail="Tunnel not found or offline")
+    if claims.tunnel_id != tunnel_id or claims.user_id != tunnel.user_id:
+        raise HTTPException(status_code=403, detail="Token is not valid for this tunnel")
+    return tunnel
+
+
+@app.post("/tunnels/{tunnel_id}/assets/missing")
+async def missing_assets(tunnel_id: str, body: AssetHashesRequest, request: Request):
+    """Which of the given content hashes still need uploading"""
+    await _require_tunnel_owner(request, tunnel_id)
+    missing = await asyncio.to_thread(asset_store.missing, body.hashes)
+    return {"missing": missing}
+
+
+@app.put("/tunnels/{tunnel_id}/assets/blobs/{sha256}")
+async def upload_asset_blob(tunnel_id: str, sha256: str, request: Request):
+    """Store one gzip-compressed file under the SHA-256 of its content"""
+    await _require_tunnel_owner(request, tunnel_id)
+    if int(request.headers.get("content-length") or 0) > settings.ASSET_MAX_BLOB_BYTES:
+        raise HTTPException(status_code=413, detail="Blob too large")
+    
+    # Chunked uploads have no Content-Length, so the cap also applies while reading
+    chunks = []
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > settings.ASSET_MAX_BLOB_BYTES:
+            raise HTTPException(status_code=413, detail="Blob too large")
+        chunks.append(chunk)
+    compressed = b"".join(chunks)
+    try:
+        await asyncio.to_thread(asset_store.put_blob, sha256, compressed)
+    except AssetError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"sha256": sha256, "stored": True}
+
+
+@app.put("/tunnels/{tunnel_id}/assets/manifest")
+async def publish_asset_manifest(tunnel_id: str, body: AssetManifestRequest, request: Request):
+    """Replace the set of paths served from the asset store for a tunnel"""
+    await _require_tunnel_owner(request, tunnel_id)
+    try:
+        await asyncio.to_thread(asset_store.set_manifest, tunnel_id, body.files)
+    except AssetError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    logger.info(f"📦 Published {len(body.files)} static assets for tunnel {tunnel_id}")
+    return {"tunnel_id": tunnel_id, "files": len(body.files)}
+
+
+@app.delete("/tunnels/{tunnel_id}/assets/manifest")
+async def unpublish_asset_manifest(tunnel_id: str, request: Request):
+    """Stop serving static assets; every path goes through the tunnel again"""
+    await _require_tunnel_owner(request, tunnel_id)
+    asset_store.drop_manifest(tunnel_id)
+    return {"tunnel_id": tunnel_id, "files": 0}
+
+
+async def _serve_asset(request: Request, tunnel_id: str, asset: AssetEntry) -> Response:
+    """Answer from the asset store instead of the creator's machine"""
+    etag = f'"{asset.sha256}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    
+    blob = asset_store.blob_path(asset.sha256)
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        # Blobs are stored gzipped, so they go out byte-for-byte from disk
+        # (sendfile on servers offering the ASGI pathsend extension)
+        tunnel_manager.record_asset_served(tunnel_id, asset.compressed_size)
+        headers["Content-Encoding"] = "gzip"
+        return FileResponse(blob, headers=headers, media_type=asset.content_type)
+    
+    # Inflated chunk by chunk in the threadpool rather than held in memory whole
+    tunnel_manager.record_asset_served(tunnel_id, asset.size)
+    headers["Content-Length"] = str(asset.size)
+    return StreamingResponse(asset_store.iter_content(asset.sha256), headers=headers, media_type=asset.content_type)
+
+
 # Proxy endpoint for accessing tunnels
 @app.api_route("/live/{username}/{project_name}/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS"])
 async def proxy_to_tunnel(username: str, project_name: str, path: str, request: Request):
     """Proxy requests to the creator's localhost through the tunnel"""
     
+    trace = tracer.start(request.method, path)
+    if trace:
+        trace.begin("route")
+    
     # Find the tunnel
     tunnel = await tunnel_manager.get_tunnel_by_username_project(username, project_name)
     if not tunnel:
+        if trace:
+            tracer.finish(trace, 404)
         raise HTTPException(status_code=404, detail="Tunnel not found or offline")
     
+    if trace:
+        trace.end("route")
+        trace.tunnel_id = tunnel.tunnel_id
+    viewer_ip = request.client.host if request.client else None
+    
+    # Published static files never cross the tunnel; misses fall through
+    if request.method == "GET":
+        asset = asset_store.lookup(tunnel.tunnel_id, path)
+        if asset:
+            response = await _serve_asset(request, tunnel.tunnel_id, asset)
+            tunnel.traffic.record(path, response.status_code, viewer_ip)
+            if trace:
+                tracer.finish(trace, response.status_code)
+            return response
+    
+    # Ride out a creator reconnect rather than failing the viewer
+    if tunnel.status != "active" and not await tunnel_manager.wait_until_connected(
+        tunnel, settings.TUNNEL_RECONNECT_WAIT
+    ):
+        tunnel.traffic.record(path, 503, viewer_ip)
+        if trace:
+            tracer.finish(trace, 503)
+        raise HTTPException(
+            status_code=503,
+            detail="Tunnel is reconnecting",
+            headers={"Retry-After": str(math.ceil(settings.TUNNEL_RECONNECT_WAIT))}
+        )
+    
+    # Viewer traffic through the proxy doubles as a presence heartbeat
+    viewer_id = request.headers.get(settings.VIEWER_HEARTBEAT_HEADER)
+    if viewer_id:
+        tunnel_manager.heartbeat_viewer(tunnel.tunnel_id, viewer_id)
+    
     # Check viewer limits
     # TODO: Implement tier-based viewer limits
     
     # Construct the target URL (tunnel's remote port)
     target_url = f"http://localhost:{tunnel.remote_port}/{path}"
     
-    # Get request body
-    body = await request.body()
+    # Fail fast while the creator's app is known to be down
+    breaker = tunnel.breaker
+    if not breaker.allow_request():
+        tunnel.traffic.record(path, 503, viewer_ip)
+        if trace:
+            tracer.finish(trace, 503)
+        raise HTTPException(
+            status_code=503,
+            detail="Tunnel temporarily unavailable",
+            headers={"Retry-After": str(math.ceil(breaker.retry_after()))}
+        )
+    
+    # Broadcast paths share one upstream stream among all viewers
+    if request.method == "GET" and broadcast_manager.is_broadcast_path(path):
+        try:
+            hub, subscriber = await broadcast_manager.join(
+                tunnel.tunnel_id,
+                f"{path}?{request.url.query}" if request.url.query else path,
+                tunnel_manager.get_upstream_session(tunnel),
+                f"{target_url}?{request.url.query}" if request.url.query else target_url,
+                request.headers.get("accept", ""),
+                breaker.timeout().sock_connect
+            )
+        except BroadcastUnavailable as e:
+            logger.warning(f"Broadcast unavailable for tunnel {tunnel.tunnel_id}, proxying directly: {e}")
+        except Overloaded as e:
+            breaker.release()
+            tunnel.traffic.record(path, 503, viewer_ip)
+            if trace:
+                tracer.finish(trace, 503)
+            raise HTTPException(
+                status_code=503,
+                detail="Service overloaded",
+                headers={"Retry-After": str(math.ceil(e.retry_after))}
+            )
+        else:
+            breaker.record_success(None)
+            tunnel.traffic.record(path, hub.status, viewer_ip)
+            if trace:
+                tracer.finish(trace, hub.status)
+            tunnel_manager.stream_opened(tunnel.tunnel_id)
+            return StreamingResponse(
+                hub.stream(subscriber, lambda sent: tunnel_manager.stream_closed(tunnel.tunnel_id)),
+                status_code=hub.status,
+                headers=hub.headers,
+                media_type=hub.media_type
+            )
+    
+    # Bound in-flight work across all tunnels; shed quickly rather than queue.
+    # Streams may idle for minutes before headers, so they get their own pool.
+    streaming = is_stream_request(request.headers, path)
+    try:
+        if streaming:
+            admission.acquire_stream()
+        else:
+            await admission.acquire(tunnel.tier)
+    except Overloaded as e:
+        breaker.release()
+        tunnel.traffic.record(path, 503, viewer_ip)
+        if trace:
+            tracer.finish(trace, 503)
+        raise HTTPException(
+            status_code=503,
+            detail="Service overloaded",
+            headers={"Retry-After": str(math.ceil(e.retry_after))}
+        )
+    except asyncio.CancelledError:
+        breaker.release()
+        raise
     
     # Forward the request
+    status = 502
+    outcome_recorded = False
+    latency_ratio = None
+    if streaming:
+        timeout = stream_timeout(breaker.timeout().sock_connect)
+    else:
+        timeout = breaker.timeout()
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.request(
-                method=request.method,
-                url=target_url,
-                headers={k: v for k, v in request.headers.items() if k.lower() not in ['host', 'content-length']},
-                data=body,
-                allow_redirects=False,
-                timeout=aiohttp.ClientTimeout(total=30)
-            ) as response:
-                # Update stats
-                content = await response.read()
-                await tunnel_manager.update_stats(tunnel.tunnel_id, len(content))
-                
-                # Return response
-                return Response(
-                    content=content,
-                    status_code=response.status,
-                    headers=dict(response.headers),
-                    media_type=response.content_type
-                )
-                
+        # Read the body only once admitted, so shed requests never buffer it
+        if trace:
+            trace.begin("body")
+        body = await request.body()
+        if trace:
+            trace.end("body")
+        
+        session = tunnel_manager.get_upstream_session(tunnel)
+        if trace:
+            trace.begin("ttfb")
+        started = time.perf_counter()
+        response = await session.request(
+            method=request.method,
+            url=target_url,
+            headers={k: v for k, v in request.headers.items() if k.lower() not in ['host', 'content-length']},
+            data=body,
+            allow_redirects=False,
+            timeout=timeout,
+            trace_request_ctx=trace
+        )
+        # Long-poll/SSE time-to-headers says nothing about normal request latency
+        latency = None if streaming else time.perf_counter() - started
+        if latency is not None and breaker.median_latency:
+            latency_ratio = latency / breaker.median_latency
+        breaker.record_success(latency)
+        outcome_recorded = True
+        status = response.status
+        if trace:
+            trace.end("ttfb")
+            tracer.record_channel_setup(trace, tunnel.listener)
+            # Connection and channel setup are reported separately from the app's TTFB
+            trace.phases["ttfb"] -= trace.phases.get("connect", 0) + trace.phases.get("channel", 0)
+        
+        if streaming or is_stream_response(response):
+            # Pass-through mode: the body is relayed chunk by chunk after we return.
+            # Still a request for stats; only stream-request latency is left out above.
+            await tunnel_manager.update_stats(tunnel.tunnel_id)
+            tunnel_manager.stream_opened(tunnel.tunnel_id)
+            return StreamingResponse(
+                stream_body(response, lambda sent: tunnel_manager.stream_closed(tunnel.tunnel_id)),
+                status_code=response.status,
+                headers=stream_headers(response),
+                media_type=response.content_type
+            )
+        
+        try:
+            if trace:
+                trace.begin("transfer")
+            
+            # Update stats (bytes are metered by the tunnel listener)
+            content = await response.read()
+            await tunnel_manager.update_stats(tunnel.tunnel_id)
+        finally:
+            response.release()
+        
+        headers = dict(response.headers)
+        if trace:
+            trace.end("transfer")
+            if tracer.server_timing:
+                headers["Server-Timing"] = trace.server_timing()
+        
+        # Return response
+        return Response(
+            content=content,
+            status_code=response.status,
+            headers=headers,
+            media_type=response.content_type
+        )
+            
     except aiohttp.ClientError as e:
-        logger.error(f"Error proxying request to tunnel {tunnel.tunnel_id}: {e}")
+        if not outcome_recorded:
+            breaker.record_failure()
+            outcome_recorded = True
+        if log_sampler.allow("proxy_error"):
+            logger.error(
+                "Error proxying request to tunnel %s: %s", tunnel.tunnel_id, e,
+                extra=log_sampler.fields("proxy_error", tunnel_id=tunnel.tunnel_id)
+            )
         raise HTTPException(status_code=502, detail="Failed to connect to tunnel")
     except asyncio.TimeoutError:
+        if not outcome_recorded:
+            breaker.record_failure()
+            outcome_recorded = True
+        status = 504
         raise HTTPException(status_code=504, detail="Tunnel request timeout")
+    finally:
+        if not outcome_recorded:
+            breaker.release()
+        if streaming:
+            admission.release_stream()
+        else:
+            admission.release(latency_ratio)
+        tunnel.traffic.record(path, status, viewer_ip)
+        if trace:
+            tracer.finish(trace, status)
+
+
+# Admin diagnostics (opt-in via ADMIN_TOKEN)
+
+def _require_admin(request: Request):
+    """404 unless admin endpoints are enabled, 401 without the admin token"""
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    auth = request.headers.get("authorization", "")
+    if not auth.startswith("Bearer ") or not hmac.compare_digest(auth[7:], settings.ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Admin token required")
+
+
+@app.get("/admin/memory")
+async def admin_memory(request: Request, top: int = 20, objects: bool = True):
+    """RSS history, live object counts and tracemalloc top allocators / baseline diff"""
+    _require_admin(request)
+    return await memory_diagnostics.report(top=max(1, min(top, 200)), objects=objects)
+
+
+@app.post("/admin/memory/baseline")
+async def admin_memory_baseline(request: Request, frames: Optional[int] = None):
+    """Start tracemalloc if needed and take the snapshot later reports diff against"""
+    _require_admin(request)
+    return await memory_diagnostics.take_baseline(frames)
+
+
+@app.delete("/admin/memory/baseline")
+async def admin_memory_clear_baseline(request: Request):
+    """Forget the baseline and stop on-demand tracing"""
+    _require_admin(request)
+    return memory_diagnostics.clear_baseline()
+
+
+@app.get("/admin/loop")
+async def admin_loop(request: Request):
+    """Event loop lag percentiles and recent slow callbacks with their stacks"""
+    _require_admin(request)
+    return loop_monitor.report()
 
 
 if __name__ == "__main__":
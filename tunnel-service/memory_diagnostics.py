@@ -0,0 +1,163 @@
+import asyncio
+import gc
+import logging
+import os
+import resource
+import time
+import tracemalloc
+from collections import Counter, deque
+from typing import Dict, Optional
+
+from config import settings
+from tunnel_manager import tunnel_manager
+
+logger = logging.getLogger(__name__)
+
+# Per-tunnel objects worth counting when hunting leaks
+WATCHED_TYPES = (
+    "TunnelConnection", "TunnelListener", "ByteMeter", "CircuitBreaker", "TrafficSketch",
+    "SSHServerConnection", "SSHTCPChannel", "SSHTunnelServer",
+    "ClientSession", "TCPConnector", "BroadcastHub", "StatsSubscriber",
+)
+
+
+def rss_mb() -> float:
+    """Current resident set size in MB (Linux), falling back to peak RSS"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def count_objects(limit: int = 20) -> Dict[str, dict]:
+    """Live gc-tracked objects by type name: watched types plus the most common
+
+    Walks the whole heap, so it is for on-demand diagnostics only.
+    """
+    counts = Counter(type(obj).__name__ for obj in gc.get_objects())
+    return {
+        "watched": {name: counts.get(name, 0) for name in WATCHED_TYPES},
+        "top": dict(counts.most_common(limit))
+    }
+
+
+class MemoryDiagnostics:
+    """RSS history plus on-demand tracemalloc and object-count reports
+
+    The RSS sampler is one /proc read per MEMORY_RSS_INTERVAL. tracemalloc
+    costs real CPU and memory, so it only runs when MEMORY_TRACEMALLOC_FRAMES
+    is set or an admin takes a baseline snapshot, and stops when the
+    baseline is cleared.
+    """
+
+    def __init__(self, tunnel_manager):
+        self.tunnel_manager = tunnel_manager
+        self.history: deque = deque(maxlen=settings.MEMORY_RSS_HISTORY)
+        self.running = False
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+        self._baseline_at: Optional[float] = None
+
+    async def start(self):
+        """Sample RSS until stopped"""
+        self.running = True
+        if settings.MEMORY_TRACEMALLOC_FRAMES and not tracemalloc.is_tracing():
+            tracemalloc.start(settings.MEMORY_TRACEMALLOC_FRAMES)
+        while self.running:
+            self.history.append({
+                "ts": time.time(),
+                "rss_mb": round(rss_mb(), 2),
+                "tunnels": len(self.tunnel_manager.tunnels)
+            })
+            await asyncio.sleep(settings.MEMORY_RSS_INTERVAL)
+
+    async def stop(self):
+        self.running = False
+
+    @staticmethod
+    def _snapshot() -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+
+    async def take_baseline(self, frames: int = None) -> dict:
+        """Start tracing if needed and remember a snapshot to diff against"""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames or settings.MEMORY_TRACEMALLOC_FRAMES or 10)
+        self._baseline = await asyncio.to_thread(self._snapshot)
+        self._baseline_at = time.time()
+        logger.info("🧠 Took tracemalloc baseline snapshot")
+        return {"tracing": True, "baseline_at": self._baseline_at, "traces": len(self._baseline.traces)}
+
+    def clear_baseline(self) -> dict:
+        """Drop the baseline and stop tracing unless it was configured on"""
+        self._baseline = None
+        self._baseline_at = None
+        if not settings.MEMORY_TRACEMALLOC_FRAMES and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        return {"tracing": tracemalloc.is_tracing()}
+
+    def _allocators(self, limit: int) -> dict:
+        """Top allocation sites now, and the biggest changes since the baseline"""
+        snapshot = self._snapshot()
+        result = {"top": self._format_stats(snapshot.statistics("lineno"), limit)}
+        if self._baseline is not None:
+            result["baseline_at"] = self._baseline_at
+            result["diff"] = self._format_stats(snapshot.compare_to(self._baseline, "lineno"), limit)
+        return result
+
+    @staticmethod
+    def _format_stats(stats, limit: int) -> list:
+        rows = []
+        for stat in stats[:limit]:
+            frame = stat.traceback[0]
+            row = {"location": f"{frame.filename}:{frame.lineno}", "size_kb": round(stat.size / 1024, 1),
+                   "count": stat.count}
+            if hasattr(stat, "size_diff"):
+                row["size_diff_kb"] = round(stat.size_diff / 1024, 1)
+                row["count_diff"] = stat.count_diff
+            rows.append(row)
+        return rows
+
+    async def report(self, top: int = 20, objects: bool = True) -> dict:
+        """Memory report for the admin endpoint"""
+        manager = self.tunnel_manager
+        report = {
+            "rss_mb": round(rss_mb(), 2),
+            "rss_history": list(self.history),
+            "gc": {"counts": gc.get_count(), "garbage": len(gc.garbage)},
+            "live": {
+                "tunnels": len(manager.tunnels),
+                "listeners": sum(1 for t in manager.tunnels.values() if t.listener),
+                "http_sessions": sum(1 for t in manager.tunnels.values() if t.http_session),
+                "viewers": manager.viewer_count(),
+                "used_ports": len(manager.used_ports)
+            },
+            "tracemalloc": {"tracing": tracemalloc.is_tracing()}
+        }
+
+        if objects:
+            report["objects"] = count_objects(top)
+            watched = report["objects"]["watched"]
+            # More instances than live tunnels means something still references closed ones
+            report["suspected_leaks"] = {
+                name: count - live for name, count, live in (
+                    ("TunnelConnection", watched["TunnelConnection"], len(manager.tunnels)),
+                    ("TunnelListener", watched["TunnelListener"], report["live"]["listeners"]),
+                ) if count > live
+            }
+
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            report["tracemalloc"].update({
+                "current_kb": round(current / 1024, 1),
+                "peak_kb": round(peak / 1024, 1),
+                **await asyncio.to_thread(self._allocators, top)
+            })
+        return report
+
+
+# Global memory diagnostics instance
+memory_diagnostics = MemoryDiagnostics(tunnel_manager)
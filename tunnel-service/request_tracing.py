@@ -0,0 +1,232 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Set, Type
+
+import aiohttp
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Local address of the upstream connection the current request went out on
+_upstream_sockname: ContextVar[Optional[tuple]] = ContextVar("upstream_sockname", default=None)
+
+
+class RequestTrace:
+    """Phase timings for one proxied request
+
+    Phases (milliseconds):
+        route     - tunnel lookup
+        body      - reading the viewer's request body
+        connect   - opening the local connection to the tunnel listener (absent if reused)
+        channel   - opening the SSH channel to the creator for that connection (absent if reused)
+        ttfb      - waiting for the creator's app to send response headers
+        transfer  - reading the response body
+    """
+
+    __slots__ = ("trace_id", "method", "path", "tunnel_id", "status",
+                 "started_at", "_t0", "_open", "phases")
+
+    def __init__(self, method: str, path: str):
+        self.trace_id = os.urandom(8).hex()
+        self.method = method
+        self.path = path
+        self.tunnel_id: Optional[str] = None
+        self.status: Optional[int] = None
+        self.started_at = time.time()
+        self._t0 = time.perf_counter()
+        self._open: Dict[str, float] = {}
+        self.phases: Dict[str, float] = {}
+
+    def begin(self, phase: str):
+        self._open[phase] = time.perf_counter()
+
+    def end(self, phase: str):
+        start = self._open.pop(phase, None)
+        if start is not None:
+            self.phases[phase] = (time.perf_counter() - start) * 1000
+
+    @property
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self._t0) * 1000
+
+    def server_timing(self) -> str:
+        """Value for the Server-Timing response header"""
+        parts = [f"{name};dur={ms:.2f}" for name, ms in self.phases.items()]
+        parts.append(f"total;dur={self.total_ms:.2f}")
+        return ", ".join(parts)
+
+    def to_span(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "name": "proxy_to_tunnel",
+            "tunnel_id": self.tunnel_id,
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "start": self.started_at,
+            "duration_ms": round(self.total_ms, 3),
+            "phases": {name: round(ms, 3) for name, ms in self.phases.items()}
+        }
+
+
+class TracingConnector(aiohttp.TCPConnector):
+    """TCPConnector that notes which local socket each request was sent from
+
+    The tunnel listener knows connections only by that address, so it is
+    how a trace finds the SSH channel opened for its connection.
+    """
+
+    async def connect(self, req, traces, timeout):
+        connection = await super().connect(req, traces, timeout)
+        if connection.transport is not None:
+            _upstream_sockname.set(connection.transport.get_extra_info("sockname"))
+        return connection
+
+
+class SpanExporter:
+    """Base class for span exporters; export() must not block the event loop"""
+
+    def export(self, span: dict):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class JsonlSpanExporter(SpanExporter):
+    """Buffers spans and appends them to a JSON Lines file from a worker thread
+
+    A batch is written once it reaches batch_size spans or its oldest span
+    has waited flush_interval seconds, so low sample rates still reach disk.
+    """
+
+    def __init__(self, path: str, batch_size: int = 256, flush_interval: float = 5):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._buffer: List[dict] = []
+        self._write_lock = threading.Lock()
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._writes: Set[asyncio.Future] = set()
+
+    def export(self, span: dict):
+        self._buffer.append(span)
+        if len(self._buffer) >= self.batch_size:
+            self._flush_in_background()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(
+                self.flush_interval, self._flush_in_background
+            )
+
+    def _flush_in_background(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._buffer:
+            return
+        batch, self._buffer = self._buffer, []
+        write = asyncio.get_running_loop().run_in_executor(None, self._write, batch)
+        self._writes.add(write)
+        write.add_done_callback(self._write_done)
+
+    def _write_done(self, write: asyncio.Future):
+        self._writes.discard(write)
+        if not write.cancelled() and write.exception():
+            logger.warning(f"Failed to write spans to {self.path}: {write.exception()}")
+
+    def _write(self, batch: List[dict]):
+        lines = "".join(json.dumps(span, separators=(",", ":")) + "\n" for span in batch)
+        with self._write_lock:
+            with open(self.path, "a") as f:
+                f.write(lines)
+
+    async def close(self):
+        """Write out buffered spans and wait for writes still in flight"""
+        self._flush_in_background()
+        if self._writes:
+            await asyncio.gather(*self._writes, return_exceptions=True)
+
+
+class RequestTracer:
+    """Samples proxied requests and records their phase timings
+
+    When tracing is off, start() is a single attribute check returning None,
+    so callers guard every tracing call with ``if trace:``.
+    """
+
+    def __init__(self):
+        self.sample_rate = settings.TRACE_SAMPLE_RATE
+        self.server_timing = settings.TRACE_SERVER_TIMING
+        self.exporter: Optional[SpanExporter] = None
+        if settings.TRACE_EXPORTER == "jsonl":
+            self.exporter = JsonlSpanExporter(settings.TRACE_EXPORT_PATH,
+                                              flush_interval=settings.TRACE_FLUSH_INTERVAL)
+
+        # aiohttp hooks that time connection setup through the tunnel
+        self.trace_config = aiohttp.TraceConfig()
+        self.trace_config.on_connection_create_start.append(self._on_connection_create_start)
+        self.trace_config.on_connection_create_end.append(self._on_connection_create_end)
+
+    @property
+    def trace_configs(self) -> Optional[List[aiohttp.TraceConfig]]:
+        """For upstream sessions; None when sampling is off so aiohttp skips its trace signals"""
+        return [self.trace_config] if self.sample_rate > 0 else None
+
+    @property
+    def connector_class(self) -> Type[aiohttp.TCPConnector]:
+        """For upstream sessions; the plain connector when sampling is off"""
+        return TracingConnector if self.sample_rate > 0 else aiohttp.TCPConnector
+
+    def start(self, method: str, path: str) -> Optional[RequestTrace]:
+        if self.sample_rate <= 0:
+            return None
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return None
+        return RequestTrace(method, path)
+
+    def finish(self, trace: RequestTrace, status: int):
+        trace.status = status
+        if self.exporter:
+            try:
+                self.exporter.export(trace.to_span())
+            except Exception as e:
+                logger.warning(f"Failed to export span: {e}")
+
+    async def close(self):
+        if self.exporter:
+            await self.exporter.close()
+
+    @staticmethod
+    def record_channel_setup(trace: RequestTrace, listener):
+        """Add the SSH channel open for a new upstream connection as the "channel" phase
+
+        The tunnel listener opens the channel after accepting our connection,
+        so without this it would be charged to the app's TTFB. Call it in the
+        request's task once the response headers have arrived.
+        """
+        sockname = _upstream_sockname.get()
+        if "connect" not in trace.phases or listener is None or not sockname:
+            return
+        seconds = listener.pop_channel_setup(tuple(sockname[:2]))
+        if seconds is not None:
+            trace.phases["channel"] = seconds * 1000
+
+    @staticmethod
+    async def _on_connection_create_start(session, ctx, params):
+        if ctx.trace_request_ctx:
+            ctx.trace_request_ctx.begin("connect")
+
+    @staticmethod
+    async def _on_connection_create_end(session, ctx, params):
+        if ctx.trace_request_ctx:
+            ctx.trace_request_ctx.end("connect")
+
+
+# Global request tracer instance
+tracer = RequestTracer()
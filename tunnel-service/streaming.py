@@ -0,0 +1,90 @@
+import asyncio
+import logging
+import time
+from typing import AsyncIterator, Dict
+
+import aiohttp
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Hop-by-hop headers, plus those that no longer match once we re-chunk the
+# (already decompressed) body
+STREAM_DROP_HEADERS = {"content-length", "transfer-encoding", "connection", "keep-alive", "content-encoding"}
+
+SSE_HEARTBEAT = b": keepalive\n\n"
+
+
+def is_stream_request(headers, path: str) -> bool:
+    """Whether a request should be proxied without a total timeout
+
+    EventSource always sends ``Accept: text/event-stream``; long-poll
+    endpoints opt in via STREAMING_PATHS prefixes.
+    """
+    if "text/event-stream" in headers.get("accept", ""):
+        return True
+    path = "/" + path.lstrip("/")
+    return any(path.startswith(prefix) for prefix in settings.STREAMING_PATHS)
+
+
+def is_stream_response(response: aiohttp.ClientResponse) -> bool:
+    """SSE, or a chunked body with no declared length"""
+    if response.content_type == "text/event-stream":
+        return True
+    return (
+        response.content_length is None
+        and response.headers.get("Transfer-Encoding", "").lower() == "chunked"
+    )
+
+
+def stream_timeout(connect: float) -> aiohttp.ClientTimeout:
+    """No total limit, but no read may wait longer than STREAM_IDLE_TIMEOUT
+
+    That bounds the wait for response headers (a hung upstream would
+    otherwise hold the request forever); once the body is relayed,
+    stream_body enforces the same idle limit with heartbeats in between.
+    """
+    return aiohttp.ClientTimeout(total=None, sock_connect=connect, sock_read=settings.STREAM_IDLE_TIMEOUT)
+
+
+def stream_headers(response: aiohttp.ClientResponse) -> Dict[str, str]:
+    headers = {k: v for k, v in response.headers.items() if k.lower() not in STREAM_DROP_HEADERS}
+    # Ask any buffering reverse proxy in front of us to flush every chunk
+    headers["X-Accel-Buffering"] = "no"
+    if response.content_type == "text/event-stream":
+        headers.setdefault("Cache-Control", "no-cache")
+    return headers
+
+
+async def stream_body(response: aiohttp.ClientResponse, on_close) -> AsyncIterator[bytes]:
+    """Pass upstream chunks through as they arrive
+
+    Each chunk is yielded (and so flushed to the viewer) immediately. SSE
+    streams get a comment heartbeat after STREAM_HEARTBEAT_INTERVAL of
+    silence; any stream idle for STREAM_IDLE_TIMEOUT is ended.
+    ``on_close(bytes_sent)`` is called exactly once when the stream ends.
+    """
+    sse = response.content_type == "text/event-stream"
+    wait = settings.STREAM_HEARTBEAT_INTERVAL if sse else settings.STREAM_IDLE_TIMEOUT
+    sent = 0
+    last_data = time.monotonic()
+    try:
+        while True:
+            try:
+                chunk = await asyncio.wait_for(response.content.readany(), timeout=wait)
+            except asyncio.TimeoutError:
+                if time.monotonic() - last_data >= settings.STREAM_IDLE_TIMEOUT:
+                    logger.info(f"Closing idle stream from {response.url.path}")
+                    break
+                yield SSE_HEARTBEAT
+                continue
+            if not chunk:
+                break
+            last_data = time.monotonic()
+            sent += len(chunk)
+            yield chunk
+    except aiohttp.ClientError as e:
+        logger.warning(f"Upstream stream ended with error: {e}")
+    finally:
+        response.release()
+        on_close(sent)
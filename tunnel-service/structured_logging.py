@@ -0,0 +1,140 @@
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from config import settings
+
+# Attributes every LogRecord has; anything else came in via ``extra=``
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with ``extra=`` fields as top-level keys"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+@dataclass
+class _EventState:
+    tokens: float
+    updated_at: float
+    suppressed: int = 0
+
+
+class EventSampler:
+    """Per-event sampling plus a token-bucket rate limit for hot-path logs
+
+    Call ``allow(event)`` before building a log record so suppressed events
+    cost a dict lookup and a random draw, not string formatting and I/O.
+
+    Audit events (SSH auth and connection lifecycle) skip the random
+    sampling; only the rate limit, which guards against connection floods,
+    applies to them.
+    """
+
+    AUDIT_EVENTS = frozenset({"ssh_auth", "ssh_connect", "ssh_disconnect"})
+
+    def __init__(self, sample_rate: float = None, rate_limit: float = None):
+        self.sample_rate = settings.LOG_HOT_EVENT_SAMPLE_RATE if sample_rate is None else sample_rate
+        self.rate_limit = settings.LOG_HOT_EVENT_RATE_LIMIT if rate_limit is None else rate_limit
+        self._events: Dict[str, _EventState] = {}
+
+    def allow(self, event: str) -> bool:
+        now = time.monotonic()
+        state = self._events.get(event)
+        if state is None:
+            state = self._events[event] = _EventState(tokens=self.rate_limit, updated_at=now)
+
+        if self.sample_rate < 1 and event not in self.AUDIT_EVENTS and random.random() >= self.sample_rate:
+            state.suppressed += 1
+            return False
+
+        if self.rate_limit > 0:
+            state.tokens = min(self.rate_limit, state.tokens + (now - state.updated_at) * self.rate_limit)
+            state.updated_at = now
+            if state.tokens < 1:
+                state.suppressed += 1
+                return False
+            state.tokens -= 1
+        return True
+
+    def fields(self, event: str, **fields) -> dict:
+        """``extra=`` dict for an allowed event, including how many were skipped"""
+        state = self._events.get(event)
+        suppressed = 0
+        if state is not None:
+            suppressed, state.suppressed = state.suppressed, 0
+        return {"event": event, "suppressed": suppressed, **fields}
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+queue_handler: Optional[DroppingQueueHandler] = None
+
+
+def setup_logging():
+    """Route all logging through a bounded queue drained by a background thread"""
+    global _listener, queue_handler
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler(sys.stderr)
+    if settings.LOG_FORMAT == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter("%(levelname)s:%(name)s:%(message)s"))
+
+    queue_handler = DroppingQueueHandler(queue.Queue(maxsize=settings.LOG_QUEUE_SIZE))
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(settings.LOG_LEVEL)
+
+    _listener = logging.handlers.QueueListener(
+        queue_handler.queue, output, respect_handler_level=True
+    )
+    _listener.start()
+
+
+def stop_logging():
+    """Flush queued records and stop the background thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+# Global sampler for high-frequency events
+log_sampler = EventSampler()
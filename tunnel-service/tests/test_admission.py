@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+from admission import AdmissionController, Overloaded
+from config import settings
+
+
+@pytest.fixture(autouse=True)
+def admission_settings(monkeypatch):
+    monkeypatch.setattr(settings, "ADMISSION_ENABLED", True)
+    monkeypatch.setattr(settings, "ADMISSION_INITIAL_LIMIT", 2)
+    monkeypatch.setattr(settings, "ADMISSION_QUEUE_SIZE", 1)
+    monkeypatch.setattr(settings, "ADMISSION_QUEUE_TIMEOUT", 0.05)
+    monkeypatch.setattr(settings, "ADMISSION_STREAM_LIMIT", 2)
+
+
+def test_sheds_when_limit_and_queue_are_full():
+    async def main():
+        controller = AdmissionController()
+        await controller.acquire("free")
+        await controller.acquire("free")
+        waiter = asyncio.ensure_future(controller.acquire("free"))
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded):
+            await controller.acquire("free")
+        with pytest.raises(Overloaded):
+            await waiter
+        assert controller.shed["free"] == 2
+        assert controller.waiting == 0
+
+    asyncio.run(main())
+
+
+def test_release_grants_queued_request():
+    async def main():
+        controller = AdmissionController()
+        await controller.acquire("free")
+        await controller.acquire("free")
+        waiter = asyncio.ensure_future(controller.acquire("free"))
+        await asyncio.sleep(0)
+        controller.release(None)
+        await waiter
+        assert controller.in_flight == 2
+        assert controller.waiting == 0
+
+    asyncio.run(main())
+
+
+def test_pro_displaces_newest_free_waiter():
+    async def main():
+        controller = AdmissionController()
+        await controller.acquire("free")
+        await controller.acquire("free")
+        free = asyncio.ensure_future(controller.acquire("free"))
+        await asyncio.sleep(0)
+        pro = asyncio.ensure_future(controller.acquire("pro"))
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded):
+            await free
+        controller.release(None)
+        await pro
+        assert controller.shed == {"pro": 0, "free": 1, "stream": 0}
+
+    asyncio.run(main())
+
+
+def test_streams_use_their_own_pool():
+    async def main():
+        controller = AdmissionController()
+        controller.acquire_stream()
+        controller.acquire_stream()
+        with pytest.raises(Overloaded):
+            controller.acquire_stream()
+        # Idle streams don't take slots from ordinary requests
+        await controller.acquire("free")
+        await controller.acquire("free")
+        assert controller.in_flight == 2
+        controller.release_stream()
+        controller.acquire_stream()
+        assert controller.streams == 2
+        assert controller.shed["stream"] == 1
+
+    asyncio.run(main())
+
+
+def test_limit_shrinks_when_latency_degrades(monkeypatch):
+    monkeypatch.setattr(settings, "ADMISSION_INITIAL_LIMIT", 100)
+    monkeypatch.setattr(settings, "ADMISSION_ADJUST_EVERY", 1)
+
+    async def main():
+        controller = AdmissionController()
+        await controller.acquire("free")
+        controller.release(settings.ADMISSION_LATENCY_TOLERANCE * 4)
+        assert controller.limit == 50
+
+    asyncio.run(main())
@@ -0,0 +1,69 @@
+import gzip
+import hashlib
+import os
+
+import pytest
+
+from asset_store import AssetError, AssetStore
+from config import settings
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "ASSET_MAX_BLOB_BYTES", 1024 * 1024)
+    monkeypatch.setattr(settings, "ASSET_MAX_CONTENT_BYTES", 4 * 1024 * 1024)
+    return AssetStore(str(tmp_path))
+
+
+def sha(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def test_round_trip_records_the_real_size(store):
+    content = os.urandom(300 * 1024)
+    size = store.put_blob(sha(content), gzip.compress(content))
+    assert size == len(content)
+    assert store.content_size(sha(content)) == len(content)
+    assert b"".join(store.iter_content(sha(content))) == content
+    assert store.missing([sha(content)]) == []
+
+
+def test_concatenated_members_are_one_file(store):
+    content = b"hello " * 1000 + b"world"
+    blob = gzip.compress(content[:3000]) + gzip.compress(content[3000:])
+    assert store.put_blob(sha(content), blob) == len(content)
+    assert b"".join(store.iter_content(sha(content))) == content
+
+
+def test_gzip_bomb_is_rejected_without_inflating_it(store):
+    content = bytes(64 * 1024 * 1024)
+    blob = gzip.compress(content, compresslevel=9)
+    assert len(blob) < settings.ASSET_MAX_BLOB_BYTES
+    with pytest.raises(AssetError, match="too large"):
+        store.put_blob(sha(content), blob)
+    assert not store.has_blob(sha(content))
+
+
+@pytest.mark.parametrize("blob", [b"not gzip at all", gzip.compress(b"x" * 5000)[:-12]])
+def test_corrupt_or_truncated_blob_is_rejected(store, blob):
+    with pytest.raises(AssetError, match="gzip"):
+        store.put_blob(sha(b"x" * 5000), blob)
+
+
+def test_hash_must_match_content(store):
+    with pytest.raises(AssetError, match="Hash"):
+        store.put_blob(sha(b"other"), gzip.compress(b"content"))
+
+
+def test_manifest_uses_the_verified_size(store):
+    content = b"<html></html>"
+    store.put_blob(sha(content), gzip.compress(content))
+    store.set_manifest("t1", {"/index.html": {"sha256": sha(content), "size": 10 ** 12}})
+    assert store.lookup("t1", "/").size == len(content)
+
+
+def test_blob_without_a_recorded_size_is_uploaded_again(store):
+    content = b"legacy"
+    store.put_blob(sha(content), gzip.compress(content))
+    store.size_path(sha(content)).unlink()
+    assert store.missing([sha(content)]) == [sha(content)]
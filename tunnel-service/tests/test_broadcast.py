@@ -0,0 +1,41 @@
+import asyncio
+
+import pytest
+
+import broadcast
+from admission import AdmissionController, Overloaded
+from broadcast import BroadcastManager
+from config import settings
+
+
+class HangingSession:
+    """Upstream that never answers, so hubs stay open until cancelled"""
+
+    async def get(self, *args, **kwargs):
+        await asyncio.Event().wait()
+
+
+def test_new_hubs_take_a_stream_slot(monkeypatch):
+    monkeypatch.setattr(settings, "ADMISSION_ENABLED", True)
+    monkeypatch.setattr(settings, "ADMISSION_STREAM_LIMIT", 1)
+
+    async def main():
+        controller = AdmissionController()
+        monkeypatch.setattr(broadcast, "admission", controller)
+        manager = BroadcastManager()
+
+        first = asyncio.ensure_future(manager.join("t1", "/events", HangingSession(), "u", "", 1))
+        joiner = asyncio.ensure_future(manager.join("t1", "/events", HangingSession(), "u", "", 1))
+        await asyncio.sleep(0)
+        assert controller.streams == 1  # the second viewer shares the hub
+
+        with pytest.raises(Overloaded):
+            await manager.join("t1", "/other", HangingSession(), "u", "", 1)
+        assert controller.shed["stream"] == 1
+
+        hub = manager.hubs[("t1", "/events")]
+        hub._task.cancel()
+        await asyncio.gather(hub._task, first, joiner, return_exceptions=True)
+        assert controller.streams == 0
+
+    asyncio.run(main())
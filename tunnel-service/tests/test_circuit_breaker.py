@@ -0,0 +1,185 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import aiohttp
+import pytest
+from aiohttp import web
+
+from circuit_breaker import CircuitBreaker
+from config import settings
+from health_monitor import TunnelHealthMonitor
+
+
+@pytest.fixture(autouse=True)
+def breaker_settings(monkeypatch):
+    monkeypatch.setattr(settings, "BREAKER_FAILURE_THRESHOLD", 3)
+    monkeypatch.setattr(settings, "BREAKER_RESET_TIMEOUT", 10)
+    monkeypatch.setattr(settings, "BREAKER_HALF_OPEN_PROBES", 1)
+
+
+def open_breaker() -> CircuitBreaker:
+    breaker = CircuitBreaker()
+    for _ in range(settings.BREAKER_FAILURE_THRESHOLD):
+        assert breaker.allow_request()
+        breaker.record_failure()
+    return breaker
+
+
+def expire(breaker: CircuitBreaker):
+    breaker.opened_at -= settings.BREAKER_RESET_TIMEOUT + 1
+
+
+def test_opens_after_consecutive_failures():
+    breaker = CircuitBreaker()
+    for _ in range(settings.BREAKER_FAILURE_THRESHOLD - 1):
+        breaker.record_failure()
+    assert breaker.state == breaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == breaker.OPEN
+    assert not breaker.allow_request()
+    assert breaker.retry_after() >= 1
+
+
+def test_success_resets_the_failure_count():
+    breaker = CircuitBreaker()
+    for _ in range(settings.BREAKER_FAILURE_THRESHOLD - 1):
+        breaker.record_failure()
+    breaker.record_success(0.01)
+    breaker.record_failure()
+    assert breaker.state == breaker.CLOSED
+
+
+def test_half_open_admits_limited_probes_then_closes():
+    breaker = open_breaker()
+    expire(breaker)
+    assert breaker.allow_request()
+    assert breaker.state == breaker.HALF_OPEN
+    assert not breaker.allow_request()
+    breaker.record_success(0.01)
+    assert breaker.state == breaker.CLOSED
+    assert breaker.allow_request()
+
+
+def test_failed_probe_reopens():
+    breaker = open_breaker()
+    expire(breaker)
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == breaker.OPEN
+    assert breaker.times_opened == 2
+    assert not breaker.allow_request()
+
+
+def test_released_probe_frees_the_slot():
+    breaker = open_breaker()
+    expire(breaker)
+    assert breaker.allow_request()
+    breaker.release()
+    assert breaker.allow_request()
+
+
+async def start_app(status: int):
+    async def handler(request):
+        return web.Response(status=status)
+
+    app = web.Application()
+    app.router.add_route("*", "/{tail:.*}", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    return runner, runner.addresses[0][1]
+
+
+async def check(breaker: CircuitBreaker, port: int) -> bool:
+    async with aiohttp.ClientSession() as session:
+        manager = SimpleNamespace(get_upstream_session=lambda tunnel: session)
+        tunnel = SimpleNamespace(tunnel_id="t1", remote_port=port, breaker=breaker)
+        return await TunnelHealthMonitor(manager)._check_breaker(tunnel)
+
+
+def test_monitor_counts_a_recently_opened_breaker():
+    breaker = open_breaker()
+    assert asyncio.run(check(breaker, 1)) is False
+    assert breaker.state == breaker.OPEN
+
+
+def test_monitor_probes_an_expired_breaker_and_closes_it():
+    async def scenario():
+        runner, port = await start_app(status=500)
+        try:
+            breaker = open_breaker()
+            expire(breaker)
+            healthy = await check(breaker, port)
+        finally:
+            await runner.cleanup()
+        return healthy, breaker
+
+    healthy, breaker = asyncio.run(scenario())
+    assert healthy
+    assert breaker.state == breaker.CLOSED
+
+
+def test_monitor_probe_failure_reopens():
+    async def scenario():
+        runner, port = await start_app(status=200)
+        await runner.cleanup()  # nothing listens on the port any more
+        breaker = open_breaker()
+        expire(breaker)
+        return await check(breaker, port), breaker
+
+    healthy, breaker = asyncio.run(scenario())
+    assert not healthy
+    assert breaker.state == breaker.OPEN
+
+
+class FakeManager:
+    def __init__(self, tunnel):
+        self.tunnels = {tunnel.tunnel_id: tunnel}
+        self.closed = []
+
+    async def close_tunnel(self, tunnel_id):
+        self.closed.append(tunnel_id)
+        self.tunnels.pop(tunnel_id, None)
+
+
+def sweep_tunnel(breaker: CircuitBreaker, ssh_alive: bool = True):
+    return SimpleNamespace(
+        tunnel_id="t1", user_id="u1", remote_port=1, status="active", created_at=time.time(),
+        ssh_connection=SimpleNamespace(is_closing=lambda: not ssh_alive),
+        health_check_failures=0, degraded=False, breaker=breaker
+    )
+
+
+def test_open_breaker_degrades_the_tunnel_instead_of_closing_it():
+    breaker = open_breaker()
+    tunnel = sweep_tunnel(breaker)
+    manager = FakeManager(tunnel)
+    monitor = TunnelHealthMonitor(manager)
+    for _ in range(monitor.max_failures + 2):
+        asyncio.run(monitor._check_all_tunnels())
+    assert manager.closed == []
+    assert tunnel.degraded
+
+    # A half-open probe gets through
+    expire(breaker)
+    assert breaker.allow_request()
+    breaker.record_success(0.01)
+    asyncio.run(monitor._check_all_tunnels())
+    assert not tunnel.degraded
+    assert tunnel.health_check_failures == 0
+
+
+def test_dead_ssh_connection_still_closes_the_tunnel(monkeypatch):
+    tunnel = sweep_tunnel(CircuitBreaker(), ssh_alive=False)
+    manager = FakeManager(tunnel)
+    monitor = TunnelHealthMonitor(manager)
+
+    async def notify(tunnel):
+        pass
+
+    monkeypatch.setattr(monitor, "_notify_tunnel_unhealthy", notify)
+    for _ in range(monitor.max_failures):
+        asyncio.run(monitor._check_all_tunnels())
+    assert manager.closed == ["t1"]
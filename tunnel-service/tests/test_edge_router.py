@@ -0,0 +1,69 @@
+import asyncio
+import ssl
+from types import SimpleNamespace
+
+import pytest
+
+from config import settings
+from edge_router import parse_http_host, parse_route, parse_sni
+from tunnel_manager import TunnelManager
+
+
+@pytest.fixture(autouse=True)
+def public_domain(monkeypatch):
+    monkeypatch.setattr(settings, "PUBLIC_DOMAIN", "Hexagon.Example:8443")
+
+
+def client_hello(server_name: str) -> bytes:
+    """The first TLS record a real client sends for server_name"""
+    context = ssl.create_default_context()
+    incoming, outgoing = ssl.MemoryBIO(), ssl.MemoryBIO()
+    tls = context.wrap_bio(incoming, outgoing, server_hostname=server_name)
+    with pytest.raises(ssl.SSLWantReadError):
+        tls.do_handshake()
+    return outgoing.read()
+
+
+def test_parse_route():
+    assert parse_route("demo.alice.hexagon.example") == ("alice", "demo")
+    assert parse_route("Demo.Alice.HEXAGON.example:443") == ("alice", "demo")
+    assert parse_route("demo.alice.hexagon.example.") == ("alice", "demo")
+    assert parse_route("hexagon.example") is None
+    assert parse_route("alice.hexagon.example") is None
+    assert parse_route("a.demo.alice.hexagon.example") is None
+    assert parse_route(".alice.hexagon.example") is None
+    assert parse_route("demo.alice.evil.example") is None
+    assert parse_route("[::1]:443") is None
+
+
+def test_parse_http_host():
+    head = b"GET / HTTP/1.1\r\nUser-Agent: curl\r\nhOsT:  demo.alice.hexagon.example:8443 \r\n\r\n"
+    assert parse_http_host(head) == "demo.alice.hexagon.example:8443"
+    assert parse_http_host(b"GET / HTTP/1.1\r\nAccept: */*\r\n\r\n") is None
+    assert parse_http_host(b"GET / HTTP/1.1\r\nHost: d\xc3\xa9mo.example\r\n\r\n") is None
+
+
+def test_parse_sni_from_real_client_hello():
+    record = client_hello("demo.alice.hexagon.example")
+    assert parse_sni(record) == "demo.alice.hexagon.example"
+
+
+def test_parse_sni_rejects_garbage():
+    record = client_hello("demo.alice.hexagon.example")
+    assert parse_sni(b"GET / HTTP/1.1\r\n") is None
+    assert parse_sni(record[:20]) is None
+    assert parse_sni(b"") is None
+
+
+def test_route_lookup_ignores_case():
+    async def main():
+        manager = TunnelManager()
+        tunnel = SimpleNamespace(tunnel_id="t1", username="Alice", project_name="My-App")
+        manager.tunnels["t1"] = tunnel
+        manager._routes.setdefault(manager._route_key("Alice", "My-App"), "t1")
+        assert await manager.get_tunnel_by_username_project(*parse_route("my-app.alice.hexagon.example")) is tunnel
+        del manager.tunnels["t1"]
+        manager._drop_route(tunnel)
+        assert not manager._routes
+
+    asyncio.run(main())
@@ -0,0 +1,60 @@
+import asyncio
+
+import aiohttp
+from aiohttp import web
+
+from request_tracing import RequestTrace, RequestTracer
+from tunnel_listener import TunnelListener
+
+CHANNEL_DELAY = 0.05
+
+
+class SlowChannelConnection:
+    """Stands in for the SSH connection; opening a channel takes CHANNEL_DELAY"""
+
+    def __init__(self, app_port: int):
+        self.app_port = app_port
+
+    async def open_connection(self, *args, **kwargs):
+        await asyncio.sleep(CHANNEL_DELAY)
+        return await asyncio.open_connection("127.0.0.1", self.app_port)
+
+
+def test_channel_open_is_reported_apart_from_ttfb():
+    async def main():
+        async def hello(request):
+            return web.Response(text="hi")
+
+        app = web.Application()
+        app.router.add_get("/", hello)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        app_port = site._server.sockets[0].getsockname()[1]
+
+        listener = await TunnelListener.create(SlowChannelConnection(app_port), "127.0.0.1", 0, "localhost", 80)
+        port = listener.get_addresses()[0][1]
+        tracer = RequestTracer()
+        tracer.sample_rate = 1
+        traces = []
+        async with aiohttp.ClientSession(connector=tracer.connector_class(),
+                                         trace_configs=tracer.trace_configs) as session:
+            for _ in range(2):
+                trace = RequestTrace("GET", "/")
+                trace.begin("ttfb")
+                async with session.get(f"http://127.0.0.1:{port}/", trace_request_ctx=trace) as response:
+                    trace.end("ttfb")
+                    tracer.record_channel_setup(trace, listener)
+                    await response.read()
+                traces.append(trace.phases)
+
+        listener.close()
+        await listener.wait_closed()
+        await runner.cleanup()
+        return traces
+
+    first, reused = asyncio.run(main())
+    assert first["channel"] >= CHANNEL_DELAY * 1000
+    assert first["ttfb"] >= first["channel"]
+    assert "connect" not in reused and "channel" not in reused
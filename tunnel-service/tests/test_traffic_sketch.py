@@ -0,0 +1,82 @@
+import random
+from collections import Counter
+
+import pytest
+
+from config import settings
+from traffic_sketch import PUBLIC_DIMENSIONS, CountMinSketch, TopK, TrafficSketch
+
+
+@pytest.fixture(autouse=True)
+def sketch_settings(monkeypatch):
+    monkeypatch.setattr(settings, "TRAFFIC_SKETCH_ENABLED", True)
+    monkeypatch.setattr(settings, "TRAFFIC_SKETCH_WIDTH", 64)
+    monkeypatch.setattr(settings, "TRAFFIC_SKETCH_DEPTH", 4)
+    monkeypatch.setattr(settings, "TRAFFIC_TOP_K", 5)
+
+
+def skewed_keys(n: int) -> list:
+    rng = random.Random(7)
+    return [f"/page/{int(rng.paretovariate(1.2))}" for _ in range(n)]
+
+
+def test_count_min_never_undercounts():
+    sketch = CountMinSketch(width=32, depth=4)
+    keys = skewed_keys(5000)
+    for key in keys:
+        sketch.add(key)
+    for key, count in Counter(keys).items():
+        assert sketch.estimate(key) >= count
+    assert sketch.estimate("/never-seen") >= 0
+
+
+def test_count_min_memory_is_fixed():
+    sketch = CountMinSketch(width=32, depth=4)
+    assert sketch.estimate("/") == 0
+    assert sketch._table is None
+    for i in range(10000):
+        sketch.add(f"/unique/{i}")
+    assert len(sketch._table) == 32 * 4
+    assert sketch.nbytes == 4 * 32 * 4
+
+
+def test_top_k_is_bounded_and_keeps_heavy_hitters():
+    sketch = CountMinSketch(width=256, depth=4)
+    top = TopK(3)
+    keys = ["/hot"] * 500 + ["/warm"] * 300 + ["/mild"] * 200 + [f"/cold/{i}" for i in range(1000)]
+    random.Random(1).shuffle(keys)
+    for key in keys:
+        top.offer(key, sketch.add(key))
+    assert len(top.counts) == 3
+    assert [entry["key"] for entry in top.top()] == ["/hot", "/warm", "/mild"]
+    assert top.top(1)[0]["count"] >= 500
+
+
+def test_traffic_sketch_snapshot_and_estimates():
+    traffic = TrafficSketch()
+    for i in range(200):
+        traffic.record("api/login", 401 if i % 4 else 200, "203.0.113.9")
+        traffic.record(f"static/{i}.js", 200, f"198.51.100.{i % 50}")
+    snapshot = traffic.snapshot()
+    assert snapshot["requests"] == 400
+    assert all(len(snapshot[dimension]) <= 5 for dimension in ("paths", "statuses", "viewers"))
+    assert snapshot["paths"][0] == {"key": "/api/login", "count": traffic.estimate("paths", "/api/login")}
+    assert traffic.estimate("paths", "api/login") >= 200
+    assert traffic.estimate("statuses", 401) >= 150
+    assert snapshot["viewers"][0]["key"] == "203.0.113.9"
+
+
+def test_public_snapshot_omits_viewers():
+    traffic = TrafficSketch()
+    traffic.record("", 200, "203.0.113.9")
+    snapshot = traffic.snapshot(dimensions=PUBLIC_DIMENSIONS)
+    assert "viewers" not in snapshot
+    assert snapshot["paths"] == [{"key": "/", "count": 1}]
+
+
+def test_disabled_sketch_records_nothing(monkeypatch):
+    monkeypatch.setattr(settings, "TRAFFIC_SKETCH_ENABLED", False)
+    traffic = TrafficSketch()
+    traffic.record("", 200, None)
+    assert traffic.requests == 0
+    assert traffic.sketch._table is None
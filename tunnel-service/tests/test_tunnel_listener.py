@@ -0,0 +1,48 @@
+import asyncio
+
+from tunnel_listener import TunnelListener
+
+
+class LoopbackConnection:
+    """Stands in for the SSH connection: channels go to a local app that never closes"""
+
+    def __init__(self, app_port: int):
+        self.app_port = app_port
+
+    async def open_connection(self, *args, **kwargs):
+        return await asyncio.open_connection("127.0.0.1", self.app_port)
+
+
+def test_close_ends_live_relays_without_cancelling_them():
+    errors = []
+
+    async def main():
+        asyncio.get_running_loop().set_exception_handler(lambda loop, context: errors.append(context))
+
+        async def idle_app(reader, writer):
+            await reader.read()
+            writer.close()
+
+        app = await asyncio.start_server(idle_app, "127.0.0.1", 0)
+        app_port = app.sockets[0].getsockname()[1]
+        listener = await TunnelListener.create(LoopbackConnection(app_port), "127.0.0.1", 0, "localhost", 80)
+        port = listener.get_addresses()[0][1]
+
+        viewers = [await asyncio.open_connection("127.0.0.1", port) for _ in range(3)]
+        for _, writer in viewers:
+            writer.write(b"ping")
+        while listener.meter.connections_active < 3:
+            await asyncio.sleep(0.01)
+
+        listener.close()
+        await asyncio.wait_for(listener.wait_closed(), 2)
+        assert listener.meter.connections_active == 0
+        assert listener.meter.ingress == 12
+        for reader, writer in viewers:
+            assert await asyncio.wait_for(reader.read(), 2) == b""
+            writer.close()
+        app.close()
+        await asyncio.sleep(0.05)
+
+    asyncio.run(main())
+    assert errors == []
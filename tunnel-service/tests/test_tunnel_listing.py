@@ -0,0 +1,53 @@
+import asyncio
+import json
+
+from tunnel_listing import TunnelListing
+from tunnel_manager import TunnelConnection, TunnelManager
+
+
+def make_manager(n):
+    manager = TunnelManager()
+    for i in range(n):
+        manager.tunnels[f"t{i}"] = TunnelConnection(
+            tunnel_id=f"t{i}", user_id=f"u{i % 2}", username=f"user{i % 2}",
+            project_name=f"p{i}", local_port=3000, remote_port=20000 + i, created_at=1000 + i
+        )
+    return manager
+
+
+def test_viewer_churn_patches_only_that_entry():
+    async def run():
+        manager = make_manager(5)
+        listing = TunnelListing(manager)
+        listing.page()
+        views = listing._views.copy()
+        unchanged = listing._entries["t1"]
+
+        etag = listing.etag
+        await manager.add_viewer("t3", "v1")
+        assert manager.version == listing.version
+
+        page = json.loads(listing.page())
+        assert listing.etag != etag
+        assert listing._views == views
+        assert listing._entries["t1"] is unchanged
+        assert {t["tunnel_id"]: t["viewers_count"] for t in page["tunnels"]}["t3"] == 1
+
+        await manager.remove_viewer("t3", "v1")
+        user_page = json.loads(listing.page(user_id="u1"))
+        assert [t["viewers_count"] for t in user_page["tunnels"] if t["tunnel_id"] == "t3"] == [0]
+        manager.presence.close()
+
+    asyncio.run(run())
+
+
+def test_user_page_counts_page_and_total():
+    manager = make_manager(5)
+    listing = TunnelListing(manager)
+    first = json.loads(listing.page(user_id="u0", limit=2))
+    assert [t["tunnel_id"] for t in first["tunnels"]] == ["t4", "t2"]
+    assert (first["count"], first["total"], first["user_id"]) == (2, 3, "u0")
+
+    rest = json.loads(listing.page(user_id="u0", cursor=first["next_cursor"], limit=2))
+    assert [t["tunnel_id"] for t in rest["tunnels"]] == ["t0"]
+    assert rest["next_cursor"] is None
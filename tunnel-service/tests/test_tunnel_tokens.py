@@ -0,0 +1,103 @@
+import time
+
+import pytest
+
+from config import settings
+from tunnel_tokens import (
+    TokenReplayCache,
+    TunnelClaims,
+    TunnelTokenError,
+    _b64decode,
+    _b64encode,
+    sign_tunnel_token,
+    verify_tunnel_token,
+)
+
+NOW = 1_700_000_000
+
+
+@pytest.fixture(autouse=True)
+def token_settings(monkeypatch):
+    monkeypatch.setattr(settings, "TUNNEL_SECRET_KEY", "test-secret")
+    monkeypatch.setattr(settings, "TUNNEL_TOKEN_LEEWAY", 30)
+
+
+def make_claims(**overrides) -> TunnelClaims:
+    fields = dict(user_id="u1", tunnel_id="t1", project_name="demo", local_port=3000,
+                  tier="pro", expires_at=NOW + 600, nonce="n1")
+    fields.update(overrides)
+    return TunnelClaims(**fields)
+
+
+def test_round_trip():
+    claims = make_claims(raw_tcp=True)
+    assert verify_tunnel_token(sign_tunnel_token(claims), now=NOW) == claims
+
+
+def test_expiry_honours_leeway():
+    token = sign_tunnel_token(make_claims(expires_at=NOW))
+    assert verify_tunnel_token(token, now=NOW + 30).tunnel_id == "t1"
+    with pytest.raises(TunnelTokenError, match="expired"):
+        verify_tunnel_token(token, now=NOW + 31)
+    assert verify_tunnel_token(token, now=NOW + 3600, allow_expired=True).tunnel_id == "t1"
+
+
+def test_rejects_wrong_secret():
+    token = sign_tunnel_token(make_claims(), secret="other-secret")
+    with pytest.raises(TunnelTokenError, match="signature"):
+        verify_tunnel_token(token, now=NOW)
+
+
+def test_rejects_tampered_payload():
+    payload, signature = sign_tunnel_token(make_claims(tier="free")).split(".")
+    forged = _b64decode(payload).replace(b'"free"', b'"pro"')
+    with pytest.raises(TunnelTokenError, match="signature"):
+        verify_tunnel_token(f"{_b64encode(forged)}.{signature}", now=NOW)
+
+
+@pytest.mark.parametrize("token", ["", "abc", "a.b.c", "!!.??"])
+def test_rejects_malformed(token):
+    with pytest.raises(TunnelTokenError):
+        verify_tunnel_token(token, now=NOW)
+
+
+def test_replay_cache_blocks_concurrent_use():
+    cache = TokenReplayCache(max_size=10)
+    claims = make_claims()
+    cache.claim(claims, now=NOW)
+    with pytest.raises(TunnelTokenError, match="in use"):
+        cache.claim(claims, now=NOW)
+    cache.release(claims.nonce)
+    cache.claim(claims, now=NOW)
+
+
+def test_replay_cache_is_bounded():
+    cache = TokenReplayCache(max_size=3)
+    for i in range(10):
+        cache.claim(make_claims(nonce=f"n{i}"), now=NOW)
+    assert len(cache) == 3
+    cache.claim(make_claims(nonce="n0"), now=NOW)
+
+
+class FakeManager:
+    def __init__(self, reconnecting):
+        self.reconnecting = reconnecting
+
+    def is_reconnecting(self, tunnel_id):
+        return tunnel_id in self.reconnecting
+
+
+@pytest.mark.parametrize("expired_for, reconnecting, accepted", [
+    (0, False, True),
+    (120, False, False),
+    (120, True, True),
+    (3600, True, False),
+])
+def test_expired_token_only_reattaches_within_grace(monkeypatch, expired_for, reconnecting, accepted):
+    from tunnel_manager import SSHTunnelServer
+
+    monkeypatch.setattr(settings, "TUNNEL_RECONNECT_GRACE", 600)
+    now = time.time()
+    token = sign_tunnel_token(make_claims(expires_at=int(now) - expired_for))
+    server = SSHTunnelServer(FakeManager({"t1"} if reconnecting else set()))
+    assert (server._verify_token(token) is not None) is accepted
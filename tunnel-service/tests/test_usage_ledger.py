@@ -0,0 +1,165 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from config import settings
+from tunnel_listener import ByteMeter
+from usage_ledger import UsageLedger
+
+
+class FakeUsageCollection:
+    """Records bulk writes as {_id: $set document}; can be told to fail"""
+
+    def __init__(self):
+        self.docs = {}
+        self.fail = False
+
+    async def bulk_write(self, ops, ordered=True):
+        if self.fail:
+            raise ConnectionError("mongo down")
+        for op in ops:
+            self.docs[op._filter["_id"]] = op._doc["$set"]
+
+    async def create_index(self, keys):
+        pass
+
+
+def ledger_with(collection, tmp_path, **overrides) -> UsageLedger:
+    ledger = UsageLedger()
+    ledger._client = SimpleNamespace(
+        get_default_database=lambda: {settings.USAGE_COLLECTION: collection},
+        close=lambda: None
+    )
+    ledger.wal_path = tmp_path
+    for name, value in overrides.items():
+        setattr(ledger, name, value)
+    return ledger
+
+
+@pytest.fixture(autouse=True)
+def ledger_settings(monkeypatch):
+    monkeypatch.setattr(settings, "USAGE_LEDGER_ENABLED", True)
+    monkeypatch.setattr(settings, "USAGE_WAL_FSYNC", False)
+
+
+def delta(tunnel_id, ingress=0, egress=0, requests=0, viewer_seconds=0.0):
+    return [tunnel_id, "user1", "alice", "demo", ingress, egress, 0, requests, viewer_seconds]
+
+
+async def drain(ledger: UsageLedger):
+    await ledger._on_wal(lambda: None)
+
+
+def test_sample_and_flush_writes_minute_totals(tmp_path):
+    async def scenario():
+        collection = FakeUsageCollection()
+        ledger = ledger_with(collection, tmp_path)
+        tunnel = SimpleNamespace(tunnel_id="t1", user_id="user1", username="alice", project_name="demo",
+                                 meter=ByteMeter(), asset_bytes_served=0, requests_count=0,
+                                 viewers=set(), created_at=time.time())
+        tunnel.meter.ingress, tunnel.requests_count = 100, 2
+        ledger.sample([tunnel])
+        tunnel.meter.ingress, tunnel.requests_count = 250, 3
+        ledger.sample([tunnel])
+        ledger.sample([tunnel])  # idle: no new row data
+        assert await ledger.flush()
+        await ledger.close()
+        return collection
+
+    (doc,) = asyncio.run(scenario()).docs.values()
+    assert doc["bytes_ingress"] == 250
+    assert doc["requests"] == 3
+
+
+def test_crash_recovery_replays_closed_minutes(tmp_path):
+    old_minute = int(time.time() // 60) - 5
+
+    async def crashed_run():
+        ledger = ledger_with(FakeUsageCollection(), tmp_path)
+        ledger._record(old_minute, [delta("t1", ingress=10, requests=1)])
+        ledger._record(old_minute, [delta("t1", ingress=5, requests=1), delta("t2", egress=7)])
+        await drain(ledger)
+        # A crash mid-append leaves a torn last line
+        with open(ledger._segment(old_minute), "a") as f:
+            f.write('{"m": 1, "r": [["t3"')
+
+    async def restart():
+        collection = FakeUsageCollection()
+        ledger = ledger_with(collection, tmp_path)
+        await ledger._recover()
+        await drain(ledger)
+        return collection, ledger
+
+    asyncio.run(crashed_run())
+    collection, ledger = asyncio.run(restart())
+    assert collection.docs[f"t1:{old_minute}"]["bytes_ingress"] == 15
+    assert collection.docs[f"t1:{old_minute}"]["requests"] == 2
+    assert collection.docs[f"t2:{old_minute}"]["bytes_egress"] == 7
+    assert not ledger._segment(old_minute).exists()
+
+
+def test_replay_is_idempotent(tmp_path):
+    old_minute = int(time.time() // 60) - 5
+
+    async def scenario():
+        collection = FakeUsageCollection()
+        ledger = ledger_with(collection, tmp_path)
+        ledger._record(old_minute, [delta("t1", ingress=10)])
+        await drain(ledger)
+        segment = ledger._segment(old_minute).read_text()
+        await ledger._replay(old_minute)
+        # Same segment replayed again, e.g. after a crash before its delete
+        ledger._segment(old_minute).write_text(segment)
+        await ledger._replay(old_minute)
+        return collection
+
+    collection = asyncio.run(scenario())
+    assert collection.docs[f"t1:{old_minute}"]["bytes_ingress"] == 10
+
+
+def test_failed_flush_keeps_rows_for_retry(tmp_path):
+    minute = int(time.time() // 60) - 1
+
+    async def scenario():
+        collection = FakeUsageCollection()
+        ledger = ledger_with(collection, tmp_path)
+        ledger._record(minute, [delta("t1", ingress=10)])
+        collection.fail = True
+        assert not await ledger.flush()
+        assert ledger.stats()["dirty_rows"] == 1
+        collection.fail = False
+        assert await ledger.flush()
+        await drain(ledger)
+        return collection, ledger
+
+    collection, ledger = asyncio.run(scenario())
+    assert collection.docs[f"t1:{minute}"]["bytes_ingress"] == 10
+    assert ledger.stats()["buffered_rows"] == 0
+    assert not ledger._segment(minute).exists()
+
+
+def test_full_buffer_spills_to_disk_and_replays(tmp_path):
+    now_minute = int(time.time() // 60)
+
+    async def scenario():
+        collection = FakeUsageCollection()
+        ledger = ledger_with(collection, tmp_path, max_rows=2)
+        collection.fail = True
+        for offset in (3, 2, 1):
+            ledger._record(now_minute - offset, [delta("a", ingress=offset), delta("b", ingress=offset)])
+        spilled = set(ledger._spilled)
+        await drain(ledger)
+        collection.fail = False
+        for _ in range(4):
+            await ledger.flush()
+        await drain(ledger)
+        return collection, ledger, spilled
+
+    collection, ledger, spilled = asyncio.run(scenario())
+    assert spilled == {now_minute - 3, now_minute - 2}
+    for offset in (3, 2, 1):
+        assert collection.docs[f"a:{now_minute - offset}"]["bytes_ingress"] == offset
+    assert not ledger._spilled
+    assert not list(tmp_path.glob("usage-*.wal"))
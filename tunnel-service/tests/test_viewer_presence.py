@@ -0,0 +1,76 @@
+import asyncio
+
+from viewer_presence import ViewerPresence
+
+
+def run_presence(ttl, scenario):
+    expired = []
+
+    async def main():
+        presence = ViewerPresence(lambda tunnel_id, viewer_id: expired.append((tunnel_id, viewer_id)), ttl=ttl)
+        try:
+            await scenario(presence)
+        finally:
+            presence.close()
+
+    asyncio.run(main())
+    return expired
+
+
+def test_silent_viewer_expires():
+    async def scenario(presence):
+        assert presence.touch("t1", "alice")
+        assert not presence.touch("t1", "alice")
+        await asyncio.sleep(0.1)
+        assert len(presence) == 0
+        assert presence.expired == 1
+
+    assert run_presence(0.03, scenario) == [("t1", "alice")]
+
+
+def test_heartbeats_keep_viewer_present():
+    async def scenario(presence):
+        presence.touch("t1", "alice")
+        for _ in range(5):
+            await asyncio.sleep(0.02)
+            presence.touch("t1", "alice")
+        assert len(presence) == 1
+        assert len(presence._heap) == 1
+
+    assert run_presence(0.05, scenario) == []
+
+
+def test_leave_and_rejoin_keeps_one_heap_entry():
+    async def scenario(presence):
+        for _ in range(100):
+            presence.touch("t1", "alice")
+            presence.forget("t1", "alice")
+        presence.touch("t1", "alice")
+        assert len(presence._heap) == 1
+        await asyncio.sleep(0.1)
+        assert len(presence._heap) == 0
+        assert not presence._queued
+
+    assert run_presence(0.03, scenario) == [("t1", "alice")]
+
+
+def test_forgotten_viewer_is_not_expired():
+    async def scenario(presence):
+        presence.touch("t1", "alice")
+        presence.forget("t1", "alice")
+        await asyncio.sleep(0.1)
+        assert len(presence._heap) == 0
+
+    assert run_presence(0.03, scenario) == []
+
+
+def test_zero_ttl_never_expires():
+    async def scenario(presence):
+        assert presence.touch("t1", "alice")
+        await asyncio.sleep(0.05)
+        assert len(presence) == 1
+        assert not presence._heap
+        presence.forget("t1", "alice")
+        assert len(presence) == 0
+
+    assert run_presence(0, scenario) == []
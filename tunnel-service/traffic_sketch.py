@@ -0,0 +1,134 @@
+import random
+from array import array
+from typing import Dict, Hashable, Optional
+
+from config import settings
+
+# Dimensions tracked per tunnel; each gets its own top-K over the shared sketch
+DIMENSIONS = ("paths", "statuses", "viewers")
+# Viewer IPs are kept so a creator can spot abusive clients; only they see them
+PUBLIC_DIMENSIONS = ("paths", "statuses")
+
+_PRIME = (1 << 61) - 1
+
+
+class CountMinSketch:
+    """Fixed-size frequency estimates that never undercount
+
+    ``depth`` rows of ``width`` counters; a key's estimate is the smallest of
+    its cells, so collisions can only inflate it. Updates are conservative
+    (only cells below the new estimate are raised), which keeps that
+    inflation low for skewed traffic. Keys are placed with Python's salted
+    string hash, so viewers can't craft paths that collide on purpose, and
+    each row maps that hash through its own random (a*h + b) mod p, so two
+    keys sharing a cell in one row are no likelier to share the others.
+    """
+
+    __slots__ = ("width", "depth", "_table", "_rows")
+
+    def __init__(self, width: int, depth: int):
+        self.width = width
+        self.depth = depth
+        self._table: Optional[array] = None  # allocated on first use; idle tunnels stay small
+        self._rows = [(random.randrange(1, _PRIME), random.randrange(_PRIME)) for _ in range(depth)]
+
+    def _cells(self, key: Hashable):
+        h = hash(key) & 0xFFFFFFFFFFFFFFFF
+        width = self.width
+        return [row * width + (a * h + b) % _PRIME % width for row, (a, b) in enumerate(self._rows)]
+
+    def add(self, key: Hashable) -> int:
+        """Count one occurrence of key and return its new estimate"""
+        if self._table is None:
+            self._table = array("I", bytes(4 * self.width * self.depth))
+        table = self._table
+        cells = self._cells(key)
+        estimate = min(table[cell] for cell in cells) + 1
+        for cell in cells:
+            if table[cell] < estimate:
+                table[cell] = estimate
+        return estimate
+
+    def estimate(self, key: Hashable) -> int:
+        if self._table is None:
+            return 0
+        return min(self._table[cell] for cell in self._cells(key))
+
+    @property
+    def nbytes(self) -> int:
+        return 4 * self.width * self.depth
+
+
+class TopK:
+    """The k keys with the highest sketch estimates seen so far
+
+    Candidates only need a full scan for the current minimum when their
+    estimate beats a cached floor, so most updates are a dict lookup.
+    """
+
+    __slots__ = ("k", "counts", "_floor")
+
+    def __init__(self, k: int):
+        self.k = k
+        self.counts: Dict[Hashable, int] = {}
+        self._floor = 0  # lower bound on the smallest tracked count
+
+    def offer(self, key: Hashable, estimate: int):
+        counts = self.counts
+        if key in counts or len(counts) < self.k:
+            counts[key] = estimate
+            return
+        if estimate <= self._floor:
+            return
+        smallest = min(counts, key=counts.get)
+        if estimate > counts[smallest]:
+            del counts[smallest]
+            counts[key] = estimate
+        self._floor = min(counts.values())
+
+    def top(self, limit: Optional[int] = None) -> list:
+        ranked = sorted(self.counts.items(), key=lambda item: item[1], reverse=True)
+        return [{"key": key, "count": count} for key, count in ranked[:limit]]
+
+
+class TrafficSketch:
+    """Per-tunnel hot paths, status codes and viewer IPs in fixed memory
+
+    One Count-Min Sketch holds all three dimensions (keys are tagged with
+    their dimension) and a top-K per dimension keeps the heavy hitters.
+    Memory is TRAFFIC_SKETCH_WIDTH x TRAFFIC_SKETCH_DEPTH counters plus
+    TRAFFIC_TOP_K keys per dimension, however much traffic the tunnel sees.
+    Counts are estimates: never low, high by at most a small fraction of
+    all requests.
+    """
+
+    __slots__ = ("requests", "sketch", "top")
+
+    def __init__(self):
+        self.requests = 0
+        self.sketch = CountMinSketch(settings.TRAFFIC_SKETCH_WIDTH, settings.TRAFFIC_SKETCH_DEPTH)
+        self.top = {dimension: TopK(settings.TRAFFIC_TOP_K) for dimension in DIMENSIONS}
+
+    @staticmethod
+    def _path(path: str) -> str:
+        return "/" + path[:settings.TRAFFIC_PATH_MAX_LENGTH]
+
+    def record(self, path: str, status: int, viewer: Optional[str]):
+        """Count one proxied request"""
+        if not settings.TRAFFIC_SKETCH_ENABLED:
+            return
+        self.requests += 1
+        for dimension, key in (("paths", self._path(path)), ("statuses", status), ("viewers", viewer or "unknown")):
+            self.top[dimension].offer(key, self.sketch.add((dimension, key)))
+
+    def estimate(self, dimension: str, key) -> int:
+        """Estimated requests for one key, e.g. ("paths", "/api/login")"""
+        if dimension == "paths":
+            key = self._path(key.lstrip("/"))
+        return self.sketch.estimate((dimension, key))
+
+    def snapshot(self, limit: Optional[int] = None, dimensions: tuple = DIMENSIONS) -> dict:
+        return {
+            "requests": self.requests,
+            **{dimension: self.top[dimension].top(limit) for dimension in dimensions}
+        }
@@ -0,0 +1,198 @@
+import asyncio
+import asyncssh
+import logging
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Relays fold their byte counts into the tunnel's meter at most this often
+METER_FLUSH_BYTES = 256 * 1024
+METER_FLUSH_INTERVAL = 1.0  # seconds
+
+
+class ByteMeter:
+    """Per-tunnel byte counters at the forwarded-channel layer
+
+    ingress: viewer -> creator (requests, uploads, health probes)
+    egress:  creator -> viewer (responses, streams)
+
+    Counts every byte relayed through the tunnel, whatever the protocol
+    or outcome. Belongs to the tunnel rather than the listener, so it
+    survives creator reconnects.
+    """
+
+    __slots__ = ("ingress", "egress", "connections_total", "connections_active")
+
+    def __init__(self):
+        self.ingress = 0
+        self.egress = 0
+        self.connections_total = 0
+        self.connections_active = 0
+
+    @property
+    def total(self) -> int:
+        return self.ingress + self.egress
+
+    def add(self, ingress: bool, count: int):
+        if ingress:
+            self.ingress += count
+        else:
+            self.egress += count
+
+
+class TunnelListener(asyncssh.SSHListener):
+    """Listens on a tunnel's remote port and relays each connection over SSH
+
+    Returned from ``SSHTunnelServer.server_requested`` so asyncssh reports our
+    allocated port back to the creator. Every accepted socket is forwarded to
+    the creator as a ``forwarded-tcpip`` channel on the SSH connection.
+    """
+
+    def __init__(
+        self,
+        conn: asyncssh.SSHServerConnection,
+        listen_host: str,
+        listen_port: int,
+        meter: Optional[ByteMeter] = None
+    ):
+        self._conn = conn
+        self._listen_host = listen_host
+        self._listen_port = listen_port
+        self.meter = meter or ByteMeter()
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._relays: Dict[asyncio.Task, List] = {}  # relay -> writers to close on shutdown
+        self._channel_setup: Dict[tuple, float] = {}  # live relay's peer address -> seconds to open its channel
+        self._closed = False
+
+    @classmethod
+    async def create(
+        cls,
+        conn: asyncssh.SSHServerConnection,
+        bind_host: str,
+        bind_port: int,
+        listen_host: str,
+        listen_port: int,
+        meter: Optional[ByteMeter] = None
+    ) -> "TunnelListener":
+        """Bind bind_host:bind_port; channels are labelled listen_host:listen_port
+
+        listen_host/listen_port must be the address the creator asked for (or
+        the port we report back when it asked for port 0), since that is how
+        the SSH client matches incoming channels to its forwards.
+        """
+        listener = cls(conn, listen_host, listen_port or bind_port, meter)
+        listener._server = await asyncio.start_server(listener._handle, bind_host, bind_port)
+        return listener
+
+    def get_addresses(self):
+        return [sock.getsockname()[:2] for sock in self._server.sockets]
+
+    def get_port(self) -> int:
+        return self._listen_port
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        await self.relay(reader, writer)
+
+    async def relay(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, preface: bytes = b""):
+        """Splice a viewer socket to a new channel to the creator
+
+        ``preface`` is data already read from the socket (e.g. by the edge
+        router) and is sent ahead of the rest. The relay is tied to this
+        listener, so closing the tunnel cuts it.
+        """
+        if self._closed:
+            writer.close()
+            return
+        task = asyncio.current_task()
+        writers = self._relays[task] = [writer]
+        peer = writer.get_extra_info('peername')[:2]
+        try:
+            orig_host, orig_port = peer
+            started = time.perf_counter()
+            try:
+                chan_reader, chan_writer = await self._conn.open_connection(
+                    self._listen_host, self._listen_port, orig_host, orig_port,
+                    encoding=None
+                )
+            except (asyncssh.Error, OSError) as e:
+                logger.warning(f"Failed to open channel for port {self._listen_port}: {e}")
+                return
+            if self._closed:
+                chan_writer.close()
+                return
+            writers.append(chan_writer)
+            self._channel_setup[peer] = time.perf_counter() - started
+
+            if preface:
+                chan_writer.write(preface)
+                self.meter.add(True, len(preface))
+            self.meter.connections_total += 1
+            self.meter.connections_active += 1
+            try:
+                await asyncio.gather(
+                    self._pipe(reader, chan_writer, ingress=True),
+                    self._pipe(chan_reader, writer, ingress=False),
+                    return_exceptions=True
+                )
+            finally:
+                self.meter.connections_active -= 1
+        finally:
+            writer.close()
+            self._relays.pop(task, None)
+            self._channel_setup.pop(peer, None)
+
+    def pop_channel_setup(self, peer: tuple) -> Optional[float]:
+        """Seconds spent opening the SSH channel for the connection from peer
+
+        Reported once per connection, so requests that reuse it see None.
+        """
+        return self._channel_setup.pop(peer, None)
+
+    async def _pipe(self, reader, writer, ingress: bool):
+        """Copy bytes until EOF, then half-close the other side
+
+        Bytes are counted locally and folded into the meter in batches.
+        """
+        pending = 0
+        last_flush = time.monotonic()
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                writer.write(data)
+                pending += len(data)
+                if pending >= METER_FLUSH_BYTES or time.monotonic() - last_flush >= METER_FLUSH_INTERVAL:
+                    self.meter.add(ingress, pending)
+                    pending = 0
+                    last_flush = time.monotonic()
+                await writer.drain()
+        finally:
+            if pending:
+                self.meter.add(ingress, pending)
+            try:
+                if writer.can_write_eof():
+                    writer.write_eof()
+                else:
+                    writer.close()
+            except Exception:
+                pass  # Peer already gone
+
+    def close(self):
+        if self._server is None or self._closed:
+            return
+        self._closed = True
+        self._server.close()
+        # Closing both ends lets each relay finish on its own; cancelling the
+        # start_server callback tasks would make asyncio log every one as an error
+        for writers in self._relays.values():
+            for writer in writers:
+                writer.close()
+
+    async def wait_closed(self):
+        if self._server is not None:
+            await self._server.wait_closed()
+        # Let closed relays flush their final byte counts
+        if self._relays:
+            await asyncio.gather(*self._relays, return_exceptions=True)
@@ -0,0 +1,175 @@
+import base64
+import json
+import logging
+from bisect import bisect_right
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from config import settings
+from tunnel_manager import tunnel_manager
+
+try:
+    import orjson
+except ImportError:  # stdlib fallback for minimal environments
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+
+def dumps(obj) -> bytes:
+    """Compact JSON bytes, via orjson when available"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":")).encode()
+
+
+def encode_cursor(key: Tuple[float, str]) -> str:
+    return base64.urlsafe_b64encode(f"{key[0]!r}|{key[1]}".encode()).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[float, str]:
+    """Raises ValueError for a cursor we didn't issue"""
+    try:
+        sort_value, tunnel_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+        return float(sort_value), tunnel_id
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+
+
+class TunnelListing:
+    """Versioned, pre-serialized snapshot of the tunnel fleet for the listing endpoints
+
+    Rebuilt lazily on the first request after ``TunnelManager.version``
+    changes (a tunnel added, removed or changing status). Viewer joins and
+    leaves only bump ``viewers_version``; the entries of the tunnels in
+    ``viewers_changed`` are then re-encoded in place and the other entries,
+    the order and the filtered views are kept. Pages are assembled by
+    joining encoded entries and cached until either version moves, so
+    repeated polls cost a dict lookup.
+
+    Ordering is newest first; cursors encode the last (created_at, tunnel_id)
+    key seen, so pages stay consistent while tunnels come and go.
+    """
+
+    def __init__(self, manager):
+        self.manager = manager
+        self.version = -1
+        self.viewers_version = -1
+        self._entries: Dict[str, Tuple[tuple, bytes]] = {}
+        self._rows: List[tuple] = []  # (sort key, user_id, status, entry bytes)
+        self._index: Dict[str, int] = {}  # tunnel_id -> position in _rows
+        self._views: Dict[Tuple[Optional[str], Optional[str]], Tuple[list, list]] = {}
+        self._pages: "OrderedDict[tuple, bytes]" = OrderedDict()
+
+    @property
+    def etag(self) -> str:
+        return f'"v{self.version}.{self.viewers_version}"'
+
+    def _encode(self, tunnel) -> Tuple[tuple, bytes]:
+        """Cached (state, bytes) for a tunnel, re-encoded only if its listed fields changed"""
+        state = (tunnel.status, len(tunnel.viewers), tunnel.username, tunnel.project_name)
+        cached = self._entries.get(tunnel.tunnel_id)
+        if cached is None or cached[0] != state:
+            cached = (state, dumps({
+                "tunnel_id": tunnel.tunnel_id,
+                "user_id": tunnel.user_id,
+                "username": tunnel.username,
+                "project_name": tunnel.project_name,
+                "remote_port": tunnel.remote_port,
+                "public_url": f"http://{settings.PUBLIC_DOMAIN}/live/{tunnel.username}/{tunnel.project_name}",
+                "viewers_count": len(tunnel.viewers),
+                "status": tunnel.status,
+                "created_at": tunnel.created_at
+            }))
+        return cached
+
+    def _refresh(self):
+        if self.version != self.manager.version:
+            self._rebuild()
+        elif self.viewers_version != self.manager.viewers_version:
+            self._patch_viewers()
+
+    def _rebuild(self):
+        entries = {}
+        rows = []
+        for tunnel in self.manager.tunnels.values():
+            cached = self._encode(tunnel)
+            entries[tunnel.tunnel_id] = cached
+            rows.append(((-tunnel.created_at, tunnel.tunnel_id), tunnel.user_id, tunnel.status, cached[1]))
+
+        rows.sort(key=lambda row: row[0])
+        self._entries = entries
+        self._rows = rows
+        self._index = {row[0][1]: i for i, row in enumerate(rows)}
+        self._views.clear()
+        self._pages.clear()
+        self.manager.viewers_changed.clear()
+        self.version = self.manager.version
+        self.viewers_version = self.manager.viewers_version
+
+    def _patch_viewers(self):
+        """Re-encode only the entries whose viewer count changed"""
+        for tunnel_id in self.manager.viewers_changed:
+            tunnel = self.manager.tunnels.get(tunnel_id)
+            i = self._index.get(tunnel_id)
+            if tunnel is None or i is None:
+                continue  # closed or not listed yet; the next rebuild covers it
+            cached = self._encode(tunnel)
+            self._entries[tunnel_id] = cached
+            self._rows[i] = self._rows[i][:3] + (cached[1],)
+        self.manager.viewers_changed.clear()
+        self._pages.clear()
+        self.viewers_version = self.manager.viewers_version
+
+    def _view(self, status: Optional[str], user_id: Optional[str]) -> Tuple[list, list]:
+        """Sort keys and _rows positions matching the filters"""
+        view = self._views.get((status, user_id))
+        if view is None:
+            positions = [
+                i for i, row in enumerate(self._rows)
+                if (status is None or row[2] == status) and (user_id is None or row[1] == user_id)
+            ]
+            view = ([self._rows[i][0] for i in positions], positions)
+            self._views[(status, user_id)] = view
+        return view
+
+    def page(
+        self,
+        status: Optional[str] = None,
+        user_id: Optional[str] = None,
+        cursor: Optional[str] = None,
+        limit: Optional[int] = None
+    ) -> bytes:
+        """Encoded JSON page: tunnels, count, total, next_cursor, version"""
+        self._refresh()
+        limit = max(1, min(limit or settings.LISTING_PAGE_SIZE, settings.LISTING_MAX_PAGE_SIZE))
+
+        cache_key = (status, user_id, cursor, limit)
+        body = self._pages.get(cache_key)
+        if body is not None:
+            self._pages.move_to_end(cache_key)
+            return body
+
+        keys, positions = self._view(status, user_id)
+        start = bisect_right(keys, decode_cursor(cursor)) if cursor else 0
+        end = min(start + limit, len(keys))
+
+        meta = {
+            "count": end - start,
+            "total": len(keys),
+            "next_cursor": encode_cursor(keys[end - 1]) if end < len(keys) else None,
+            "version": self.version
+        }
+        if user_id is not None:
+            meta["user_id"] = user_id
+        rows = self._rows
+        body = b'{"tunnels":[' + b",".join(rows[i][3] for i in positions[start:end]) + b"]," + dumps(meta)[1:]
+
+        self._pages[cache_key] = body
+        if len(self._pages) > settings.LISTING_PAGE_CACHE_SIZE:
+            self._pages.popitem(last=False)
+        return body
+
+
+# Global listing snapshot over the tunnel manager
+tunnel_listing = TunnelListing(tunnel_manager)
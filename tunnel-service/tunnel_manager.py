@@ -1,16 +1,30 @@
 import asyncio
 import asyncssh
+import hmac
 import logging
+import re
 import time
 from typing import Dict, Optional, Set
 from dataclasses import dataclass, field
 from datetime import datetime
 import aiohttp
-from config import settings
+from config import public_host, settings, ssh_transport_options
+from user_resolver import user_resolver
+from structured_logging import log_sampler
+from request_tracing import tracer
+from circuit_breaker import CircuitBreaker
+from tunnel_listener import ByteMeter, TunnelListener
+from traffic_sketch import PUBLIC_DIMENSIONS, TrafficSketch
+from asset_store import asset_store
+from usage_ledger import usage_ledger
+from viewer_presence import ViewerPresence
+from tunnel_tokens import TokenReplayCache, TunnelClaims, TunnelTokenError, token_expired, verify_tunnel_token
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# A tunnel token passed as a forward's listen host (base64url "." base64url)
+_TOKEN_RE = re.compile(r"^[A-Za-z0-9_-]{20,}\.[A-Za-z0-9_-]{20,}$")
+
 
 @dataclass
 class TunnelConnection:
@@ -23,12 +37,39 @@ class TunnelConnection:
     remote_port: int
     ssh_connection: Optional[asyncssh.SSHServerConnection] = None
     listener: Optional[asyncssh.SSHListener] = None
+    http_session: Optional[aiohttp.ClientSession] = None
     created_at: float = field(default_factory=time.time)
     viewers: Set[str] = field(default_factory=set)
-    bytes_transferred: int = 0
+    meter: ByteMeter = field(default_factory=ByteMeter)  # bytes relayed through the tunnel
+    asset_bytes_served: int = 0  # published static assets, which never cross the tunnel
     requests_count: int = 0
+    streams_active: int = 0  # SSE/long-poll responses, kept out of requests_count
+    streams_total: int = 0
     status: str = "active"
     health_check_failures: int = 0
+    degraded: bool = False  # app behind the tunnel has failed several health sweeps
+    tier: str = "free"
+    raw_tcp: bool = False  # port bound on TUNNEL_RAW_BIND_HOST for direct TCP access
+    warmup_latency_ms: Optional[float] = None
+    breaker: CircuitBreaker = field(default_factory=CircuitBreaker)
+    traffic: TrafficSketch = field(default_factory=TrafficSketch)  # hot paths, statuses, viewer IPs
+    connected: asyncio.Event = field(default_factory=asyncio.Event)  # cleared while reconnecting
+    reconnect_handle: Optional[asyncio.TimerHandle] = None
+    reconnects: int = 0
+    
+    @property
+    def bytes_transferred(self) -> int:
+        """Bytes relayed through the tunnel in both directions"""
+        return self.meter.total
+    
+    @property
+    def bind_host(self) -> str:
+        return settings.TUNNEL_RAW_BIND_HOST if self.raw_tcp else settings.TUNNEL_BIND_HOST
+    
+    @property
+    def max_viewers(self) -> int:
+        """Viewer limit for this tunnel's tier"""
+        return settings.MAX_VIEWERS_PRO if self.tier == "pro" else settings.MAX_VIEWERS_FREE
 
 
 class TunnelManager:
@@ -39,7 +80,14 @@ class TunnelManager:
         self.port_pool: Set[int] = set(range(settings.TUNNEL_BASE_PORT, settings.TUNNEL_MAX_PORT))
         self.used_ports: Set[int] = set()
         self.ssh_server: Optional[asyncssh.SSHServer] = None
+        self.token_replay_cache = TokenReplayCache()
         self._lock = asyncio.Lock()
+        self._background_tasks: Set[asyncio.Task] = set()
+        self._routes: Dict[tuple, str] = {}  # casefolded (username, project_name) -> tunnel_id
+        self.version = 0  # bumped whenever a tunnel is added, removed or changes status
+        self.viewers_version = 0  # bumped when a viewer count changes; see viewers_changed
+        self.viewers_changed: Set[str] = set()  # tunnel_ids whose viewer count the listing hasn't picked up
+        self.presence = ViewerPresence(self._viewer_expired)
         
     async def start_ssh_server(self):
         """Start the SSH server for accepting reverse tunnels"""
@@ -60,10 +108,12 @@ class TunnelManager:
                 port=settings.SSH_PORT,
                 server_host_keys=[host_key],
                 server_factory=lambda: SSHTunnelServer(self),
-                encoding=None
+                encoding=None,
+                **ssh_transport_options()
             )
             
             logger.info(f"✅ SSH Tunnel Server started on {settings.SSH_HOST}:{settings.SSH_PORT}")
+            logger.info(f"⚙️  SSH transport profile: {settings.SSH_TRANSPORT_PROFILE}")
             logger.info(f"📡 Ready to accept reverse SSH tunnels")
             
         except Exception as e:
@@ -95,9 +145,25 @@ class TunnelManager:
         username: str,
         project_name: str,
         local_port: int,
-        ssh_connection: asyncssh.SSHServerConnection
+        ssh_connection: asyncssh.SSHServerConnection,
+        tier: str = "free",
+        listen_host: str = "localhost",
+        listen_port: int = 0,
+        raw_tcp: bool = False
     ) -> Optional[TunnelConnection]:
-        """Create a new reverse tunnel"""
+        """Create a new reverse tunnel
+        
+        listen_host/listen_port are what the creator requested in its
+        tcpip-forward request (port 0 means "pick one for me"). A tunnel
+        waiting for its creator to reconnect is re-attached instead.
+        """
+        existing = self.tunnels.get(tunnel_id)
+        if existing:
+            if existing.status != "reconnecting" or existing.user_id != user_id:
+                logger.warning(f"Tunnel {tunnel_id} is already connected")
+                return None
+            return await self._reattach_tunnel(existing, ssh_connection, listen_host, listen_port)
+        
         try:
             # Allocate a remote port
             remote_port = await self.allocate_port()
@@ -113,18 +179,23 @@ class TunnelManager:
                 project_name=project_name,
                 local_port=local_port,
                 remote_port=remote_port,
-                ssh_connection=ssh_connection
+                ssh_connection=ssh_connection,
+                tier=tier,
+                raw_tcp=raw_tcp
             )
             
             # Create the reverse tunnel (remote port forwarding)
             try:
-                listener = await ssh_connection.forward_remote_port(
-                    '0.0.0.0',  # Listen on all interfaces
+                listener = await TunnelListener.create(
+                    ssh_connection,
+                    tunnel.bind_host,
                     remote_port,
-                    'localhost',  # Forward to localhost on creator's machine
-                    local_port
+                    listen_host,
+                    listen_port,
+                    meter=tunnel.meter
                 )
                 tunnel.listener = listener
+                tunnel.connected.set()
                 logger.info(f"✅ Created reverse tunnel: {remote_port} -> localhost:{local_port}")
                 
             except Exception as e:
@@ -134,10 +205,19 @@ class TunnelManager:
             
             # Store tunnel
             self.tunnels[tunnel_id] = tunnel
+            self._routes.setdefault(self._route_key(username, project_name), tunnel_id)
+            self.version += 1
             
             # Notify Node.js backend
             await self._notify_backend_tunnel_created(tunnel)
             
+            # Warm upstream connections in the background so the forward
+            # request is answered first and the creator can accept channels
+            if settings.TUNNEL_PREWARM_ENABLED:
+                task = asyncio.create_task(self.warm_tunnel(tunnel))
+                self._background_tasks.add(task)
+                task.add_done_callback(self._background_tasks.discard)
+            
             logger.info(f"🚀 Tunnel {tunnel_id} created for {username}/{project_name}")
             logger.info(f"   Public URL: http://{settings.PUBLIC_DOMAIN}/live/{username}/{project_name}")
             
@@ -147,6 +227,96 @@ class TunnelManager:
             logger.error(f"Error creating tunnel {tunnel_id}: {e}")
             return None
     
+    async def _reattach_tunnel(
+        self,
+        tunnel: TunnelConnection,
+        ssh_connection: asyncssh.SSHServerConnection,
+        listen_host: str,
+        listen_port: int
+    ) -> Optional[TunnelConnection]:
+        """Bind a reconnected creator to its existing tunnel (same id, URL and port)"""
+        try:
+            listener = await TunnelListener.create(
+                ssh_connection, tunnel.bind_host, tunnel.remote_port, listen_host, listen_port,
+                meter=tunnel.meter
+            )
+        except Exception as e:
+            logger.error(f"Failed to re-open tunnel {tunnel.tunnel_id} on port {tunnel.remote_port}: {e}")
+            return None
+        
+        if tunnel.reconnect_handle:
+            tunnel.reconnect_handle.cancel()
+            tunnel.reconnect_handle = None
+        
+        # Pooled upstream connections went to the old listener
+        if tunnel.http_session:
+            await tunnel.http_session.close()
+            tunnel.http_session = None
+        
+        tunnel.listener = listener
+        tunnel.ssh_connection = ssh_connection
+        tunnel.status = "active"
+        tunnel.health_check_failures = 0
+        tunnel.reconnects += 1
+        tunnel.connected.set()
+        self.version += 1
+        
+        logger.info(f"🔁 Tunnel {tunnel.tunnel_id} reconnected (reconnect #{tunnel.reconnects})")
+        return tunnel
+    
+    def detach_tunnel(self, tunnel_id: str, ssh_connection: asyncssh.SSHServerConnection):
+        """Hold a tunnel whose SSH connection dropped so its creator can reconnect
+        
+        The tunnel keeps its id, public URL and port for TUNNEL_RECONNECT_GRACE
+        seconds; viewer requests wait for the reconnect instead of failing.
+        """
+        tunnel = self.tunnels.get(tunnel_id)
+        if not tunnel or tunnel.ssh_connection is not ssh_connection or tunnel.status != "active":
+            return
+        
+        tunnel.status = "reconnecting"
+        tunnel.connected.clear()
+        self.version += 1
+        if tunnel.listener:
+            # Stop accepting connections that could only fail on the dead channel
+            tunnel.listener.close()
+        
+        tunnel.reconnect_handle = asyncio.get_running_loop().call_later(
+            settings.TUNNEL_RECONNECT_GRACE, self._reconnect_expired, tunnel_id
+        )
+        logger.info(f"⏸️  Tunnel {tunnel_id} waiting {settings.TUNNEL_RECONNECT_GRACE:.0f}s for its creator to reconnect")
+    
+    def _reconnect_expired(self, tunnel_id: str):
+        tunnel = self.tunnels.get(tunnel_id)
+        if not tunnel or tunnel.status != "reconnecting":
+            return
+        tunnel.reconnect_handle = None
+        logger.info(f"⌛ Tunnel {tunnel_id} was not reconnected in time, closing")
+        task = asyncio.create_task(self.close_tunnel(tunnel_id))
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+    
+    def ssh_connection_count(self) -> int:
+        """Creator SSH connections carrying live tunnels (several tunnels may share one)"""
+        return len({id(t.ssh_connection) for t in self.tunnels.values() if t.status == "active"})
+    
+    def viewer_count(self) -> int:
+        """Viewers present across all tunnels"""
+        return len(self.presence)
+    
+    def is_reconnecting(self, tunnel_id: str) -> bool:
+        tunnel = self.tunnels.get(tunnel_id)
+        return tunnel is not None and tunnel.status == "reconnecting"
+    
+    async def wait_until_connected(self, tunnel: TunnelConnection, timeout: float) -> bool:
+        """Wait out a creator reconnect; False if the tunnel isn't usable in time"""
+        if tunnel.status == "reconnecting":
+            try:
+                await asyncio.wait_for(tunnel.connected.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                return False
+        return tunnel.status == "active"
+    
     async def close_tunnel(self, tunnel_id: str):
         """Close an existing tunnel"""
         tunnel = self.tunnels.get(tunnel_id)
@@ -155,16 +325,43 @@ class TunnelManager:
             return
         
         try:
+            if tunnel.reconnect_handle:
+                tunnel.reconnect_handle.cancel()
+                tunnel.reconnect_handle = None
+            
+            # Wake viewer requests still waiting for a reconnect
+            tunnel.status = "closed"
+            tunnel.connected.set()
+            
             # Close the listener
             if tunnel.listener:
                 tunnel.listener.close()
                 await tunnel.listener.wait_closed()
             
+            for viewer_id in tunnel.viewers:
+                self.presence.forget(tunnel_id, viewer_id)
+            
+            # Record usage since the last ledger sample
+            usage_ledger.record_close(tunnel)
+            
+            # Close pooled upstream connections
+            if tunnel.http_session:
+                await tunnel.http_session.close()
+            
             # Release the port
             await self.release_port(tunnel.remote_port)
             
+            # Drop published static assets; blobs unused by any tunnel expire later
+            if tunnel_id in asset_store.manifests:
+                asset_store.drop_manifest(tunnel_id)
+                task = asyncio.create_task(asyncio.to_thread(asset_store.prune))
+                self._background_tasks.add(task)
+                task.add_done_callback(self._background_tasks.discard)
+            
             # Remove from active tunnels
             del self.tunnels[tunnel_id]
+            self._drop_route(tunnel)
+            self.version += 1
             
             # Notify backend
             await self._notify_backend_tunnel_closed(tunnel)
@@ -174,6 +371,54 @@ class TunnelManager:
         except Exception as e:
             logger.error(f"Error closing tunnel {tunnel_id}: {e}")
     
+    def get_upstream_session(self, tunnel: TunnelConnection) -> aiohttp.ClientSession:
+        """Keep-alive HTTP session for requests through a tunnel (created lazily)"""
+        if tunnel.http_session is None or tunnel.http_session.closed:
+            tunnel.http_session = aiohttp.ClientSession(
+                connector=tracer.connector_class(
+                    limit=settings.UPSTREAM_POOL_SIZE,
+                    keepalive_timeout=settings.UPSTREAM_KEEPALIVE_TIMEOUT
+                ),
+                trace_configs=tracer.trace_configs
+            )
+        return tunnel.http_session
+    
+    async def warm_tunnel(self, tunnel: TunnelConnection):
+        """Open keep-alive upstream connections and prime the creator's app
+        
+        Issues TUNNEL_PREWARM_CONNECTIONS concurrent requests so that many
+        pooled connections (and SSH channels) are left open, and records the
+        slowest one as the tunnel's cold-path warm-up latency.
+        """
+        session = self.get_upstream_session(tunnel)
+        url = f"http://localhost:{tunnel.remote_port}{settings.TUNNEL_PREWARM_PATH}"
+        
+        async def probe() -> float:
+            start = time.perf_counter()
+            async with session.request(
+                settings.TUNNEL_PREWARM_METHOD,
+                url,
+                allow_redirects=False,
+                timeout=aiohttp.ClientTimeout(total=settings.TUNNEL_PREWARM_TIMEOUT)
+            ) as response:
+                await response.read()
+            return (time.perf_counter() - start) * 1000
+        
+        results = await asyncio.gather(
+            *(probe() for _ in range(settings.TUNNEL_PREWARM_CONNECTIONS)),
+            return_exceptions=True
+        )
+        latencies = [r for r in results if isinstance(r, float)]
+        if not latencies:
+            logger.warning(f"Warm-up failed for tunnel {tunnel.tunnel_id}: {results[0]}")
+            return
+        
+        tunnel.warmup_latency_ms = max(latencies)
+        logger.info(
+            f"🔥 Tunnel {tunnel.tunnel_id} warmed: {len(latencies)} connection(s), "
+            f"{tunnel.warmup_latency_ms:.1f}ms cold latency"
+        )
+    
     async def get_tunnel(self, tunnel_id: str) -> Optional[TunnelConnection]:
         """Get tunnel by ID"""
         return self.tunnels.get(tunnel_id)
@@ -183,40 +428,127 @@ class TunnelManager:
         username: str,
         project_name: str
     ) -> Optional[TunnelConnection]:
-        """Get tunnel by username and project name"""
-        for tunnel in self.tunnels.values():
-            if tunnel.username == username and tunnel.project_name == project_name:
-                return tunnel
-        return None
+        """Get tunnel by username and project name (case-insensitive, like hostnames)"""
+        tunnel_id = self._routes.get(self._route_key(username, project_name))
+        return self.tunnels.get(tunnel_id) if tunnel_id else None
+    
+    @staticmethod
+    def _route_key(username: str, project_name: str) -> tuple:
+        return username.casefold(), project_name.casefold()
+    
+    def _drop_route(self, tunnel: TunnelConnection):
+        """Unindex a closed tunnel, handing its route to another live tunnel if any"""
+        key = self._route_key(tunnel.username, tunnel.project_name)
+        if self._routes.get(key) != tunnel.tunnel_id:
+            return
+        del self._routes[key]
+        for other in self.tunnels.values():
+            if self._route_key(other.username, other.project_name) == key:
+                self._routes[key] = other.tunnel_id
+                break
+    
+    def public_urls(self, tunnel: TunnelConnection) -> dict:
+        """Every address viewers can use to reach a tunnel"""
+        domain_host = public_host()
+        urls = {"public_url": f"http://{settings.PUBLIC_DOMAIN}/live/{tunnel.username}/{tunnel.project_name}"}
+        if settings.ROUTER_HTTP_PORT:
+            port = "" if settings.ROUTER_HTTP_PORT == 80 else f":{settings.ROUTER_HTTP_PORT}"
+            urls["host_url"] = f"http://{tunnel.project_name}.{tunnel.username}.{domain_host}{port}"
+        if settings.ROUTER_TLS_PORT:
+            port = "" if settings.ROUTER_TLS_PORT == 443 else f":{settings.ROUTER_TLS_PORT}"
+            urls["tls_url"] = f"https://{tunnel.project_name}.{tunnel.username}.{domain_host}{port}"
+        if tunnel.raw_tcp:
+            urls["tcp_address"] = f"{domain_host}:{tunnel.remote_port}"
+        return urls
     
     async def get_user_tunnels(self, user_id: str) -> list[TunnelConnection]:
         """Get all tunnels for a user"""
         return [t for t in self.tunnels.values() if t.user_id == user_id]
     
     async def add_viewer(self, tunnel_id: str, viewer_id: str) -> bool:
-        """Add a viewer to a tunnel"""
+        """Add a viewer to a tunnel, or refresh its presence if already watching"""
         tunnel = self.tunnels.get(tunnel_id)
         if not tunnel:
             return False
         
+        if not self.presence.touch(tunnel_id, viewer_id):
+            return True
         tunnel.viewers.add(viewer_id)
-        logger.info(f"👁️  Viewer {viewer_id} joined tunnel {tunnel_id} ({len(tunnel.viewers)} viewers)")
+        self._mark_viewers_changed(tunnel_id)
+        if log_sampler.allow("viewer_joined"):
+            logger.info(
+                "👁️  Viewer %s joined tunnel %s (%d viewers)", viewer_id, tunnel_id, len(tunnel.viewers),
+                extra=log_sampler.fields("viewer_joined", tunnel_id=tunnel_id, viewer_id=viewer_id,
+                                         viewers=len(tunnel.viewers))
+            )
+        return True
+    
+    def _mark_viewers_changed(self, tunnel_id: str):
+        """Viewer churn only touches one listing entry, so it doesn't bump version"""
+        self.viewers_changed.add(tunnel_id)
+        self.viewers_version += 1
+    
+    def heartbeat_viewer(self, tunnel_id: str, viewer_id: str) -> bool:
+        """Keep a present viewer from expiring; False if it must join again"""
+        tunnel = self.tunnels.get(tunnel_id)
+        if not tunnel or viewer_id not in tunnel.viewers:
+            return False
+        self.presence.touch(tunnel_id, viewer_id)
         return True
     
+    def _viewer_expired(self, tunnel_id: str, viewer_id: str):
+        """Presence callback for a viewer that stopped heartbeating"""
+        tunnel = self.tunnels.get(tunnel_id)
+        if tunnel and viewer_id in tunnel.viewers:
+            tunnel.viewers.discard(viewer_id)
+            self._mark_viewers_changed(tunnel_id)
+            if log_sampler.allow("viewer_left"):
+                logger.info(
+                    "⌛ Viewer %s timed out on tunnel %s (%d viewers)", viewer_id, tunnel_id, len(tunnel.viewers),
+                    extra=log_sampler.fields("viewer_left", tunnel_id=tunnel_id, viewer_id=viewer_id,
+                                             viewers=len(tunnel.viewers), reason="expired")
+                )
+    
     async def remove_viewer(self, tunnel_id: str, viewer_id: str):
         """Remove a viewer from a tunnel"""
         tunnel = self.tunnels.get(tunnel_id)
         if tunnel and viewer_id in tunnel.viewers:
+            self.presence.forget(tunnel_id, viewer_id)
             tunnel.viewers.discard(viewer_id)
-            logger.info(f"👋 Viewer {viewer_id} left tunnel {tunnel_id} ({len(tunnel.viewers)} viewers)")
+            self._mark_viewers_changed(tunnel_id)
+            if log_sampler.allow("viewer_left"):
+                logger.info(
+                    "👋 Viewer %s left tunnel %s (%d viewers)", viewer_id, tunnel_id, len(tunnel.viewers),
+                    extra=log_sampler.fields("viewer_left", tunnel_id=tunnel_id, viewer_id=viewer_id,
+                                             viewers=len(tunnel.viewers))
+                )
     
-    async def update_stats(self, tunnel_id: str, bytes_count: int):
-        """Update tunnel statistics"""
+    async def update_stats(self, tunnel_id: str):
+        """Count a proxied request (its bytes are metered by the tunnel listener)"""
         tunnel = self.tunnels.get(tunnel_id)
         if tunnel:
-            tunnel.bytes_transferred += bytes_count
             tunnel.requests_count += 1
     
+    def record_asset_served(self, tunnel_id: str, bytes_count: int):
+        """Count a request answered from the asset store instead of the tunnel"""
+        tunnel = self.tunnels.get(tunnel_id)
+        if tunnel:
+            tunnel.requests_count += 1
+            tunnel.asset_bytes_served += bytes_count
+    
+    def stream_opened(self, tunnel_id: str):
+        """Count a streaming response separately from normal requests"""
+        tunnel = self.tunnels.get(tunnel_id)
+        if tunnel:
+            tunnel.streams_active += 1
+            tunnel.streams_total += 1
+    
+    def stream_closed(self, tunnel_id: str):
+        """Account for a finished streaming response"""
+        tunnel = self.tunnels.get(tunnel_id)
+        if tunnel:
+            tunnel.streams_active = max(0, tunnel.streams_active - 1)
+    
     async def health_check(self):
         """Periodic health check for all tunnels"""
         while True:
@@ -224,6 +556,10 @@ class TunnelManager:
                 await asyncio.sleep(30)  # Check every 30 seconds
                 
                 for tunnel_id, tunnel in list(self.tunnels.items()):
+                    # Tunnels waiting for a reconnect are closed by their grace timer
+                    if tunnel.status == "reconnecting":
+                        continue
+                    
                     # Check if SSH connection is still alive
                     if tunnel.ssh_connection and tunnel.ssh_connection.is_closing():
                         logger.warning(f"⚠️  Tunnel {tunnel_id} SSH connection closed")
@@ -251,7 +587,7 @@ class TunnelManager:
                         "username": tunnel.username,
                         "project_name": tunnel.project_name,
                         "remote_port": tunnel.remote_port,
-                        "public_url": f"http://{settings.PUBLIC_DOMAIN}/live/{tunnel.username}/{tunnel.project_name}",
+                        **self.public_urls(tunnel),
                         "created_at": tunnel.created_at
                     },
                     timeout=aiohttp.ClientTimeout(total=5)
@@ -270,10 +606,14 @@ class TunnelManager:
                         "user_id": tunnel.user_id,
                         "stats": {
                             "bytes_transferred": tunnel.bytes_transferred,
+                            "bytes_ingress": tunnel.meter.ingress,
+                            "bytes_egress": tunnel.meter.egress,
+                            "asset_bytes_served": tunnel.asset_bytes_served,
                             "requests_count": tunnel.requests_count,
                             "viewers_count": len(tunnel.viewers),
                             "duration_seconds": time.time() - tunnel.created_at
-                        }
+                        },
+                        "traffic": tunnel.traffic.snapshot(dimensions=PUBLIC_DIMENSIONS)
                     },
                     timeout=aiohttp.ClientTimeout(total=5)
                 )
@@ -282,21 +622,48 @@ class TunnelManager:
 
 
 class SSHTunnelServer(asyncssh.SSHServer):
-    """Custom SSH server for handling tunnel authentication"""
+    """Custom SSH server for handling tunnel authentication
+    
+    One connection can carry several tunnels. The first plain forward request
+    (e.g. ``ssh -R 0:localhost:3000``) opens the tunnel the session logged in
+    with; each further project sends its own tunnel token as the forward's
+    listen host, so every forward maps to its own TunnelConnection.
+    """
     
     def __init__(self, tunnel_manager: TunnelManager):
         self.tunnel_manager = tunnel_manager
+        self._conn: Optional[asyncssh.SSHServerConnection] = None
+        self._auth_info: Optional[dict] = None
+        self._auth_forwarded = False
+        self._token_nonces: Set[str] = set()
+        self._tunnel_ids: Set[str] = set()
     
     def connection_made(self, conn: asyncssh.SSHServerConnection):
         """Called when a new SSH connection is established"""
-        logger.info(f"🔌 New SSH connection from {conn.get_extra_info('peername')}")
+        self._conn = conn
+        if log_sampler.allow("ssh_connect"):
+            peer = conn.get_extra_info('peername')
+            logger.info(
+                "🔌 New SSH connection from %s", peer,
+                extra=log_sampler.fields("ssh_connect", peer=peer)
+            )
     
     def connection_lost(self, exc):
         """Called when SSH connection is lost"""
+        # Allow the tokens to be reused for a reconnect
+        for nonce in self._token_nonces:
+            self.tunnel_manager.token_replay_cache.release(nonce)
+        
+        # Keep the tunnels (and their URLs) around for a reconnect
+        for tunnel_id in self._tunnel_ids:
+            self.tunnel_manager.detach_tunnel(tunnel_id, self._conn)
+        
+        if not log_sampler.allow("ssh_disconnect"):
+            return
         if exc:
-            logger.warning(f"⚠️  SSH connection lost: {exc}")
+            logger.warning("⚠️  SSH connection lost: %s", exc, extra=log_sampler.fields("ssh_disconnect"))
         else:
-            logger.info("SSH connection closed normally")
+            logger.info("SSH connection closed normally", extra=log_sampler.fields("ssh_disconnect"))
     
     def password_auth_supported(self):
         """Enable password authentication"""
@@ -306,7 +673,8 @@ class SSHTunnelServer(asyncssh.SSHServer):
         """Validate tunnel credentials
         
         Format: username = "userid:tunnelid:projectname"
-                password = "localport:secretkey"
+                password = signed tunnel token minted by the backend
+                           (or legacy "localport:secretkey")
         """
         try:
             # Parse username (userid:tunnelid:projectname)
@@ -317,64 +685,197 @@ class SSHTunnelServer(asyncssh.SSHServer):
             
             user_id, tunnel_id, project_name = parts
             
-            # Parse password (localport:secretkey)
-            pass_parts = password.split(':')
-            if len(pass_parts) != 2:
-                logger.warning(f"Invalid password format")
-                return False
-            
-            local_port, secret_key = pass_parts
+            if ':' in password:
+                info = self._validate_legacy_password(user_id, tunnel_id, project_name, password)
+            else:
+                info = self._validate_token(user_id, tunnel_id, project_name, password)
             
-            # Validate secret key
-            if secret_key != settings.TUNNEL_SECRET_KEY:
-                logger.warning(f"Invalid secret key for tunnel {tunnel_id}")
+            if not info:
                 return False
             
             # Store connection info for later use
-            self._tunnel_info = {
-                'user_id': user_id,
-                'tunnel_id': tunnel_id,
-                'project_name': project_name,
-                'local_port': int(local_port),
-                'username': user_id  # Will be replaced with actual username from DB
-            }
-            
-            logger.info(f"✅ Authenticated tunnel: {tunnel_id} for user {user_id}")
+            self._auth_info = info
+            
+            # Start the username lookup now so it overlaps the rest of the handshake
+            user_resolver.prefetch(user_id)
+            
+            if log_sampler.allow("ssh_auth"):
+                logger.info(
+                    "✅ Authenticated tunnel: %s for user %s", tunnel_id, user_id,
+                    extra=log_sampler.fields("ssh_auth", tunnel_id=tunnel_id, user_id=user_id)
+                )
             return True
             
         except Exception as e:
             logger.error(f"Error validating password: {e}")
             return False
     
+    def _verify_token(self, token: str) -> Optional[TunnelClaims]:
+        """Verify a signed tunnel token offline
+        
+        An expired token is still accepted to re-attach a tunnel that is
+        waiting for its creator to reconnect, but only within
+        TUNNEL_RECONNECT_GRACE of its expiry; later reconnects need a
+        fresh token from the backend.
+        """
+        try:
+            claims = verify_tunnel_token(token, allow_expired=True)
+        except TunnelTokenError as e:
+            logger.warning(f"Rejected tunnel token: {e}")
+            return None
+        
+        if token_expired(claims) and (
+            not self.tunnel_manager.is_reconnecting(claims.tunnel_id)
+            or token_expired(claims, time.time() - settings.TUNNEL_RECONNECT_GRACE)
+        ):
+            logger.warning(f"Rejected token for tunnel {claims.tunnel_id}: Token expired")
+            return None
+        return claims
+    
+    def _claim_token(self, claims: TunnelClaims) -> bool:
+        """Bind a token to this connection so it can't be used concurrently"""
+        try:
+            self.tunnel_manager.token_replay_cache.claim(claims)
+        except TunnelTokenError as e:
+            logger.warning(f"Rejected token for tunnel {claims.tunnel_id}: {e}")
+            return False
+        self._token_nonces.add(claims.nonce)
+        return True
+    
+    @staticmethod
+    def _claims_info(claims: TunnelClaims) -> dict:
+        return {
+            'user_id': claims.user_id,
+            'tunnel_id': claims.tunnel_id,
+            'project_name': claims.project_name,
+            'local_port': claims.local_port,
+            'tier': claims.tier,
+            'nonce': claims.nonce,
+            'raw_tcp': claims.raw_tcp and claims.tier == "pro"
+        }
+    
+    def _validate_token(self, user_id: str, tunnel_id: str, project_name: str, token: str) -> Optional[dict]:
+        """Verify the login token and check it matches the username"""
+        claims = self._verify_token(token)
+        if not claims:
+            return None
+        
+        if (claims.user_id, claims.tunnel_id, claims.project_name) != (user_id, tunnel_id, project_name):
+            logger.warning(f"Token claims do not match username for tunnel {tunnel_id}")
+            return None
+        
+        if not self._claim_token(claims):
+            return None
+        return self._claims_info(claims)
+    
+    def _validate_legacy_password(self, user_id: str, tunnel_id: str, project_name: str, password: str) -> Optional[dict]:
+        """Validate the shared-secret password format ("localport:secretkey")"""
+        if not settings.ALLOW_LEGACY_TUNNEL_PASSWORD:
+            logger.warning(f"Legacy password rejected for tunnel {tunnel_id}")
+            return None
+        
+        # Parse password (localport:secretkey)
+        pass_parts = password.split(':')
+        if len(pass_parts) != 2:
+            logger.warning(f"Invalid password format")
+            return None
+        
+        local_port, secret_key = pass_parts
+        
+        # Validate secret key
+        if not hmac.compare_digest(secret_key, settings.TUNNEL_SECRET_KEY):
+            logger.warning(f"Invalid secret key for tunnel {tunnel_id}")
+            return None
+        
+        return {
+            'user_id': user_id,
+            'tunnel_id': tunnel_id,
+            'project_name': project_name,
+            'local_port': int(local_port),
+            'tier': None,
+            'nonce': None,
+            'raw_tcp': False
+        }
+    
+    def _forward_info(self, listen_host: str) -> Optional[dict]:
+        """Work out which tunnel a forward request is for"""
+        if not _TOKEN_RE.match(listen_host):
+            # A plain forward opens the tunnel the session logged in with
+            if self._auth_forwarded:
+                logger.warning("Session already forwarded its login tunnel")
+                return None
+            self._auth_forwarded = True
+            return self._auth_info
+        
+        # An additional project: the listen host is that tunnel's token
+        claims = self._verify_token(listen_host)
+        if not claims:
+            return None
+        if claims.user_id != self._auth_info['user_id']:
+            logger.warning(f"Token for tunnel {claims.tunnel_id} belongs to another user")
+            return None
+        if not self._claim_token(claims):
+            return None
+        return self._claims_info(claims)
+    
     async def server_requested(self, listen_host, listen_port):
         """Handle remote port forwarding request"""
+        info = None
         try:
-            if not hasattr(self, '_tunnel_info'):
+            if not self._auth_info:
                 logger.error("No tunnel info available")
                 return False
             
-            info = self._tunnel_info
+            if len(self._tunnel_ids) >= settings.MAX_TUNNELS_PER_USER:
+                logger.warning(f"Tunnel limit reached on connection for user {self._auth_info['user_id']}")
+                return False
+            
+            info = self._forward_info(listen_host)
+            if not info:
+                return False
+            
+            # Resolve the public username (cached; falls back to the user id)
+            profile = await user_resolver.resolve(info['user_id'])
+            username = profile.username if profile else info['user_id']
+            tier = info['tier'] or (profile.tier if profile else "free")
             
             # Create the tunnel
             tunnel = await self.tunnel_manager.create_tunnel(
                 tunnel_id=info['tunnel_id'],
                 user_id=info['user_id'],
-                username=info['username'],
+                username=username,
                 project_name=info['project_name'],
                 local_port=info['local_port'],
-                ssh_connection=self._conn
+                ssh_connection=self._conn,
+                tier=tier,
+                listen_host=listen_host,
+                listen_port=listen_port,
+                raw_tcp=info['raw_tcp']
             )
             
             if tunnel:
+                self._tunnel_ids.add(tunnel.tunnel_id)
                 logger.info(f"✅ Remote port forwarding approved for tunnel {info['tunnel_id']}")
-                return True
+                # asyncssh reports the listener's port back to the creator
+                return tunnel.listener
             else:
                 logger.error(f"Failed to create tunnel {info['tunnel_id']}")
+                self._release_forward(info)
                 return False
                 
         except Exception as e:
             logger.error(f"Error in server_requested: {e}")
+            if info:
+                self._release_forward(info)
             return False
+    
+    def _release_forward(self, info: dict):
+        """Undo a forward that didn't produce a tunnel"""
+        if info is self._auth_info:
+            self._auth_forwarded = False
+        elif info['nonce'] in self._token_nonces:
+            self._token_nonces.discard(info['nonce'])
+            self.tunnel_manager.token_replay_cache.release(info['nonce'])
 
 
 # Global tunnel manager instance
@@ -0,0 +1,139 @@
+import base64
+import hashlib
+import hmac
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from config import settings
+
+
+class TunnelTokenError(Exception):
+    """Raised when a tunnel token is malformed, forged, expired or replayed"""
+
+
+@dataclass(frozen=True)
+class TunnelClaims:
+    """Claims carried by a tunnel token minted by the Node.js backend"""
+    user_id: str
+    tunnel_id: str
+    project_name: str
+    local_port: int
+    tier: str
+    expires_at: int
+    nonce: str
+    raw_tcp: bool = False  # expose the tunnel port directly, not only via HTTP routing
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def sign_tunnel_token(claims: TunnelClaims, secret: Optional[str] = None) -> str:
+    """Mint a token (mirrors mintTunnelToken in the backend; used by tools)"""
+    payload = json.dumps({
+        "uid": claims.user_id,
+        "tid": claims.tunnel_id,
+        "prj": claims.project_name,
+        "lp": claims.local_port,
+        "tier": claims.tier,
+        "exp": claims.expires_at,
+        "n": claims.nonce,
+        **({"tcp": True} if claims.raw_tcp else {})
+    }, separators=(",", ":")).encode()
+    key = (secret or settings.TUNNEL_SECRET_KEY).encode()
+    signature = hmac.new(key, payload, hashlib.sha256).digest()
+    return f"{_b64encode(payload)}.{_b64encode(signature)}"
+
+
+def verify_tunnel_token(token: str, now: Optional[float] = None,
+                        allow_expired: bool = False) -> TunnelClaims:
+    """Verify signature and expiry of a token without any network calls
+
+    Token format: base64url(json payload) "." base64url(HMAC-SHA256(payload))
+    ``allow_expired`` skips the expiry check, for callers that only need
+    proof of ownership of a tunnel that is already live.
+    """
+    try:
+        payload_b64, signature_b64 = token.split(".")
+        payload = _b64decode(payload_b64)
+        signature = _b64decode(signature_b64)
+    except ValueError:
+        raise TunnelTokenError("Malformed token")
+
+    expected = hmac.new(settings.TUNNEL_SECRET_KEY.encode(), payload, hashlib.sha256).digest()
+    if not hmac.compare_digest(signature, expected):
+        raise TunnelTokenError("Invalid token signature")
+
+    try:
+        data = json.loads(payload)
+        claims = TunnelClaims(
+            user_id=str(data["uid"]),
+            tunnel_id=str(data["tid"]),
+            project_name=str(data["prj"]),
+            local_port=int(data["lp"]),
+            tier=str(data.get("tier", "free")),
+            expires_at=int(data["exp"]),
+            nonce=str(data["n"]),
+            raw_tcp=bool(data.get("tcp", False))
+        )
+    except (ValueError, KeyError, TypeError):
+        raise TunnelTokenError("Malformed token payload")
+
+    if not allow_expired and token_expired(claims, now):
+        raise TunnelTokenError("Token expired")
+
+    return claims
+
+
+def token_expired(claims: TunnelClaims, now: Optional[float] = None) -> bool:
+    """Whether a token is past its expiry (with TUNNEL_TOKEN_LEEWAY)"""
+    if now is None:
+        now = time.time()
+    return claims.expires_at + settings.TUNNEL_TOKEN_LEEWAY < now
+
+
+class TokenReplayCache:
+    """Tracks token nonces currently bound to a live SSH connection
+
+    A token may be reused to reconnect once its previous connection is gone,
+    but a leaked token cannot be used concurrently with the real creator.
+    Entries expire with the token, and the cache is bounded in size.
+    """
+
+    def __init__(self, max_size: int = None):
+        self.max_size = max_size or settings.TUNNEL_TOKEN_REPLAY_CACHE_SIZE
+        self._active: "OrderedDict[str, int]" = OrderedDict()
+
+    def claim(self, claims: TunnelClaims, now: Optional[float] = None):
+        """Bind a nonce to a connection, raising if it is already bound"""
+        if now is None:
+            now = time.time()
+        expires_at = self._active.get(claims.nonce)
+        if expires_at is not None and expires_at >= now:
+            raise TunnelTokenError("Token already in use")
+
+        self._active[claims.nonce] = claims.expires_at + settings.TUNNEL_TOKEN_LEEWAY
+        self._active.move_to_end(claims.nonce)
+        self._evict(now)
+
+    def release(self, nonce: str):
+        """Unbind a nonce when its connection closes"""
+        self._active.pop(nonce, None)
+
+    def _evict(self, now: float):
+        # Oldest claims sit at the front; expired and overflow entries go first
+        while self._active:
+            nonce, expires_at = next(iter(self._active.items()))
+            if expires_at >= now and len(self._active) <= self.max_size:
+                break
+            self._active.popitem(last=False)
+
+    def __len__(self):
+        return len(self._active)
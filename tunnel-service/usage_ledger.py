@@ -0,0 +1,346 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class UsageRow:
+    """Usage of one tunnel during one wall-clock minute"""
+
+    __slots__ = ("tunnel_id", "user_id", "username", "project_name", "minute",
+                 "bytes_ingress", "bytes_egress", "asset_bytes", "requests",
+                 "viewer_seconds", "dirty")
+
+    def __init__(self, tunnel_id: str, user_id: str, username: str, project_name: str, minute: int):
+        self.tunnel_id = tunnel_id
+        self.user_id = user_id
+        self.username = username
+        self.project_name = project_name
+        self.minute = minute
+        self.bytes_ingress = 0
+        self.bytes_egress = 0
+        self.asset_bytes = 0
+        self.requests = 0
+        self.viewer_seconds = 0.0
+        self.dirty = False
+
+    def add(self, delta: list):
+        self.bytes_ingress += delta[4]
+        self.bytes_egress += delta[5]
+        self.asset_bytes += delta[6]
+        self.requests += delta[7]
+        self.viewer_seconds += delta[8]
+
+    def to_update(self) -> UpdateOne:
+        # $set of the minute's running totals, so a retried or replayed write is idempotent
+        return UpdateOne({"_id": f"{self.tunnel_id}:{self.minute}"}, {"$set": {
+            "tunnel_id": self.tunnel_id,
+            "user_id": self.user_id,
+            "username": self.username,
+            "project_name": self.project_name,
+            "minute": datetime.fromtimestamp(self.minute * 60, timezone.utc),
+            "bytes_ingress": self.bytes_ingress,
+            "bytes_egress": self.bytes_egress,
+            "asset_bytes": self.asset_bytes,
+            "requests": self.requests,
+            "viewer_minutes": round(self.viewer_seconds / 60, 3)
+        }}, upsert=True)
+
+
+class UsageLedger:
+    """Persists per-tunnel, per-minute usage rows to MongoDB
+
+    A sampler reads every tunnel's cumulative counters each
+    USAGE_SAMPLE_INTERVAL and folds the deltas into in-memory rows keyed by
+    (tunnel, minute); idle tunnels produce no rows. Each batch of deltas is
+    first appended to a write-ahead segment file for its minute. Dirty rows
+    are written with one unordered bulk write when USAGE_FLUSH_ROWS are
+    pending or USAGE_FLUSH_INTERVAL has passed. Once a closed minute is
+    persisted its rows and segment are dropped.
+
+    If MongoDB is unavailable, rows stay buffered up to USAGE_BUFFER_MAX_ROWS;
+    beyond that the oldest minutes are evicted from memory but kept on disk,
+    and segments left over from a crash are replayed on start.
+    """
+
+    def __init__(self):
+        self.enabled = settings.USAGE_LEDGER_ENABLED
+        self.sample_interval = settings.USAGE_SAMPLE_INTERVAL
+        self.flush_interval = settings.USAGE_FLUSH_INTERVAL
+        self.flush_rows = settings.USAGE_FLUSH_ROWS
+        self.max_rows = settings.USAGE_BUFFER_MAX_ROWS
+        self.wal_path = Path(settings.USAGE_WAL_PATH)
+        self.running = False
+
+        self._client: Optional[AsyncIOMotorClient] = None
+        self._minutes: Dict[int, Dict[str, UsageRow]] = {}
+        self._seen: Dict[str, tuple] = {}  # tunnel_id -> counters at the last sample
+        self._spilled: Set[int] = set()  # minutes only on disk
+        self._rows = 0
+        self._dirty = 0
+        self._last_flush = time.monotonic()
+        self._flush_task: Optional[asyncio.Task] = None
+        # One writer thread keeps appends and segment deletes in order
+        self._wal = ThreadPoolExecutor(max_workers=1, thread_name_prefix="usage-wal")
+
+        self.flushes = 0
+        self.flush_failures = 0
+        self.rows_written = 0
+
+    @property
+    def _usage(self):
+        """Lazily connect so importing this module never touches the network"""
+        if self._client is None:
+            self._client = AsyncIOMotorClient(settings.MONGODB_URL)
+        return self._client.get_default_database()[settings.USAGE_COLLECTION]
+
+    def _segment(self, minute: int) -> Path:
+        return self.wal_path / f"usage-{minute}.wal"
+
+    # Sampling
+
+    def _delta(self, tunnel, now: float) -> Optional[list]:
+        """Counters accrued by a tunnel since its last sample, or None if idle"""
+        counters = (tunnel.meter.ingress, tunnel.meter.egress, tunnel.asset_bytes_served, tunnel.requests_count)
+        last = self._seen.get(tunnel.tunnel_id)
+        if last is None:
+            last = (0, 0, 0, 0, tunnel.created_at)
+        self._seen[tunnel.tunnel_id] = counters + (now,)
+
+        viewer_seconds = len(tunnel.viewers) * max(0.0, now - last[4])
+        changes = [current - previous for current, previous in zip(counters, last)]
+        if not viewer_seconds and not any(changes):
+            return None
+        return [tunnel.tunnel_id, tunnel.user_id, tunnel.username, tunnel.project_name,
+                *changes, round(viewer_seconds, 3)]
+
+    def sample(self, tunnels: Iterable):
+        """Record usage accrued by the given tunnels since their last sample"""
+        now = time.time()
+        deltas = [delta for delta in (self._delta(tunnel, now) for tunnel in tunnels) if delta]
+        self._record(int(now // 60), deltas)
+
+    def record_close(self, tunnel):
+        """Record a closing tunnel's final usage and forget it"""
+        if not self.enabled:
+            return
+        self.sample([tunnel])
+        self._seen.pop(tunnel.tunnel_id, None)
+
+    def _record(self, minute: int, deltas: List[list]):
+        if not deltas:
+            return
+        self._apply(minute, deltas)
+        line = json.dumps({"m": minute, "r": deltas}, separators=(",", ":")) + "\n"
+        self._wal.submit(self._append, minute, line)
+        self._enforce_bound(minute)
+
+    def _apply(self, minute: int, deltas: List[list]):
+        rows = self._minutes.setdefault(minute, {})
+        for delta in deltas:
+            row = rows.get(delta[0])
+            if row is None:
+                row = rows[delta[0]] = UsageRow(delta[0], delta[1], delta[2], delta[3], minute)
+                self._rows += 1
+            row.add(delta)
+            if not row.dirty:
+                row.dirty = True
+                self._dirty += 1
+
+    def _enforce_bound(self, current_minute: int):
+        """Evict the oldest closed minutes from memory; their segments stay on disk"""
+        while self._rows > self.max_rows:
+            oldest = min(self._minutes)
+            if oldest >= current_minute:
+                break
+            rows = self._minutes.pop(oldest)
+            self._rows -= len(rows)
+            self._dirty -= sum(1 for row in rows.values() if row.dirty)
+            self._spilled.add(oldest)
+            logger.warning(f"⚠️  Usage buffer full, {len(rows)} row(s) for minute {oldest} kept on disk only")
+
+    # Write-ahead segments (run on the WAL thread)
+
+    def _append(self, minute: int, line: str):
+        try:
+            self.wal_path.mkdir(parents=True, exist_ok=True)
+            with open(self._segment(minute), "a") as f:
+                f.write(line)
+                if settings.USAGE_WAL_FSYNC:
+                    f.flush()
+                    os.fsync(f.fileno())
+        except OSError as e:
+            logger.warning(f"Failed to append usage WAL: {e}")
+
+    def _remove(self, minute: int):
+        try:
+            self._segment(minute).unlink()
+        except FileNotFoundError:
+            pass
+
+    def _read_segment(self, minute: int) -> List[list]:
+        deltas = []
+        with open(self._segment(minute)) as f:
+            for line in f:
+                try:
+                    deltas.extend(json.loads(line)["r"])
+                except (ValueError, KeyError):
+                    # A torn last line from a crash mid-append
+                    continue
+        return deltas
+
+    def _list_segments(self) -> List[int]:
+        minutes = []
+        for path in self.wal_path.glob("usage-*.wal"):
+            try:
+                minutes.append(int(path.stem.split("-", 1)[1]))
+            except ValueError:
+                continue
+        return sorted(minutes)
+
+    async def _on_wal(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._wal, fn, *args)
+
+    # Flushing
+
+    async def flush(self) -> bool:
+        """Write every dirty row with one bulk write; returns False on failure"""
+        current_minute = int(time.time() // 60)
+        rows = [row for minute_rows in self._minutes.values() for row in minute_rows.values() if row.dirty]
+        for row in rows:
+            row.dirty = False
+        self._dirty -= len(rows)
+        self._last_flush = time.monotonic()
+
+        if rows:
+            try:
+                await self._usage.bulk_write([row.to_update() for row in rows], ordered=False)
+            except Exception as e:
+                # $set writes are idempotent, so the whole batch is simply retried
+                self.flush_failures += 1
+                for row in rows:
+                    if not row.dirty and row.minute in self._minutes:
+                        row.dirty = True
+                        self._dirty += 1
+                logger.warning(f"Failed to write {len(rows)} usage row(s): {e}")
+                return False
+            self.rows_written += len(rows)
+        self.flushes += 1
+
+        # Closed minutes are final once written
+        for minute in [m for m in self._minutes if m < current_minute]:
+            minute_rows = self._minutes[minute]
+            if any(row.dirty for row in minute_rows.values()):
+                continue
+            del self._minutes[minute]
+            self._rows -= len(minute_rows)
+            await self._on_wal(self._remove, minute)
+
+        if self._spilled and self._rows < self.max_rows // 2:
+            await self._replay(min(self._spilled))
+        return True
+
+    async def _replay(self, minute: int) -> bool:
+        """Write one on-disk minute straight from its segment"""
+        try:
+            deltas = await self._on_wal(self._read_segment, minute)
+            rows: Dict[str, UsageRow] = {}
+            for delta in deltas:
+                row = rows.get(delta[0])
+                if row is None:
+                    row = rows[delta[0]] = UsageRow(delta[0], delta[1], delta[2], delta[3], minute)
+                row.add(delta)
+            if rows:
+                await self._usage.bulk_write([row.to_update() for row in rows.values()], ordered=False)
+                self.rows_written += len(rows)
+            await self._on_wal(self._remove, minute)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            self._spilled.add(minute)
+            logger.warning(f"Failed to replay usage for minute {minute}: {e}")
+            return False
+        self._spilled.discard(minute)
+        return True
+
+    async def _recover(self):
+        """Replay segments left by a previous run"""
+        current_minute = int(time.time() // 60)
+        minutes = await self._on_wal(self._list_segments)
+        for minute in minutes:
+            if minute >= current_minute:
+                # Still being appended to: reload so new deltas add to the replayed totals
+                self._apply(minute, await self._on_wal(self._read_segment, minute))
+            elif not await self._replay(minute):
+                # Keep the rest on disk and retry after a later successful flush
+                self._spilled.update(m for m in minutes if m < current_minute)
+                break
+        if minutes:
+            logger.info(f"📒 Recovered usage from {len(minutes)} WAL segment(s)")
+
+    def _schedule_flush(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self.flush())
+
+    async def start(self, tunnel_manager):
+        """Sample tunnel counters and flush usage rows until stopped"""
+        if not self.enabled:
+            return
+        self.running = True
+        logger.info("📒 Usage Ledger started")
+
+        try:
+            await self._usage.create_index([("user_id", 1), ("minute", 1)])
+        except Exception as e:
+            logger.warning(f"Failed to create usage index: {e}")
+        await self._recover()
+
+        while self.running:
+            try:
+                await asyncio.sleep(self.sample_interval)
+                self.sample(list(tunnel_manager.tunnels.values()))
+                if (self._dirty >= self.flush_rows
+                        or time.monotonic() - self._last_flush >= self.flush_interval):
+                    self._schedule_flush()
+            except Exception as e:
+                logger.error(f"Error in usage ledger: {e}")
+
+    def stats(self) -> dict:
+        """Buffer and flush health, reported on the root endpoint"""
+        return {
+            "enabled": self.enabled,
+            "buffered_rows": self._rows,
+            "dirty_rows": self._dirty,
+            "spilled_minutes": len(self._spilled),
+            "flushes": self.flushes,
+            "flush_failures": self.flush_failures,
+            "rows_written": self.rows_written
+        }
+
+    async def close(self):
+        """Write what's buffered, then close the WAL and MongoDB client"""
+        self.running = False
+        if self.enabled:
+            if self._flush_task is not None:
+                await asyncio.gather(self._flush_task, return_exceptions=True)
+            await self.flush()
+        await asyncio.get_running_loop().run_in_executor(None, self._wal.shutdown)
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+        logger.info("🛑 Usage Ledger stopped")
+
+
+# Global usage ledger instance
+usage_ledger = UsageLedger()
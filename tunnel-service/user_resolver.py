@@ -0,0 +1,207 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from motor.motor_asyncio import AsyncIOMotorClient
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class UserProfile:
+    """Subset of a user document needed by the tunnel service"""
+    user_id: str
+    username: str
+    role: str = "user"
+
+    @property
+    def tier(self) -> str:
+        """Tunnel tier, derived the same way as the Node.js backend"""
+        return "pro" if self.role == "creator" else "free"
+
+
+@dataclass
+class _CacheEntry:
+    profile: Optional[UserProfile]
+    expires_at: float
+
+
+class UserResolver:
+    """Resolves user ids to profiles via MongoDB with an LRU+TTL cache
+
+    Lookups for the same id are coalesced, and lookups for different ids
+    arriving within a short window are batched into a single ``$in`` query.
+    Unknown ids are cached negatively so repeated bad logins stay cheap.
+    """
+
+    def __init__(self):
+        self.cache_size = settings.USER_CACHE_SIZE
+        self.ttl = settings.USER_CACHE_TTL
+        self.negative_ttl = settings.USER_NEGATIVE_CACHE_TTL
+        self.batch_window = settings.USER_LOOKUP_BATCH_WINDOW_MS / 1000
+        self.batch_size = settings.USER_LOOKUP_BATCH_SIZE
+        self.lookup_timeout = settings.USER_LOOKUP_TIMEOUT
+
+        self._client: Optional[AsyncIOMotorClient] = None
+        self._cache: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._queued: Dict[str, asyncio.Future] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.queries = 0
+
+    @property
+    def _users(self):
+        """Lazily connect so importing this module never touches the network"""
+        if self._client is None:
+            self._client = AsyncIOMotorClient(settings.MONGODB_URL)
+        return self._client.get_default_database()["users"]
+
+    def get_cached(self, user_id: str) -> Optional[_CacheEntry]:
+        """Return a live cache entry for user_id, refreshing its LRU position"""
+        entry = self._cache.get(user_id)
+        if entry is None:
+            return None
+        if entry.expires_at < time.monotonic():
+            del self._cache[user_id]
+            return None
+        self._cache.move_to_end(user_id)
+        return entry
+
+    def _store(self, user_id: str, profile: Optional[UserProfile]):
+        """Insert into the cache, evicting least recently used entries"""
+        ttl = self.ttl if profile else self.negative_ttl
+        self._cache[user_id] = _CacheEntry(profile, time.monotonic() + ttl)
+        self._cache.move_to_end(user_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def prime(self, profile: UserProfile):
+        """Seed the cache with a known profile (e.g. from a login response)"""
+        self._store(profile.user_id, profile)
+
+    def invalidate(self, user_id: str):
+        """Drop a cached profile (e.g. after a username change)"""
+        self._cache.pop(user_id, None)
+
+    def prefetch(self, user_id: str):
+        """Start resolving user_id without waiting for the result
+
+        Safe to call from synchronous callbacks such as SSH auth handlers.
+        """
+        if self.get_cached(user_id) is None:
+            self._lookup(user_id)
+
+    async def resolve(self, user_id: str) -> Optional[UserProfile]:
+        """Resolve a single user id; returns None if unknown or unavailable"""
+        entry = self.get_cached(user_id)
+        if entry is not None:
+            self.hits += 1
+            return entry.profile
+
+        self.misses += 1
+        try:
+            return await asyncio.wait_for(
+                asyncio.shield(self._lookup(user_id)),
+                timeout=self.lookup_timeout
+            )
+        except asyncio.TimeoutError:
+            logger.warning(f"User lookup for {user_id} timed out")
+            return None
+
+    async def resolve_many(self, user_ids: Iterable[str]) -> Dict[str, Optional[UserProfile]]:
+        """Resolve several user ids, sharing a single batched query for misses"""
+        ids = list(dict.fromkeys(user_ids))
+        results = await asyncio.gather(*(self.resolve(uid) for uid in ids))
+        return dict(zip(ids, results))
+
+    def _lookup(self, user_id: str) -> asyncio.Future:
+        """Return the in-flight future for user_id, queueing a batch if needed"""
+        future = self._pending.get(user_id)
+        if future is not None:
+            return future
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending[user_id] = future
+        self._queued[user_id] = future
+
+        if len(self._queued) >= self.batch_size:
+            self._schedule_flush(loop, immediate=True)
+        elif self._flush_handle is None:
+            self._schedule_flush(loop)
+        return future
+
+    def _schedule_flush(self, loop: asyncio.AbstractEventLoop, immediate: bool = False):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+        if immediate:
+            self._flush_handle = None
+            self._start_batch(loop)
+        else:
+            self._flush_handle = loop.call_later(self.batch_window, self._start_batch, loop)
+
+    def _start_batch(self, loop: asyncio.AbstractEventLoop):
+        self._flush_handle = None
+        batch, self._queued = self._queued, {}
+        if batch:
+            loop.create_task(self._run_batch(batch))
+
+    async def _run_batch(self, batch: Dict[str, asyncio.Future]):
+        """Fetch a batch of users with one query and settle their futures"""
+        object_ids = {}
+        for user_id in batch:
+            try:
+                object_ids[ObjectId(user_id)] = user_id
+            except (InvalidId, TypeError):
+                self._store(user_id, None)
+
+        found: Dict[str, UserProfile] = {}
+        failed = False
+        if object_ids:
+            try:
+                self.queries += 1
+                cursor = self._users.find(
+                    {"_id": {"$in": list(object_ids)}},
+                    {"username": 1, "role": 1}
+                )
+                async for doc in cursor:
+                    user_id = object_ids[doc["_id"]]
+                    found[user_id] = UserProfile(
+                        user_id=user_id,
+                        username=doc.get("username") or user_id,
+                        role=doc.get("role", "user")
+                    )
+            except Exception as e:
+                # Don't negative-cache on DB errors; callers fall back and retry later
+                logger.warning(f"Failed to resolve {len(object_ids)} user(s): {e}")
+                failed = True
+
+        for user_id, future in batch.items():
+            self._pending.pop(user_id, None)
+            profile = found.get(user_id)
+            if not failed:
+                self._store(user_id, profile)
+            if not future.done():
+                future.set_result(profile)
+
+    async def close(self):
+        """Close the MongoDB client"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+
+# Global user resolver instance
+user_resolver = UserResolver()
@@ -0,0 +1,90 @@
+import asyncio
+import heapq
+import time
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from config import settings
+
+
+class ViewerPresence:
+    """Expires viewers that stop heartbeating
+
+    ``_deadlines`` holds each present viewer's current expiry and the heap
+    holds at most one entry per viewer (``_queued`` tracks which have one,
+    so a viewer that leaves and rejoins reuses its entry). A heartbeat only
+    moves the deadline in the dict; when a stale heap entry reaches the top
+    it is pushed back with the newer deadline, or dropped if the viewer has
+    left. One timer is armed for the earliest deadline, so expiry costs
+    O(log n) per expired viewer and nothing for live ones.
+
+    A ttl of 0 tracks presence without ever expiring anyone, for clients
+    that don't heartbeat.
+    """
+
+    def __init__(self, on_expired: Callable[[str, str], None], ttl: float = None):
+        self.ttl = settings.VIEWER_PRESENCE_TTL if ttl is None else ttl
+        self.on_expired = on_expired
+        self._deadlines: Dict[Tuple[str, str], float] = {}
+        self._heap: List[Tuple[float, str, str]] = []
+        self._queued: Set[Tuple[str, str]] = set()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.expired = 0
+
+    def __len__(self) -> int:
+        """Viewers present across all tunnels"""
+        return len(self._deadlines)
+
+    def touch(self, tunnel_id: str, viewer_id: str) -> bool:
+        """Extend a viewer's presence; returns True if the viewer is new"""
+        key = (tunnel_id, viewer_id)
+        deadline = time.monotonic() + self.ttl
+        is_new = key not in self._deadlines
+        self._deadlines[key] = deadline
+        if self.ttl > 0 and key not in self._queued:
+            self._queued.add(key)
+            heapq.heappush(self._heap, (deadline, tunnel_id, viewer_id))
+            self._arm()
+        return is_new
+
+    def forget(self, tunnel_id: str, viewer_id: str):
+        """Drop a viewer; its heap entry is discarded when it surfaces, or reused on rejoin"""
+        self._deadlines.pop((tunnel_id, viewer_id), None)
+
+    def _arm(self):
+        if not self._heap:
+            return
+        loop = asyncio.get_running_loop()
+        when = loop.time() + max(0.0, self._heap[0][0] - time.monotonic())
+        if self._timer is not None:
+            if self._timer.when() <= when:
+                return
+            self._timer.cancel()
+        self._timer = loop.call_at(when, self._expire)
+
+    def _expire(self):
+        self._timer = None
+        now = time.monotonic()
+        while self._heap and self._heap[0][0] <= now:
+            _, tunnel_id, viewer_id = heapq.heappop(self._heap)
+            key = (tunnel_id, viewer_id)
+            deadline = self._deadlines.get(key)
+            if deadline is None:
+                self._queued.discard(key)
+                continue
+            if deadline > now:
+                # Heartbeat arrived since this entry was pushed
+                heapq.heappush(self._heap, (deadline, tunnel_id, viewer_id))
+                continue
+            del self._deadlines[key]
+            self._queued.discard(key)
+            self.expired += 1
+            self.on_expired(tunnel_id, viewer_id)
+        self._arm()
+
+    def close(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._deadlines.clear()
+        self._heap.clear()
+        self._queued.clear()